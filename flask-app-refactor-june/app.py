@@ -15,12 +15,47 @@ def create_app(config_name='development'):
     else:
         app.config.from_object('config.DevelopmentConfig')
     
+    from config import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    
     # Initialize extensions with app
     from models import db
     db.init_app(app)
     
+    from utils.sqlite import sqlite_tuning
+    sqlite_tuning.init_app(app)
+    
+    from utils.search import include_object
     migrate = Migrate()
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=include_object)
+    
+    # Computed version diffs, keyed by version ids and timestamps
+    from utils.cache import LRUCache
+    app.extensions['diff_cache'] = LRUCache(app.config['DIFF_CACHE_ENTRIES'])
+    
+    from utils.rendering import render_cache, render_pool
+    render_cache.init_app(app)
+    render_pool.init_app(app)
+    
+    from utils.save_buffer import save_buffer
+    save_buffer.init_app(app)
+    
+    from utils.search import search_index
+    search_index.init_app(app)
+    
+    from utils.user_cache import user_summary_cache
+    user_summary_cache.init_app(app)
+    
+    from utils.share_cache import share_cache
+    share_cache.init_app(app)
+    
+    # Thins out old untagged versions every VERSION_RETENTION_INTERVAL seconds
+    from utils.retention import version_retention
+    version_retention.init_app(app)
+    
+    # Per-request timings and query counts, served at METRICS_PATH
+    from utils.metrics import request_metrics
+    request_metrics.init_app(app)
     
     # Import models (needed for migrations)
     from models import User, BlogDraft, DraftVersion
@@ -38,6 +73,10 @@ def create_app(config_name='development'):
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(settings_bp, url_prefix='/settings')
     
+    # CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
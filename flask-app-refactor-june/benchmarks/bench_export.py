@@ -0,0 +1,61 @@
+"""Time to first byte, duration and peak memory of /api/export as accounts grow
+
+Run from the app directory:
+
+    python -m benchmarks.bench_export [--sizes 1000,10000] [--format zip]
+
+Each size is an account with that many versions from benchmarks.data,
+200 versions per draft, in a temporary SQLite file. The response is read
+chunk by chunk and thrown away, as a client download would.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.data import PASSWORD, generate
+
+VERSIONS_PER_DRAFT = 200
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000')
+    parser.add_argument('--format', default='zip', choices=('zip', 'tar'))
+    args = parser.parse_args()
+
+    import config
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    from app import create_app
+    from models import db
+    app = create_app('testing')
+
+    print(f"{'versions':>9}{'first byte':>13}{'total':>11}{'archive':>12}{'peak memory':>14}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            generate(users=1, drafts_per_user=max(size // VERSIONS_PER_DRAFT, 1),
+                     versions_per_draft=min(size, VERSIONS_PER_DRAFT))
+        client = app.test_client()
+        client.post('/auth/login', data={'email': 'user1@example.com', 'password': PASSWORD})
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(f'/api/export?format={args.format}', buffered=False)
+        first_byte = None
+        total_bytes = 0
+        for chunk in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            total_bytes += len(chunk)
+        response.close()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f'{size:>9}{first_byte * 1000:>10.0f} ms{elapsed:>9.1f} s'
+              f'{total_bytes / 1024 / 1024:>8.1f} MiB{peak / 1024 / 1024:>10.1f} MiB')
+
+if __name__ == '__main__':
+    main()
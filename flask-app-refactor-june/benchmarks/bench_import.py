@@ -0,0 +1,92 @@
+"""Rows per second of the bulk import against one form post per version
+
+Run from the app directory:
+
+    python -m benchmarks.bench_import [--drafts 50] [--versions 20] [--batch-size 500]
+
+Both paths load the same synthetic drafts from benchmarks.data into a
+fresh SQLite file: "forms" creates each draft and posts every version to
+/drafts/<id>/versions, one commit each, as a migration script would today;
+"bulk" posts the whole set as JSONL to /api/import.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.data import PASSWORD, document, edit, sentence
+
+def make_records(drafts, versions, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for index in range(drafts):
+        title = f'Imported draft {index}'
+        blocks = document(rng, title)
+        contents = []
+        for version_index in range(versions):
+            if version_index:
+                blocks = edit(rng, blocks)
+            contents.append('\n\n'.join(blocks))
+        records.append({
+            'title': title,
+            'description': sentence(rng),
+            'versions': [{'name': f'v{number + 1}.0', 'content': content} for number, content in enumerate(contents)]
+        })
+    return records
+
+def fresh_client(app):
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/auth/signup', data={'name': 'bench', 'email': 'bench@example.com', 'password': PASSWORD})
+    client.post('/auth/login', data={'email': 'bench@example.com', 'password': PASSWORD})
+    return client
+
+def run_forms(client, records):
+    rows = 0
+    for record in records:
+        response = client.post('/drafts/create', data={'title': record['title'], 'description': record['description']})
+        draft_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[-1])
+        # The draft, and the starter version the form creates
+        rows += 2
+        for version in record['versions']:
+            client.post(f'/drafts/{draft_id}/versions', data={'version_name': version['name'], 'content': version['content']})
+            rows += 1
+    return rows
+
+def run_bulk(client, records, batch_size):
+    client.application.config['IMPORT_BATCH_SIZE'] = batch_size
+    body = '\n'.join(json.dumps(record) for record in records)
+    result = client.post('/api/import', data=body, content_type='application/x-ndjson').json
+    if not result['success']:
+        raise SystemExit(result['error'])
+    return result['drafts'] + result['versions']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drafts', type=int, default=50)
+    parser.add_argument('--versions', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    import config
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    from app import create_app
+    app = create_app('testing')
+    records = make_records(args.drafts, args.versions)
+
+    print(f"{'path':<8}{'rows':>8}{'seconds':>10}{'rows/s':>10}")
+    for name in ('forms', 'bulk'):
+        client = fresh_client(app)
+        start = time.perf_counter()
+        rows = run_forms(client, records) if name == 'forms' else run_bulk(client, records, args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<8}{rows:>8}{elapsed:>10.2f}{rows / elapsed:>10.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Per-call markdown rendering latency, uncached
+
+Run from the app directory:
+
+    python -m benchmarks.bench_render [--iterations N]
+"""
+import argparse
+import time
+
+import markdown
+
+from utils.rendering import MARKDOWN_EXTENSIONS, convert
+
+SAMPLES = {
+    'paragraph': 'A short paragraph with *emphasis* and `code`.\n',
+    'document': '''# Draft title
+
+Some *emphasis*, **strong** text and a [link][ref] with a footnote[^1].
+
+| Column | Value |
+|--------|-------|
+| a      | 1     |
+| b      | 2     |
+
+```python
+def greet(name):
+    return f"Hello, {name}"
+```
+
+- item one
+- item two
+
+[ref]: https://example.com
+[^1]: The footnote.
+''',
+}
+
+def per_call_markdown(content):
+    return markdown.markdown(content, extensions=list(MARKDOWN_EXTENSIONS))
+
+def time_calls(func, content, iterations):
+    func(content)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(content)
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'sample':<12}{'markdown()':>14}{'pooled':>12}{'speedup':>10}")
+    for name, content in SAMPLES.items():
+        assert per_call_markdown(content) == convert(content)
+        before = time_calls(per_call_markdown, content, args.iterations)
+        after = time_calls(convert, content, args.iterations)
+        print(f'{name:<12}{before * 1000:>11.3f} ms{after * 1000:>9.3f} ms{before / after:>9.2f}x')
+
+if __name__ == '__main__':
+    main()
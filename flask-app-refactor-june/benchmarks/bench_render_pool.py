@@ -0,0 +1,103 @@
+"""Latency of small requests while a code-heavy post renders, with and without the render pool
+
+Run from the app directory:
+
+    python -m benchmarks.bench_render_pool [--seconds 5] [--blocks 400] [--workers 2]
+
+One thread keeps previewing a long post full of fenced code blocks, each
+time slightly changed so it misses the render cache, while other threads
+preview a short cached note. "inline" renders in the request thread,
+"pool" in RENDER_POOL_WORKERS processes with RENDER_TIMEOUT as the budget.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app import create_app
+from models import db
+from utils.rendering import render_pool
+
+NOTE = '# Note\n\nA short paragraph with *emphasis*.\n'
+
+def code_post(blocks, salt):
+    body = '\n\n'.join(
+        f'```python\ndef handler_{index}(request):\n    return [item * {index} for item in request.items]\n```'
+        for index in range(blocks)
+    )
+    return f'# Post {salt}\n\n{body}'
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'benchmark'})
+    return client
+
+def run(app, seconds, blocks, readers):
+    stop = time.perf_counter() + seconds
+    heavy = []
+    light = []
+    plain = []
+
+    def heavy_loop():
+        client = logged_in_client(app)
+        salt = 0
+        while time.perf_counter() < stop:
+            salt += 1
+            start = time.perf_counter()
+            html = client.post('/drafts/preview', json={'content': code_post(blocks, f'{id(client)}-{salt}')}).json['html']
+            heavy.append(time.perf_counter() - start)
+            plain.append('codehilite' not in html)
+
+    def light_loop():
+        client = logged_in_client(app)
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            client.post('/drafts/preview', json={'content': NOTE})
+            light.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=heavy_loop)] + [threading.Thread(target=light_loop) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return heavy, light, plain
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--blocks', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=2.0)
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    import config
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    app.test_client().post('/auth/signup', data={'name': 'bench', 'email': 'bench@example.com', 'password': 'benchmark'})
+
+    print(f"{'mode':<8}{'heavy renders':>15}{'heavy p50':>12}{'plain':>7}{'light reqs':>12}{'light p50':>12}{'light p99':>12}")
+    for mode, workers in (('inline', 0), ('pool', args.workers)):
+        app.config['RENDER_POOL_WORKERS'] = workers
+        app.config['RENDER_TIMEOUT'] = args.timeout
+        render_pool.init_app(app)
+        if workers:
+            # Start the worker processes before timing
+            logged_in_client(app).post('/drafts/preview', json={'content': '```python\nwarm = 1\n```'})
+        heavy, light, plain = run(app, args.seconds, args.blocks, args.readers)
+        print(f'{mode:<8}{len(heavy):>15}{percentile(heavy, 0.5) * 1000:>9.0f} ms{sum(plain):>7}'
+              f'{len(light):>12}{percentile(light, 0.5) * 1000:>9.1f} ms{percentile(light, 0.99) * 1000:>9.1f} ms')
+        render_pool.shutdown()
+
+if __name__ == '__main__':
+    main()
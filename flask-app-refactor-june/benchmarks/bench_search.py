@@ -0,0 +1,59 @@
+"""Full-text search query latency over a synthetic index
+
+Run from the app directory:
+
+    python -m benchmarks.bench_search [--drafts N]
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine
+
+from utils.search import FTS5Backend, parse_query
+
+QUERIES = ['garden', 'tomato soup', '"borrow checker"', 'sourd', 'lifetimes explained notes']
+
+def vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+def build(backend, connection, drafts, users, rng):
+    words = vocabulary(20000, rng) + ['garden', 'tomato', 'soup', 'borrow', 'checker', 'sourdough', 'lifetimes']
+    backend.create_schema(connection)
+    for draft_id in range(1, drafts + 1):
+        user_id = draft_id % users + 1
+        backend.index_draft(connection, draft_id, user_id, ' '.join(rng.choices(words, k=4)), '')
+        content = ' '.join(rng.choices(words, k=rng.randint(80, 400)))
+        backend.index_content(connection, draft_id, user_id, f'{draft_id:064x}', content)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drafts', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    engine = create_engine('sqlite://')
+    backend = FTS5Backend()
+    with engine.begin() as connection:
+        start = time.perf_counter()
+        build(backend, connection, args.drafts, args.users, rng)
+        print(f'indexed {args.drafts} drafts in {time.perf_counter() - start:.1f} s')
+
+    with engine.connect() as connection:
+
+        print(f"{'query':<28}{'results':>9}{'latency':>12}")
+        for query in QUERIES:
+            phrases, prefix = parse_query(query)
+            search = lambda: backend.search(connection, 1, phrases, prefix, 20)
+            results = search()
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                search()
+            elapsed = (time.perf_counter() - start) / args.iterations
+            print(f'{query:<28}{len(results):>9}{elapsed * 1000:>9.2f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Read and write latency under mixed load, with and without SQLite tuning
+
+Run from the app directory:
+
+    python -m benchmarks.bench_sqlite_concurrency [--seconds 5] [--readers 4] [--writers 2]
+
+Reader processes load the dashboard, the drafts API and a shared page
+while writer processes save versions. "default" runs without pragmas,
+"tuned" with the SQLITE_PRAGMAS defaults. Each mode runs in its own
+process on a fresh database file.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    'default': {'SQLITE_PRAGMAS': {}},
+    'tuned': {}
+}
+
+CONTENT = '# Heading\n\n' + 'Some paragraph text that changes a little on every save. ' * 300
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def make_app(mode, path):
+    import config
+
+    config.DevelopmentConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    config.DevelopmentConfig.SAVE_BUFFER_INTERVAL = 0
+    for name, value in MODES[mode].items():
+        setattr(config.DevelopmentConfig, name, value)
+
+    from app import create_app
+    return create_app('development')
+
+def worker(kind, mode, path, share_path, offset, seconds, ready, start, results):
+    """One server process: log in, wait for the start, then read or write for the given time"""
+    app = make_app(mode, path)
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'benchmark'})
+    paths = ['/dashboard', '/api/drafts', share_path]
+
+    latencies = []
+    errors = 0
+    count = 0
+    ready.put(True)
+    start.wait()
+    stop_at = time.perf_counter() + seconds
+    while time.perf_counter() < stop_at:
+        began = time.perf_counter()
+        if kind == 'read':
+            response = client.get(paths[(offset + count) % len(paths)])
+            ok = response.status_code == 200
+        else:
+            response = client.post(
+                f'/drafts/versions/{(offset + count) % 20 + 1}/save',
+                json={'content': f'{CONTENT}\n\nSave {count}'}
+            )
+            ok = response.status_code == 200 and response.json.get('success')
+        latencies.append(time.perf_counter() - began)
+        errors += not ok
+        count += 1
+    results.put((kind, latencies, errors))
+
+def run_mode(mode, seconds, readers, writers):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(mode, path)
+
+    from models import db
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    client.post('/auth/signup', data={'name': 'bench', 'email': 'bench@example.com', 'password': 'benchmark'})
+    for index in range(20):
+        client.post('/drafts/create', data={'title': f'Draft {index}'})
+        client.post(f'/drafts/versions/{index + 1}/save', json={'content': CONTENT})
+    share_url = client.post('/drafts/versions/1/share').json['share_url']
+    share_path = '/share/' + share_url.rsplit('/', 1)[-1]
+
+    # Separate processes, like server workers, so SQLite locking rather
+    # than the GIL decides who waits
+    context = multiprocessing.get_context('spawn')
+    ready, start, results = context.Queue(), context.Event(), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(kind, mode, path, share_path, index * 7, seconds, ready, start, results))
+        for kind, total in (('read', readers), ('write', writers))
+        for index in range(total)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+    start.set()
+
+    latencies = {'read': [], 'write': []}
+    errors = 0
+    for _ in processes:
+        kind, values, failed = results.get()
+        latencies[kind].extend(values)
+        errors += failed
+    for process in processes:
+        process.join()
+
+    return {
+        kind: {
+            'count': len(values),
+            'p50': percentile(values, 0.5) * 1000,
+            'p99': percentile(values, 0.99) * 1000
+        }
+        for kind, values in latencies.items()
+    } | {'errors': errors}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.seconds, args.readers, args.writers)))
+        return
+
+    print(f"{'mode':<10}{'reads':>8}{'read p50':>11}{'read p99':>11}{'writes':>8}{'write p99':>11}{'errors':>8}")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_sqlite_concurrency', '--mode', mode,
+             '--seconds', str(args.seconds), '--readers', str(args.readers), '--writers', str(args.writers)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        read, write = result['read'], result['write']
+        print(f"{mode:<10}{read['count']:>8}{read['p50']:>8.1f} ms{read['p99']:>8.1f} ms"
+              f"{write['count']:>8}{write['p99']:>8.1f} ms{result['errors']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Memory and time to compute a user's stats as their version count grows
+
+Run from the app directory:
+
+    python -m benchmarks.bench_user_stats [--sizes 1000,5000,20000]
+
+Compares loading every draft and version through the relationships, as
+User.total_versions used to, with the aggregate queries behind
+/api/user/stats.
+"""
+import argparse
+import time
+import tracemalloc
+
+from app import create_app
+from models import db, User, BlogDraft, DraftVersion, adjust_refs, refresh_draft_aggregates, store_blobs
+
+VERSIONS_PER_DRAFT = 20
+CONTENT = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 40
+
+def populate(versions):
+    """One user owning the given number of versions, inserted in bulk"""
+    db.drop_all()
+    db.create_all()
+    user = User(name='bench', email='bench@example.com')
+    user.set_password('benchmark')
+    db.session.add(user)
+    db.session.commit()
+
+    drafts = BlogDraft.__table__
+    table = DraftVersion.__table__
+    draft_count = max(versions // VERSIONS_PER_DRAFT, 1)
+    db.session.execute(drafts.insert(), [
+        {'title': f'Draft {index}', 'user_id': user.id} for index in range(draft_count)
+    ])
+    draft_ids = db.session.scalars(db.select(drafts.c.id)).all()
+    [content_hash] = store_blobs(db.session.connection(), [(CONTENT, None)], 16)
+    db.session.execute(table.insert(), [
+        {
+            'blog_draft_id': draft_ids[index % draft_count],
+            'version_name': f'Version {index}',
+            'content_hash': content_hash,
+            'word_count': 320,
+            'character_count': len(CONTENT)
+        }
+        for index in range(versions)
+    ])
+    adjust_refs(db.session.connection(), {content_hash: versions})
+    for draft_id in draft_ids:
+        refresh_draft_aggregates(db.session.connection(), draft_id)
+    db.session.commit()
+    return user.id
+
+def relationship_totals(app, user_id):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        return len(user.blog_drafts), sum(len(draft.versions) for draft in user.blog_drafts)
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,5000,20000')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    client = app.test_client()
+    print(f"{'versions':>9}{'relationships':>24}{'aggregates':>24}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        with app.app_context():
+            user_id = populate(size)
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+
+        def aggregates():
+            response = client.get('/api/user/stats')
+            assert response.json['total_versions'] == size, response.json
+
+        before = measure(lambda: relationship_totals(app, user_id))
+        after = measure(aggregates)
+        print(f'{size:>9}' + ''.join(
+            f'{elapsed * 1000:>10.1f} ms {peak / 1024:>8.0f} KiB' for elapsed, peak in (before, after)
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Synthetic users, drafts and versions for benchmarks
+
+Fill a database file (created if missing) from the app directory:
+
+    python -m benchmarks.data --database /tmp/draft_mode_bench.db [--users 20]
+
+Drafts are markdown documents of realistic size, mostly prose with
+headings, lists, links and the odd code block, between a few hundred bytes
+and a few tens of kilobytes. Each later version edits a few paragraphs of
+the one before, so versions are stored as deltas the way real editing
+produces them. Everything is derived from --seed.
+"""
+import argparse
+import random
+import time
+
+from werkzeug.security import generate_password_hash
+
+WORDS = '''the draft post writing idea garden tomato soup recipe weekend morning
+coffee library python rust borrow checker lifetime kitchen bread sourdough
+travel train station window river autumn winter notebook chapter editor review
+thought question answer simple quick slow careful early late reason because
+after before while every small large quiet bright dark warm cold open close
+build test deploy server client request response cache index query table
+version change history branch merge commit release note friend family city'''.split()
+
+PASSWORD = 'benchmark'
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(6, 18))
+    if rng.random() < 0.2:
+        index = rng.randrange(len(words))
+        words[index] = rng.choice(['*{}*', '**{}**', '`{}`', '[{}](https://example.com/{})']).format(
+            words[index], words[index]
+        )
+    return ' '.join(words).capitalize() + '.'
+
+def paragraph(rng):
+    return ' '.join(sentence(rng) for _ in range(rng.randint(2, 7)))
+
+def block(rng):
+    """One top-level markdown block"""
+    roll = rng.random()
+    if roll < 0.1:
+        return '## ' + ' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).title()
+    if roll < 0.2:
+        return '\n'.join('- ' + sentence(rng) for _ in range(rng.randint(2, 6)))
+    if roll < 0.25:
+        lines = [f'    {rng.choice(WORDS)} = {rng.randint(0, 99)}' for _ in range(rng.randint(2, 10))]
+        return '```python\ndef example():\n' + '\n'.join(lines) + '\n```'
+    if roll < 0.3:
+        return '> ' + sentence(rng)
+    return paragraph(rng)
+
+def document(rng, title):
+    """Markdown of lognormal size around 5 KB, capped near 60 KB"""
+    target = min(int(rng.lognormvariate(8.5, 0.8)), 60000)
+    blocks = [f'# {title}']
+    size = 0
+    while size < target:
+        blocks.append(block(rng))
+        size += len(blocks[-1]) + 2
+    return blocks
+
+def edit(rng, blocks):
+    """Next version: rewrite, insert and occasionally drop a few blocks"""
+    blocks = list(blocks)
+    for _ in range(rng.randint(1, 3)):
+        blocks[rng.randrange(1, len(blocks))] = block(rng)
+    blocks.insert(rng.randint(1, len(blocks)), block(rng))
+    if len(blocks) > 4 and rng.random() < 0.3:
+        del blocks[rng.randrange(1, len(blocks))]
+    return blocks
+
+def generate(users=20, drafts_per_user=10, versions_per_draft=8, shared_fraction=0.2, seed=0):
+    """Create the data in the current app's database; returns a summary
+
+    Call inside an app context on an empty schema. Every user's password
+    is PASSWORD and emails are user<n>@example.com, starting at 1.
+    """
+    from models import db, User, BlogDraft, DraftVersion
+
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    start = time.perf_counter()
+    summary = {'users': users, 'drafts': 0, 'versions': 0, 'content_bytes': 0, 'shared_versions': 0}
+
+    for user_index in range(1, users + 1):
+        user = User(name=f'User {user_index}', email=f'user{user_index}@example.com', password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        for draft_index in range(drafts_per_user):
+            title = ' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).title()
+            draft = BlogDraft(title=title, description=sentence(rng), user_id=user.id)
+            db.session.add(draft)
+            db.session.flush()
+
+            blocks = document(rng, title)
+            versions = []
+            for version_index in range(versions_per_draft):
+                if version_index:
+                    blocks = edit(rng, blocks)
+                content = '\n\n'.join(blocks)
+                version = DraftVersion(
+                    version_name=f'v{version_index + 1}.0',
+                    content=content,
+                    blog_draft_id=draft.id,
+                    tag='draft'
+                )
+                if rng.random() < shared_fraction:
+                    version.generate_share_token()
+                    summary['shared_versions'] += 1
+                db.session.add(version)
+                # Flush one at a time so each version is encoded against the previous one
+                db.session.flush()
+                versions.append(version)
+                summary['content_bytes'] += len(content.encode('utf-8'))
+            versions[-1].set_as_current()
+            summary['drafts'] += 1
+            summary['versions'] += len(versions)
+        db.session.commit()
+
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file to create and fill')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--drafts-per-user', type=int, default=10)
+    parser.add_argument('--versions-per-draft', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import config
+    config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + args.database
+
+    from app import create_app
+    from models import db
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        print(generate(args.users, args.drafts_per_user, args.versions_per_draft, seed=args.seed))
+
+if __name__ == '__main__':
+    main()
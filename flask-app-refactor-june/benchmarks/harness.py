@@ -0,0 +1,249 @@
+"""Scripted request scenarios over synthetic data, reported as JSON
+
+Run from the app directory:
+
+    python -m benchmarks.harness [--database memory|PATH] [--scenarios dashboard,stats]
+                                 [--iterations 200] [--output results.json]
+                                 [--baseline previous.json] [--tolerance 0.25]
+
+Data comes from benchmarks.data and requests go through Flask's test
+client under TestingConfig, against in-memory SQLite (the default), a
+fresh SQLite file at PATH, or TEST_DATABASE_URL when it is set and
+--database is left out. Every scenario reports throughput, p50/p99
+latency, SQL statements per request and the peak memory traced while
+running it.
+
+With --baseline, scenarios whose p99 grew by more than --tolerance or
+whose mean query count grew at all are listed and the exit status is 1,
+so a run can gate a change.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+import sqlalchemy
+from sqlalchemy import event
+
+from benchmarks.data import PASSWORD, generate
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+class Fixture:
+    """Ids the scenarios pick from, all belonging to the logged-in user"""
+
+    def __init__(self, user_id):
+        from models import db, BlogDraft, DraftVersion
+
+        versions = db.session.execute(
+            db.select(DraftVersion.id, DraftVersion.blog_draft_id, DraftVersion.is_current, DraftVersion.share_token)
+            .join(BlogDraft)
+            .where(BlogDraft.user_id == user_id)
+            .order_by(DraftVersion.id)
+        ).all()
+        self.current_versions = [row.id for row in versions if row.is_current]
+        self.share_tokens = [row.share_token for row in versions if row.share_token]
+        by_draft = {}
+        for row in versions:
+            by_draft.setdefault(row.blog_draft_id, []).append(row.id)
+        # Neighbouring versions, the usual thing to compare
+        self.version_pairs = [
+            (ids[index], ids[index + 1]) for ids in by_draft.values() for index in range(len(ids) - 1)
+        ]
+        self.contents = {
+            version_id: db.session.get(DraftVersion, version_id).content for version_id in self.current_versions
+        }
+
+# Scenarios
+#
+# Each takes the fixture and the iteration number and returns the request
+# to make as (method, path, json body or None). Iterations walk through
+# the user's drafts so caches see a realistic spread of keys.
+
+def dashboard(fixture, index):
+    return 'GET', '/dashboard', None
+
+def autosave_storm(fixture, index):
+    version_id = fixture.current_versions[index % len(fixture.current_versions)]
+    content = f'{fixture.contents[version_id]}\n\nAutosave {index}'
+    return 'POST', f'/drafts/versions/{version_id}/save', {'content': content, 'autosave': True}
+
+def preview(fixture, index):
+    version_id = fixture.current_versions[index % len(fixture.current_versions)]
+    content = f'{fixture.contents[version_id]}\n\nTyping {index}'
+    return 'POST', f'/drafts/versions/{version_id}/preview', {'content': content}
+
+def share_view(fixture, index):
+    return 'GET', f'/share/{fixture.share_tokens[index % len(fixture.share_tokens)]}', None
+
+def compare(fixture, index):
+    first, second = fixture.version_pairs[index % len(fixture.version_pairs)]
+    return 'GET', f'/drafts/compare/{first}/{second}', None
+
+def stats(fixture, index):
+    return 'GET', '/api/user/stats', None
+
+SCENARIOS = {
+    'dashboard': dashboard,
+    'autosave_storm': autosave_storm,
+    'preview': preview,
+    'share_view': share_view,
+    'compare': compare,
+    'stats': stats
+}
+
+class QueryCounter:
+    """Counts SQL statements run on the given engines"""
+
+    def __init__(self, engines):
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def run_scenario(client, counter, scenario, fixture, iterations, warmup, memory_iterations):
+    def call(index):
+        method, path, body = scenario(fixture, index)
+        response = client.open(path, method=method, json=body)
+        return response.status_code < 400
+
+    for index in range(warmup):
+        call(index)
+
+    latencies = []
+    queries = []
+    errors = 0
+    started = time.perf_counter()
+    for index in range(warmup, warmup + iterations):
+        before = counter.count
+        request_start = time.perf_counter()
+        errors += not call(index)
+        latencies.append(time.perf_counter() - request_start)
+        queries.append(counter.count - before)
+    elapsed = time.perf_counter() - started
+
+    # Separate pass: tracing allocations slows every request down
+    tracemalloc.start()
+    for index in range(memory_iterations):
+        call(warmup + iterations + index)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'requests': iterations,
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(iterations / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_queries': round(sum(queries) / len(queries), 2) if queries else 0,
+        'max_queries': max(queries, default=0),
+        'peak_memory_bytes': peak
+    }
+
+def make_app(database):
+    import config
+
+    if database == 'memory':
+        config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    elif database:
+        if os.path.exists(database):
+            os.remove(database)
+        config.TestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database
+
+    from app import create_app
+    return create_app('testing')
+
+def regressions(results, baseline, tolerance):
+    """Scenarios slower or chattier than in baseline"""
+    found = []
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if result['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            found.append(f"{name}: p99 {previous['p99_ms']} -> {result['p99_ms']} ms")
+        if result['mean_queries'] > previous['mean_queries']:
+            found.append(f"{name}: queries per request {previous['mean_queries']} -> {result['mean_queries']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help="'memory' or an SQLite file to (re)create")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--memory-iterations', type=int, default=20)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--drafts-per-user', type=int, default=10)
+    parser.add_argument('--versions-per-draft', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON output to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    app = make_app(args.database)
+    from models import db, User
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        data = generate(args.users, args.drafts_per_user, args.versions_per_draft, seed=args.seed)
+        user_id = db.session.scalar(db.select(User.id).order_by(User.id).limit(1))
+        fixture = Fixture(user_id)
+        engines = [db.engine]
+        database_url = db.engine.url.render_as_string(hide_password=True)
+    counter = QueryCounter(engines)
+
+    # Requests run outside any app context so each gets a fresh g
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'user1@example.com', 'password': PASSWORD})
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'database': database_url,
+            'platform': platform.platform()
+        },
+        'data': data,
+        'scenarios': {}
+    }
+    for name in names:
+        results['scenarios'][name] = run_scenario(
+            client, counter, SCENARIOS[name], fixture, args.iterations, args.warmup, args.memory_iterations
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            found = regressions(results, json.load(handle), args.tolerance)
+        for line in found:
+            print(f'regression: {line}', file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
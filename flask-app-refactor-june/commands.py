@@ -0,0 +1,164 @@
+import click
+from flask.cli import with_appcontext
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI"""
+    app.cli.add_command(create_db)
+    app.cli.add_command(compact_versions)
+    app.cli.add_command(refresh_drafts)
+    app.cli.add_command(backfill_counts)
+    app.cli.add_command(reindex_search)
+    app.cli.add_command(import_drafts)
+    app.cli.add_command(prune_versions)
+
+@click.command('create-db')
+@with_appcontext
+def create_db():
+    """Create every table on an empty database and mark all migrations as applied"""
+    from flask_migrate import stamp
+    from models import db
+
+    db.create_all()
+    stamp()
+
+    click.echo(f'Created tables on {db.engine.url.render_as_string(hide_password=True)}')
+
+@click.command('compact-versions')
+@click.option('--draft-id', type=int, default=None, help='Only compact this draft')
+@with_appcontext
+def compact_versions(draft_id):
+    """Re-encode stored version blobs as keyframes plus deltas"""
+    from models import db, BlogDraft, compact_draft_versions
+
+    if draft_id is not None:
+        draft_ids = [draft_id]
+    else:
+        draft_ids = db.session.execute(db.select(BlogDraft.id).order_by(BlogDraft.id)).scalars().all()
+
+    total_before = 0
+    total_after = 0
+    for current_id in draft_ids:
+        before, after = compact_draft_versions(current_id)
+        db.session.commit()
+        total_before += before
+        total_after += after
+
+    click.echo(f'Compacted {len(draft_ids)} drafts: {total_before} -> {total_after} stored characters')
+
+@click.command('refresh-drafts')
+@with_appcontext
+def refresh_drafts():
+    """Recompute the version aggregates stored on every draft"""
+    from models import db, BlogDraft, refresh_draft_aggregates
+
+    draft_ids = db.session.execute(db.select(BlogDraft.id).order_by(BlogDraft.id)).scalars().all()
+    for draft_id in draft_ids:
+        refresh_draft_aggregates(db.session.connection(), draft_id)
+    db.session.commit()
+
+    click.echo(f'Refreshed {len(draft_ids)} drafts')
+
+@click.command('backfill-counts')
+@with_appcontext
+def backfill_counts():
+    """Compute stored word and character counts for existing versions"""
+    from models import db, BlogDraft, DraftVersion, iter_version_texts, refresh_draft_aggregates, text_stats
+
+    table = DraftVersion.__table__
+    draft_ids = db.session.execute(db.select(BlogDraft.id).order_by(BlogDraft.id)).scalars().all()
+    version_total = 0
+    for draft_id in draft_ids:
+        for version_id, stored_size, text in list(iter_version_texts(db.session, draft_id)):
+            word_count, character_count = text_stats(text)
+            db.session.execute(
+                table.update().where(table.c.id == version_id).values(
+                    word_count=word_count,
+                    character_count=character_count,
+                    updated_at=table.c.updated_at
+                )
+            )
+            version_total += 1
+        refresh_draft_aggregates(db.session.connection(), draft_id)
+        db.session.commit()
+
+    click.echo(f'Backfilled counts for {version_total} versions in {len(draft_ids)} drafts')
+
+@click.command('reindex-search')
+@with_appcontext
+def reindex_search():
+    """Rebuild the full-text search index from every draft and version"""
+    from models import db
+    from utils.search import search_index
+
+    draft_total = search_index.rebuild(db.session)
+    db.session.commit()
+
+    click.echo(f'Indexed {draft_total} drafts')
+
+@click.command('import-drafts')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user', 'email', required=True, help='Email of the account that will own the drafts')
+@click.option('--start', type=int, default=0, help='Skip this many records, to resume a failed import')
+@click.option('--batch-size', type=int, default=None, help='Versions written per transaction')
+@with_appcontext
+def import_drafts(source, email, start, batch_size):
+    """Bulk-create drafts from a JSONL file or an export archive (- for stdin)"""
+    from models import db, User
+    from utils.importer import import_drafts as run_import, read_records
+
+    user = db.session.execute(db.select(User).filter_by(email=email)).scalar_one_or_none()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+
+    def progress(report):
+        click.echo(f'{report.next} records, {report.drafts} drafts, {report.versions} versions, '
+                   f'{report.rows_per_second:.0f} rows/s')
+
+    try:
+        records = read_records(source, start)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    report = run_import(db.session, user.id, records, start, batch_size, progress)
+    if report.error is not None:
+        raise click.ClickException(f'{report.error}. Records before {report.next} were imported; '
+                                   f'resume with --start {report.next}')
+
+    click.echo(f'Imported {report.drafts} drafts and {report.versions} versions in {report.seconds:.1f} s '
+               f'({report.rows_per_second:.0f} rows/s)')
+
+@click.command('prune-versions')
+@click.option('--dry-run', is_flag=True, help='Report what would be removed without deleting anything')
+@click.option('--draft-id', type=int, default=None, help='Only prune this draft')
+@click.option('--batch-size', type=int, default=None, help='Versions deleted per transaction')
+@click.option('--full-vacuum', is_flag=True,
+              help='Rebuild an SQLite file with VACUUM first, switching it to incremental vacuum')
+@with_appcontext
+def prune_versions(dry_run, draft_id, batch_size, full_vacuum):
+    """Thin out old untagged versions as configured by VERSION_RETENTION_*"""
+    from flask import current_app
+    from models import db
+    from utils.retention import RetentionPolicy, apply_retention, enable_incremental_vacuum, incremental_vacuum
+
+    if full_vacuum and not dry_run:
+        if enable_incremental_vacuum(db.engine):
+            click.echo('Rebuilt the database with incremental vacuum enabled')
+
+    policy = RetentionPolicy.from_config(current_app.config)
+    batch_size = batch_size or current_app.config['VERSION_RETENTION_BATCH_SIZE']
+
+    def progress(report):
+        verb = 'Would delete' if report.dry_run else 'Deleted'
+        click.echo(f'{verb} {report.deleted} versions so far ({report.reclaimed_bytes / 1024:.0f} KiB)')
+
+    report = apply_retention(db.session, policy, dry_run, batch_size, draft_id, progress=progress)
+    verb = 'Would delete' if dry_run else 'Deleted'
+    click.echo(f'{verb} {report.deleted} of {report.versions} versions in {report.drafts} drafts, '
+               f'reclaiming {report.reclaimed_bytes / 1024:.0f} KiB of stored content')
+
+    if not dry_run and report.deleted:
+        incremental_vacuum(db.engine, report)
+        if report.vacuumed_pages:
+            click.echo(f'Returned {report.vacuumed_pages * report.page_size / 1024:.0f} KiB to the filesystem')
+        elif report.free_pages:
+            click.echo(f'{report.free_pages * report.page_size / 1024:.0f} KiB of free pages will be reused; '
+                       'run with --full-vacuum once to release space after pruning')
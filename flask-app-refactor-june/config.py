@@ -1,26 +1,129 @@
 import os
 from datetime import timedelta
 
+def database_url(value, default):
+    """Database URL from the environment, accepting the legacy postgres:// scheme"""
+    url = value or default
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(config):
+    """Connection pool settings for server databases
+
+    SQLite keeps SQLAlchemy's defaults, which suit a file or in-memory
+    database better than a sized pool.
+    """
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        # Replace connections the server closed while they sat in the pool
+        'pool_pre_ping': True
+    }
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    # Versions are stored as deltas; every Nth link in a chain is a full keyframe
+    VERSION_KEYFRAME_INTERVAL = 16
+    # Number of computed diffs kept in memory for the compare view
+    DIFF_CACHE_ENTRIES = 256
+    # Rendered markdown cache: in-memory LRU budget, plus an optional SQLite
+    # file shared across processes and restarts
+    RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    RENDER_CACHE_PATH = os.environ.get('RENDER_CACHE_PATH')
+    RENDER_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024
+    # Worker processes for markdown rendering (0 renders in the request
+    # thread), the seconds of rendering each request may wait for before
+    # falling back to output without syntax highlighting, and how many
+    # renders may be queued before new ones fall back straight away
+    RENDER_POOL_WORKERS = int(os.environ.get('RENDER_POOL_WORKERS', 0))
+    RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 2.0))
+    RENDER_POOL_MAX_PENDING = None
+    # Seconds autosaves are buffered and coalesced before being written;
+    # 0 writes every save immediately
+    SAVE_BUFFER_INTERVAL = float(os.environ.get('SAVE_BUFFER_INTERVAL', 1.0))
+    # Seconds a user's summary row (profile fields and draft/version totals)
+    # is reused across requests; 0 disables the cache
+    USER_SUMMARY_TTL = float(os.environ.get('USER_SUMMARY_TTL', 30))
+    # Connection pool for server databases such as PostgreSQL: connections
+    # kept open per process, extra ones allowed under load, seconds to wait
+    # for one, and seconds before a connection is replaced
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    # Applied to every connection of an SQLite file database. WAL lets
+    # readers run alongside the writer; NORMAL sync is durable in WAL mode
+    # except for the last commits before a power loss. auto_vacuum only
+    # takes effect on new files (see `flask prune-versions --full-vacuum`)
+    SQLITE_PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY'
+    }
+    # Public share pages: whole responses cached per worker, trusted without
+    # a database check for SHARE_CACHE_TTL seconds (0 disables the cache),
+    # and reusable by shared caches such as a reverse proxy for
+    # SHARE_PAGE_MAX_AGE seconds
+    SHARE_CACHE_TTL = float(os.environ.get('SHARE_CACHE_TTL', 5))
+    SHARE_CACHE_ENTRIES = 512
+    SHARE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    SHARE_PAGE_MAX_AGE = int(os.environ.get('SHARE_PAGE_MAX_AGE', 60))
+    # Request instrumentation: Prometheus metrics at METRICS_PATH (None to
+    # hide it; the endpoint has no authentication, so it is off unless
+    # METRICS_ENABLED=1 is set), an optional Server-Timing header on every
+    # response, and a warning for requests slower than
+    # SLOW_REQUEST_THRESHOLD seconds (0 disables)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_PATH = os.environ.get('METRICS_PATH', '/metrics')
+    METRICS_SERVER_TIMING = False
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+    # Versions written per transaction by bulk imports (a draft is never
+    # split, so a chunk can hold more when one draft has more versions)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    # Version retention: untagged versions that are not current or shared
+    # are kept in full for VERSION_RETENTION_DAYS, then thinned to the last
+    # one per hour, and past VERSION_RETENTION_HOURLY_DAYS to the last one
+    # per day. Deletes are committed VERSION_RETENTION_BATCH_SIZE at a
+    # time. VERSION_RETENTION_INTERVAL seconds between background runs in
+    # each worker; 0 leaves it to `flask prune-versions`
+    VERSION_RETENTION_DAYS = int(os.environ.get('VERSION_RETENTION_DAYS', 14))
+    VERSION_RETENTION_HOURLY_DAYS = int(os.environ.get('VERSION_RETENTION_HOURLY_DAYS', 90))
+    VERSION_RETENTION_BATCH_SIZE = 500
+    VERSION_RETENTION_INTERVAL = float(os.environ.get('VERSION_RETENTION_INTERVAL', 0))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///draft_mode_dev.db'
+    METRICS_ENABLED = True
+    METRICS_SERVER_TIMING = True
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL'), 'sqlite:///draft_mode_dev.db')
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///draft_mode_prod.db'
+    # Set DATABASE_URL to a PostgreSQL server so writers don't queue on one file lock
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL'), 'sqlite:///draft_mode_prod.db')
     # Remove the problematic validation for now
     # SECRET_KEY validation can be done at runtime if needed
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-    WTF_CSRF_ENABLED = False
\ No newline at end of file
+    # A throwaway server database (see utils/local_postgres.py), or in-memory SQLite
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('TEST_DATABASE_URL'), 'sqlite:///:memory:')
+    WTF_CSRF_ENABLED = False
+    SAVE_BUFFER_INTERVAL = 0
+    USER_SUMMARY_TTL = 0
+    METRICS_ENABLED = True
\ No newline at end of file
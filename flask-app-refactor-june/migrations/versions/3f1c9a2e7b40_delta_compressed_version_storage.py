@@ -0,0 +1,54 @@
+"""Delta-compressed version storage
+
+Revision ID: 3f1c9a2e7b40
+Revises: d66593af7daf
+Create Date: 2026-10-18 09:12:31.104822
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2e7b40'
+down_revision = 'd66593af7daf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows stay keyframes until `flask compact-versions` is run
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('delta_base_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('chain_depth', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_draft_versions_delta_base_id'), ['delta_base_id'], unique=False)
+
+
+def downgrade():
+    from utils.delta import apply_delta
+
+    # Expand every delta back into full text before dropping the chain columns
+    connection = op.get_bind()
+    versions = sa.table(
+        'draft_versions',
+        sa.column('id', sa.Integer),
+        sa.column('content', sa.Text),
+        sa.column('delta_base_id', sa.Integer)
+    )
+    rows = connection.execute(
+        sa.select(versions.c.id, versions.c.content, versions.c.delta_base_id).order_by(versions.c.id)
+    ).all()
+    texts = {}
+    for row in rows:
+        if row.delta_base_id is None:
+            texts[row.id] = row.content
+            continue
+        texts[row.id] = apply_delta(texts[row.delta_base_id], row.content)
+        connection.execute(
+            versions.update().where(versions.c.id == row.id).values(content=texts[row.id])
+        )
+
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_draft_versions_delta_base_id'))
+        batch_op.drop_column('chain_depth')
+        batch_op.drop_column('delta_base_id')
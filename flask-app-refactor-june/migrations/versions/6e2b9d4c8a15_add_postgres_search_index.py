@@ -0,0 +1,32 @@
+"""Add full-text search index on PostgreSQL
+
+Revision ID: 6e2b9d4c8a15
+Revises: f3a8c2d51e76
+Create Date: 2026-10-19 11:03:27.940615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.search import PostgresBackend
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2b9d4c8a15'
+down_revision = 'f3a8c2d51e76'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Run `flask reindex-search` afterwards to fill it
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for statement in PostgresBackend.SCHEMA:
+            op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP TABLE IF EXISTS search_index')
@@ -0,0 +1,32 @@
+"""Add indexes for keyset pagination of drafts and versions
+
+Revision ID: 7d2e9f4a1b58
+Revises: e41b7d93a2c6
+Create Date: 2026-10-18 16:12:40.118522
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e9f4a1b58'
+down_revision = 'e41b7d93a2c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blog_drafts', schema=None) as batch_op:
+        batch_op.create_index('ix_blog_drafts_user_updated', ['user_id', 'updated_at', 'id'], unique=False)
+
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.create_index('ix_draft_versions_draft_created', ['blog_draft_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_index('ix_draft_versions_draft_created')
+
+    with op.batch_alter_table('blog_drafts', schema=None) as batch_op:
+        batch_op.drop_index('ix_blog_drafts_user_updated')
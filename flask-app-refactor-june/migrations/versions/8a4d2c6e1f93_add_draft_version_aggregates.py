@@ -0,0 +1,58 @@
+"""Add denormalized version aggregates to blog_drafts
+
+Revision ID: 8a4d2c6e1f93
+Revises: 3f1c9a2e7b40
+Create Date: 2026-10-18 11:40:07.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d2c6e1f93'
+down_revision = '3f1c9a2e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blog_drafts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('current_version_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('has_final', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('current_word_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('current_char_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_edited_at', sa.DateTime(), nullable=True))
+
+    # Word and character counts need the version text; run
+    # `flask refresh-drafts` after upgrading to fill them in
+    op.execute("""
+        UPDATE blog_drafts SET
+            version_count = (
+                SELECT COUNT(*) FROM draft_versions WHERE draft_versions.blog_draft_id = blog_drafts.id
+            ),
+            has_final = EXISTS (
+                SELECT 1 FROM draft_versions
+                WHERE draft_versions.blog_draft_id = blog_drafts.id AND draft_versions.tag = 'final'
+            ),
+            last_edited_at = (
+                SELECT MAX(updated_at) FROM draft_versions WHERE draft_versions.blog_draft_id = blog_drafts.id
+            ),
+            current_version_id = (
+                SELECT id FROM draft_versions
+                WHERE draft_versions.blog_draft_id = blog_drafts.id
+                ORDER BY is_current DESC, created_at DESC, id DESC
+                LIMIT 1
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('blog_drafts', schema=None) as batch_op:
+        batch_op.drop_column('last_edited_at')
+        batch_op.drop_column('current_char_count')
+        batch_op.drop_column('current_word_count')
+        batch_op.drop_column('has_final')
+        batch_op.drop_column('current_version_id')
+        batch_op.drop_column('version_count')
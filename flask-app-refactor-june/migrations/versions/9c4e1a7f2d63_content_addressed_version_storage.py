@@ -0,0 +1,166 @@
+"""Content-addressed version storage
+
+Revision ID: 9c4e1a7f2d63
+Revises: b58e3c1d9f07
+Create Date: 2026-10-18 21:40:17.552093
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e1a7f2d63'
+down_revision = 'b58e3c1d9f07'
+branch_labels = None
+depends_on = None
+
+# Chain length cap for the blobs written here; `flask compact-versions`
+# re-encodes them with the configured VERSION_KEYFRAME_INTERVAL
+KEYFRAME_INTERVAL = 16
+
+versions = sa.table(
+    'draft_versions',
+    sa.column('id', sa.Integer),
+    sa.column('blog_draft_id', sa.Integer),
+    sa.column('content', sa.Text),
+    sa.column('delta_base_id', sa.Integer),
+    sa.column('content_hash', sa.String)
+)
+
+blobs = sa.table(
+    'content_blobs',
+    sa.column('hash', sa.String),
+    sa.column('content', sa.Text),
+    sa.column('base_hash', sa.String),
+    sa.column('chain_depth', sa.Integer),
+    sa.column('ref_count', sa.Integer)
+)
+
+
+def upgrade():
+    from utils.delta import apply_delta, make_delta
+
+    op.create_table('content_blobs',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('base_hash', sa.String(length=64), nullable=True),
+    sa.Column('chain_depth', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    with op.batch_alter_table('content_blobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_content_blobs_base_hash'), ['base_hash'], unique=False)
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Decode every draft's old delta chain and store each distinct text once,
+    # as a delta against the text of the version before it where that is smaller
+    connection = op.get_bind()
+    draft_ids = connection.execute(
+        sa.select(versions.c.blog_draft_id).distinct().order_by(versions.c.blog_draft_id)
+    ).scalars().all()
+    depths = {}
+    for draft_id in draft_ids:
+        rows = connection.execute(
+            sa.select(versions.c.id, versions.c.content, versions.c.delta_base_id)
+            .where(versions.c.blog_draft_id == draft_id)
+            .order_by(versions.c.id)
+        ).all()
+        texts = {}
+        previous = None
+        new_blobs = []
+        refs = {}
+        hashes = []
+        for row in rows:
+            if row.delta_base_id is None:
+                text = row.content
+            else:
+                text = apply_delta(texts[row.delta_base_id], row.content)
+            texts[row.id] = text
+            text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if text_hash not in depths:
+                stored, base_hash, depth = text, None, 0
+                if previous is not None and depths[previous[0]] + 1 < KEYFRAME_INTERVAL:
+                    delta = make_delta(previous[1], text)
+                    if len(delta) < len(text):
+                        stored, base_hash, depth = delta, previous[0], depths[previous[0]] + 1
+                new_blobs.append({
+                    'hash': text_hash, 'content': stored, 'base_hash': base_hash,
+                    'chain_depth': depth, 'ref_count': 0
+                })
+                depths[text_hash] = depth
+            refs[text_hash] = refs.get(text_hash, 0) + 1
+            hashes.append({'version_id': row.id, 'content_hash': text_hash})
+            previous = (text_hash, text)
+
+        if new_blobs:
+            connection.execute(blobs.insert(), new_blobs)
+        connection.execute(
+            blobs.update().where(blobs.c.hash == sa.bindparam('blob_hash'))
+            .values(ref_count=blobs.c.ref_count + sa.bindparam('refs')),
+            [{'blob_hash': blob_hash, 'refs': count} for blob_hash, count in refs.items()]
+        )
+        connection.execute(
+            versions.update().where(versions.c.id == sa.bindparam('version_id'))
+            .values(content_hash=sa.bindparam('content_hash')),
+            hashes
+        )
+
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_draft_versions_delta_base_id'))
+        batch_op.drop_column('chain_depth')
+        batch_op.drop_column('delta_base_id')
+        batch_op.drop_column('content')
+        batch_op.alter_column('content_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index(batch_op.f('ix_draft_versions_content_hash'), ['content_hash'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_draft_versions_content_hash_content_blobs', 'content_blobs', ['content_hash'], ['hash']
+        )
+
+
+def downgrade():
+    from utils.delta import apply_delta
+
+    # Every version gets its full text back as a keyframe
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('delta_base_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('chain_depth', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_draft_versions_delta_base_id'), ['delta_base_id'], unique=False)
+
+    connection = op.get_bind()
+    stored = {
+        row.hash: (row.content, row.base_hash)
+        for row in connection.execute(sa.select(blobs.c.hash, blobs.c.content, blobs.c.base_hash))
+    }
+    texts = {}
+
+    def text_of(blob_hash):
+        chain = []
+        while blob_hash not in texts and stored[blob_hash][1] is not None:
+            chain.append(blob_hash)
+            blob_hash = stored[blob_hash][1]
+        text = texts.setdefault(blob_hash, stored[blob_hash][0])
+        for link in reversed(chain):
+            text = texts[link] = apply_delta(text, stored[link][0])
+        return text
+
+    rows = connection.execute(sa.select(versions.c.id, versions.c.content_hash)).all()
+    if rows:
+        connection.execute(
+            versions.update().where(versions.c.id == sa.bindparam('version_id'))
+            .values(content=sa.bindparam('text')),
+            [{'version_id': row.id, 'text': text_of(row.content_hash)} for row in rows]
+        )
+
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_draft_versions_content_hash_content_blobs', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_draft_versions_content_hash'))
+        batch_op.drop_column('content_hash')
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=False)
+    with op.batch_alter_table('content_blobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_content_blobs_base_hash'))
+    op.drop_table('content_blobs')
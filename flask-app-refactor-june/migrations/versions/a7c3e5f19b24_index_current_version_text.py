@@ -0,0 +1,45 @@
+"""Index only each draft's current version text
+
+Revision ID: a7c3e5f19b24
+Revises: 6e2b9d4c8a15
+Create Date: 2026-10-21 09:42:18.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.search import FTS5Backend, PostgresBackend
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f19b24'
+down_revision = '6e2b9d4c8a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Content rows are now keyed by draft, so the old rows can't be kept; run
+    # `flask reindex-search` afterwards to fill the new table
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and FTS5Backend.available():
+        op.execute('DROP TABLE IF EXISTS search_index')
+        op.execute(FTS5Backend.SCHEMA)
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP TABLE IF EXISTS search_index')
+        for statement in PostgresBackend.SCHEMA:
+            op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and FTS5Backend.available():
+        op.execute('DROP TABLE IF EXISTS search_index')
+        op.execute(
+            'CREATE VIRTUAL TABLE search_index USING fts5('
+            'owner, title, description, content, draft_id UNINDEXED, version_id UNINDEXED, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DELETE FROM search_index')
+        op.execute('ALTER TABLE search_index DROP COLUMN content_hash, ADD COLUMN version_id INTEGER')
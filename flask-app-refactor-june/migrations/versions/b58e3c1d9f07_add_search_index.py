@@ -0,0 +1,32 @@
+"""Add full-text search index
+
+Revision ID: b58e3c1d9f07
+Revises: 7d2e9f4a1b58
+Create Date: 2026-10-18 18:05:12.406931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.search import FTS5Backend
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e3c1d9f07'
+down_revision = '7d2e9f4a1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only SQLite builds with FTS5 keep the index in the database; run
+    # `flask reindex-search` afterwards to fill it
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and FTS5Backend.available():
+        op.execute(FTS5Backend.SCHEMA)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_index')
@@ -0,0 +1,30 @@
+"""Add stored word and character counts to draft_versions
+
+Revision ID: c27e5b91d4a8
+Revises: 8a4d2c6e1f93
+Create Date: 2026-10-18 14:03:55.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27e5b91d4a8'
+down_revision = '8a4d2c6e1f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Counts need the rebuilt version text; run `flask backfill-counts`
+    # after upgrading to fill them in for existing rows
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('word_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('character_count', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_column('character_count')
+        batch_op.drop_column('word_count')
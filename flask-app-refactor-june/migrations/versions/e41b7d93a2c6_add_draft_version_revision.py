@@ -0,0 +1,26 @@
+"""Add revision counter to draft_versions for patch-based saves
+
+Revision ID: e41b7d93a2c6
+Revises: c27e5b91d4a8
+Create Date: 2026-10-18 15:41:12.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7d93a2c6'
+down_revision = 'c27e5b91d4a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_column('revision')
@@ -0,0 +1,28 @@
+"""Add saved_revision to draft_versions so revisions can be claimed before content is written
+
+Revision ID: f3a8c2d51e76
+Revises: 9c4e1a7f2d63
+Create Date: 2026-10-19 10:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c2d51e76'
+down_revision = '9c4e1a7f2d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('saved_revision', sa.Integer(), nullable=False, server_default='0'))
+    # Until now the stored revision always matched the stored content
+    op.execute('UPDATE draft_versions SET saved_revision = revision')
+
+
+def downgrade():
+    with op.batch_alter_table('draft_versions', schema=None) as batch_op:
+        batch_op.drop_column('saved_revision')
@@ -1,15 +1,31 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from collections import Counter, OrderedDict, defaultdict
 from datetime import datetime
+import hashlib
 import secrets
 
 # Import db from the main app module
 from flask import current_app
-from sqlalchemy import event
+from sqlalchemy import LargeBinary, bindparam, case, cast, event, func, insert, literal, or_, select
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from utils.delta import make_delta, apply_delta
+from utils.search import search_index
+from utils.share_cache import share_cache
+from utils.user_cache import user_summary_cache
 
 # We'll define db here and import it in app.py
 db = SQLAlchemy()
 
+# Tags at most one version of a draft can carry
+UNIQUE_TAGS = ('final', 'ready_for_review', 'working')
+
+def text_stats(text):
+    """Word and character counts for a version body"""
+    return len(text.split()), len(text)
+
 class User(db.Model):
     """User model for authentication and draft ownership"""
     __tablename__ = 'users'
@@ -32,15 +48,35 @@ class User(db.Model):
         """Check if provided password matches hash"""
         return check_password_hash(self.password_hash, password)
     
+    def draft_totals(self):
+        """(drafts, versions) owned by this user, from one aggregate query
+        
+        Versions are counted from the version_count kept on each draft. The
+        result is remembered until the instance is next expired, which for
+        the request's session means until the next commit.
+        """
+        totals = getattr(self, '_draft_totals', None)
+        if totals is None:
+            drafts = BlogDraft.__table__
+            session = object_session(self) or db.session
+            totals = tuple(session.execute(
+                select(
+                    func.count(drafts.c.id),
+                    func.coalesce(func.sum(drafts.c.version_count), 0)
+                ).where(drafts.c.user_id == self.id)
+            ).one())
+            self._draft_totals = totals
+        return totals
+    
     @property
     def total_drafts(self):
         """Get total number of drafts for this user"""
-        return len(self.blog_drafts)
+        return self.draft_totals()[0]
     
     @property
     def total_versions(self):
         """Get total number of versions across all drafts"""
-        return sum(len(draft.versions) for draft in self.blog_drafts)
+        return self.draft_totals()[1]
     
     def to_dict(self):
         """Convert user to dictionary for JSON serialization"""
@@ -60,6 +96,8 @@ class User(db.Model):
 class BlogDraft(db.Model):
     """Blog draft model to organize multiple versions"""
     __tablename__ = 'blog_drafts'
+    # Keyset pagination of a user's drafts, newest first
+    __table_args__ = (db.Index('ix_blog_drafts_user_updated', 'user_id', 'updated_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -68,17 +106,23 @@ class BlogDraft(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Aggregates over versions, maintained by the DraftVersion listeners below
+    version_count = db.Column(db.Integer, nullable=False, default=0)
+    current_version_id = db.Column(db.Integer, nullable=True)
+    has_final = db.Column(db.Boolean, nullable=False, default=False)
+    current_word_count = db.Column(db.Integer, nullable=False, default=0)
+    current_char_count = db.Column(db.Integer, nullable=False, default=0)
+    last_edited_at = db.Column(db.DateTime, nullable=True)
+    
     # Relationships
     versions = db.relationship('DraftVersion', backref='blog_draft', lazy=True, cascade='all, delete-orphan', order_by='DraftVersion.created_at.desc()')
-    
-    @property
-    def current_version(self):
-        """Get the current active version"""
-        current = DraftVersion.query.filter_by(blog_draft_id=self.id, is_current=True).first()
-        if not current and self.versions:
-            # If no current version is set, return the latest one
-            current = self.versions[0]  # versions are ordered by created_at desc in relationship
-        return current
+    # The version flagged current, or the latest one if none is flagged
+    current_version = db.relationship(
+        'DraftVersion',
+        primaryjoin='foreign(BlogDraft.current_version_id) == DraftVersion.id',
+        viewonly=True,
+        uselist=False
+    )
     
     @property
     def latest_version(self):
@@ -88,12 +132,12 @@ class BlogDraft(db.Model):
     @property
     def has_final_version(self):
         """Check if any version is marked as final"""
-        return any(version.tag == 'final' for version in self.versions)
+        return bool(self.has_final)
     
     @property
     def status(self):
         """Get draft status based on versions"""
-        if not self.versions:
+        if not self.version_count:
             return 'empty'
         elif self.has_final_version:
             return 'final'
@@ -111,7 +155,7 @@ class BlogDraft(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'status': self.status,
             'has_final_version': self.has_final_version,
-            'version_count': len(self.versions) if self.versions else 0
+            'version_count': self.version_count
         }
     
     def __repr__(self):
@@ -120,32 +164,64 @@ class BlogDraft(db.Model):
 class DraftVersion(db.Model):
     """Individual version of a blog draft"""
     __tablename__ = 'draft_versions'
+    # Keyset pagination of a draft's versions, newest first
+    __table_args__ = (db.Index('ix_draft_versions_draft_created', 'blog_draft_id', 'created_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     version_name = db.Column(db.String(100), nullable=False)
-    content = db.Column(db.Text, nullable=False, default='')
+    # SHA-256 of the body, which is stored once in content_blobs. Always
+    # read and write through `content`. The old value is kept on change so
+    # the flush can drop its reference.
+    content_hash = db.column_property(
+        db.Column(db.String(64), db.ForeignKey('content_blobs.hash'), nullable=False, index=True),
+        active_history=True
+    )
     blog_draft_id = db.Column(db.Integer, db.ForeignKey('blog_drafts.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_current = db.Column(db.Boolean, default=False)
     share_token = db.Column(db.String(32), unique=True, nullable=True, index=True)
     tag = db.Column(db.String(50), default='draft')  # New tag field: draft, final, ready_for_review, working
+    # Text statistics, computed whenever content is written
+    word_count = db.Column(db.Integer, nullable=False, default=0)
+    character_count = db.Column(db.Integer, nullable=False, default=0)
+    # Revision of the stored content; patches name the revision they apply
+    # to. Saves still buffered in a process count on from it in memory
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    saved_revision = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def content(self):
+        """Full markdown body, rebuilt from its blob's delta chain when needed"""
+        cached = getattr(self, '_materialized_content', None)
+        if cached is None:
+            if self.content_hash is None:
+                return ''
+            cached = load_blob_text(object_session(self) or db.session, self.content_hash)
+            self._materialized_content = cached
+        return cached
+    
+    @content.setter
+    def content(self, value):
+        """Point at the blob for new content; it is written at flush time"""
+        value = value or ''
+        self.content_hash = hash_text(value)
+        self._materialized_content = value
+        self._content_pending = True
+        self.word_count, self.character_count = text_stats(value)
+    
+    def copy_content_from(self, other):
+        """Share other's body without reading or copying it"""
+        self.content_hash = other.content_hash
+        self._materialized_content = getattr(other, '_materialized_content', None)
+        self.word_count = other.word_count
+        self.character_count = other.character_count
     
     def generate_share_token(self):
         """Generate a unique share token for public access"""
         if not self.share_token:
             self.share_token = secrets.token_urlsafe(16)
     
-    @property
-    def word_count(self):
-        """Get word count for this version"""
-        return len(self.content.split()) if self.content else 0
-    
-    @property
-    def character_count(self):
-        """Get character count for this version"""
-        return len(self.content) if self.content else 0
-    
     @property
     def is_final(self):
         """Check if this version is marked as final"""
@@ -164,20 +240,102 @@ class DraftVersion(db.Model):
             }.get(self.tag, self.tag.upper())
             return f"{self.version_name} [{tag_display}]"
     
+    def store_revision(self, base_revision, revision):
+        """Record revision as that of the stored content and return the
+        revision actually stored
+
+        That is revision itself when the stored content was still at
+        base_revision. Otherwise another process saved in between, and the
+        stored revision is moved past both, so no revision handed out for
+        either save matches it any more and their editors resync with a
+        full save. Stored revisions never go back. One UPDATE; doesn't
+        commit.
+        """
+        table = DraftVersion.__table__
+        stored = case(
+            ((table.c.saved_revision == base_revision) & (table.c.saved_revision < revision), revision),
+            (table.c.saved_revision > revision, table.c.saved_revision + 1),
+            else_=revision + 1
+        )
+        stored_revision = db.session.execute(
+            table.update()
+            .where(table.c.id == self.id)
+            .values(revision=stored, saved_revision=stored, updated_at=table.c.updated_at)
+            .returning(table.c.saved_revision)
+        ).scalar()
+        if stored_revision is not None:
+            set_committed_value(self, 'revision', stored_revision)
+            set_committed_value(self, 'saved_revision', stored_revision)
+        return stored_revision
+
     def set_as_current(self):
-        """Set this version as the current one"""
-        # Unset other current versions for this draft
-        DraftVersion.query.filter_by(blog_draft_id=self.blog_draft_id, is_current=True).update({'is_current': False})
-        self.is_current = True
-        db.session.commit()
+        """Make this the draft's current version; False if it already was
+        
+        Only rows whose flag is wrong are updated, in one statement, and
+        nothing is written when the state is already correct. Doesn't commit.
+        """
+        table = DraftVersion.__table__
+        is_self = table.c.id == self.id
+        return self._transition(
+            table.c.is_current.is_distinct_from(is_self),
+            'is_current',
+            case((is_self, True), else_=False),
+            lambda version, value: version is self
+        )
     
     def set_tag(self, new_tag):
-        """Set tag and ensure uniqueness for special tags"""
-        if new_tag in ['final', 'ready_for_review', 'working']:
-            # Remove this tag from other versions in the same draft
-            DraftVersion.query.filter_by(blog_draft_id=self.blog_draft_id, tag=new_tag).update({'tag': 'draft'})
-        self.tag = new_tag
-        db.session.commit()
+        """Set tag and ensure uniqueness for special tags; False if nothing changed
+        
+        Written like set_as_current and doesn't commit either.
+        """
+        table = DraftVersion.__table__
+        is_self = table.c.id == self.id
+        if new_tag in UNIQUE_TAGS:
+            # Other versions holding this tag drop back to draft
+            value = case((is_self, new_tag), else_='draft')
+            rows = or_(is_self, table.c.tag == new_tag)
+        else:
+            value = new_tag
+            rows = is_self
+        
+        def tag_for(version, tag):
+            if version is self:
+                return new_tag
+            return 'draft' if new_tag in UNIQUE_TAGS and tag == new_tag else tag
+        
+        return self._transition(rows & table.c.tag.is_distinct_from(value), 'tag', value, tag_for)
+    
+    def _transition(self, condition, key, value, value_for):
+        """Set key to value on this draft's versions matching condition, and
+        mirror the change into the session
+        
+        value_for(version, loaded_value) gives the new value for each version
+        of the draft loaded in the session. Returns False without writing if
+        no row matches.
+        """
+        table = DraftVersion.__table__
+        condition = (table.c.blog_draft_id == self.blog_draft_id) & condition
+        # Check with a read first: the common case is a no-op, and an UPDATE
+        # takes the write lock even when it matches nothing
+        if db.session.scalar(select(table.c.id).where(condition).limit(1)) is None:
+            return False
+        
+        # Version timestamps track content edits, so leave them alone
+        db.session.execute(
+            table.update().where(condition).values({key: value, 'updated_at': table.c.updated_at})
+        )
+        for state in list(db.session.identity_map.all_states()):
+            loaded = state.dict
+            if (state.class_ is DraftVersion and key in loaded
+                    and loaded.get('blog_draft_id') == self.blog_draft_id):
+                set_committed_value(state.obj(), key, value_for(state.obj(), loaded[key]))
+        connection = db.session.connection()
+        _sync_draft_aggregates(connection, self, touch=True)
+        share_cache.mark_draft_changed(db.session, self.blog_draft_id)
+        if key == 'is_current':
+            # The draft's current word count moves with the flag
+            user_summary_cache.mark_changed(db.session, _draft_owner(connection, db.session, self.blog_draft_id))
+        return True
     
     def to_dict(self):
         """Convert version to dictionary for JSON serialization"""
@@ -193,6 +351,7 @@ class DraftVersion(db.Model):
             'tag': self.tag,
             'word_count': self.word_count,
             'character_count': self.character_count,
+            'revision': self.saved_revision,
             'is_final': self.is_final,
             'display_name': self.display_name
         }
@@ -200,27 +359,696 @@ class DraftVersion(db.Model):
     def __repr__(self):
         return f'<DraftVersion {self.version_name} for {self.blog_draft.title}>'
 
+class ContentBlob(db.Model):
+    """A distinct version body, stored once and keyed by its SHA-256"""
+    __tablename__ = 'content_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    # Full markdown for keyframes, or a delta against base_hash otherwise
+    content = db.Column(db.Text, nullable=False)
+    base_hash = db.Column(db.String(64), nullable=True, index=True)
+    chain_depth = db.Column(db.Integer, nullable=False, default=0)
+    # Versions pointing at this blob
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ContentBlob {self.hash[:12]}>'
+
+# Content-addressed version storage
+#
+# Version bodies live in content_blobs, one row per distinct text keyed by
+# its SHA-256, and versions refer to them by content_hash. Identical texts
+# (duplicates, restores, saves that change nothing, the same post in
+# another account) share a blob, so copying a version is a metadata insert.
+# Each blob is a keyframe or a delta against another blob, normally the
+# one of the version before it in the draft, and chains are capped at
+# VERSION_KEYFRAME_INTERVAL links.
+#
+# ref_count counts the versions pointing at a blob. References are taken
+# before a flush writes versions and dropped after it, and a blob left
+# with none is deleted; blobs that were deltas against it are re-encoded
+# against its own base first. A blob's text never changes, only its
+# encoding.
+
+# Decoded texts kept while walking a draft's versions in order
+RECENT_TEXTS = 8
+
+def hash_text(text):
+    """Key of the blob holding text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _dialect_name(connection):
+    """Database dialect of a connection or session"""
+    return connection.get_bind().dialect.name if hasattr(connection, 'get_bind') else connection.dialect.name
+
+def stored_bytes(connection, blobs):
+    """Size of a blob's stored body in bytes rather than characters"""
+    if _dialect_name(connection) == 'postgresql':
+        # A cast to bytea would read backslashes in the text as escapes
+        return func.octet_length(blobs.c.content)
+    return func.length(cast(blobs.c.content, LargeBinary))
+
+def _fetch_chain(connection, start):
+    """Fetch stored blobs from start (a hash or a scalar subquery) down to its keyframe in one query"""
+    table = ContentBlob.__table__
+    chain = select(
+        table.c.hash, table.c.content, table.c.base_hash, literal(0).label('hop')
+    ).where(table.c.hash == start).cte('chain', recursive=True)
+    chain = chain.union_all(
+        select(table.c.hash, table.c.content, table.c.base_hash, chain.c.hop + 1)
+        .where(table.c.hash == chain.c.base_hash)
+    )
+    return connection.execute(
+        select(chain.c.hash, chain.c.content, chain.c.base_hash, chain.c.hop).order_by(chain.c.hop)
+    ).all()
+
+def _decode_chain(rows, name):
+    if not rows or rows[-1].base_hash is not None:
+        raise LookupError(f'Broken delta chain for {name}')
+    text = rows[-1].content
+    for row in reversed(rows[:-1]):
+        text = apply_delta(text, row.content)
+    return text
+
+def load_blob_text(connection, blob_hash):
+    """Reconstruct the full text of a stored blob"""
+    return _decode_chain(_fetch_chain(connection, blob_hash), f'content blob {blob_hash}')
+
+def load_version_text(session, version_id, use_identity_map=True):
+    """Reconstruct the full text of a stored version"""
+    if use_identity_map:
+        loaded = session.identity_map.get(identity_key(DraftVersion, version_id))
+        if loaded is not None and getattr(loaded, '_materialized_content', None) is not None:
+            return loaded._materialized_content
+    
+    versions = DraftVersion.__table__
+    start = select(versions.c.content_hash).where(versions.c.id == version_id).scalar_subquery()
+    return _decode_chain(_fetch_chain(session, start), f'draft version {version_id}')
+
+def encode_version(base_text, text, base_depth, keyframe_interval):
+    """Pick the stored form for text: (stored, uses_base, chain_depth)"""
+    if base_text is None or base_depth + 1 >= keyframe_interval:
+        return text, False, 0
+    delta = make_delta(base_text, text)
+    if len(delta) >= len(text):
+        return text, False, 0
+    return delta, True, base_depth + 1
+
+def _insert_blobs(connection, rows):
+    """Insert blob rows, skipping any another transaction has just added"""
+    table = ContentBlob.__table__
+    dialect = _dialect_name(connection)
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        connection.execute(insert(table), rows)
+        return
+    connection.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=['hash']), rows)
+
+def store_blobs(connection, entries, keyframe_interval):
+    """Make sure a blob exists for the text of every (text, base_hash) entry
+    
+    base_hash names the blob to encode against: an existing one, the hash
+    of an earlier entry's text, or None for a keyframe. Only missing blobs
+    are encoded and written, with no references. Returns the entries'
+    hashes in order.
+    """
+    table = ContentBlob.__table__
+    hashes = [hash_text(text) for text, _ in entries]
+    wanted = set(hashes) | {base for _, base in entries if base is not None}
+    # Bases are share-locked where the database supports it, so a
+    # concurrent cleanup can't delete one out from under a new delta
+    depths = dict(connection.execute(
+        select(table.c.hash, table.c.chain_depth).where(table.c.hash.in_(wanted)).with_for_update(read=True)
+    ).all())
+    
+    texts = {}
+    rows = []
+    for (text, base), blob_hash in zip(entries, hashes):
+        texts.setdefault(blob_hash, text)
+        if blob_hash in depths:
+            continue
+        base_text = None
+        if base is not None and base in depths:
+            if base not in texts:
+                texts[base] = load_blob_text(connection, base)
+            base_text = texts[base]
+        stored, uses_base, depth = encode_version(base_text, text, depths.get(base, 0), keyframe_interval)
+        rows.append({
+            'hash': blob_hash,
+            'content': stored,
+            'base_hash': base if uses_base else None,
+            'chain_depth': depth,
+            'ref_count': 0
+        })
+        depths[blob_hash] = depth
+    if rows:
+        _insert_blobs(connection, rows)
+    return hashes
+
+def adjust_refs(connection, counts):
+    """Add counts ({hash: change}) to the blobs' reference counts"""
+    table = ContentBlob.__table__
+    changes = [{'blob_hash': blob_hash, 'change': change} for blob_hash, change in counts.items() if change]
+    if changes:
+        connection.execute(
+            table.update().where(table.c.hash == bindparam('blob_hash'))
+            .values(ref_count=table.c.ref_count + bindparam('change')),
+            changes
+        )
+
+def refresh_chain_depths(connection, hashes, keyframe_interval):
+    """Recompute chain_depth for every blob encoded against one of hashes,
+    directly or further down, after those were re-encoded or rebased
+    
+    Depths count on from the stored depth of the blobs in hashes. A blob
+    that would reach keyframe_interval is stored as a keyframe instead,
+    which starts the count again for the blobs below it. Returns the
+    number of blobs rewritten as keyframes.
+    """
+    table = ContentBlob.__table__
+    tree = select(table.c.hash, table.c.base_hash, table.c.chain_depth).where(
+        table.c.hash.in_(list(hashes))
+    ).cte('tree', recursive=True)
+    tree = tree.union(
+        select(table.c.hash, table.c.base_hash, table.c.chain_depth).where(table.c.base_hash == tree.c.hash)
+    )
+    rows = connection.execute(select(tree.c.hash, tree.c.base_hash, tree.c.chain_depth)).all()
+    
+    stored_depths = {row.hash: row.chain_depth for row in rows}
+    children = defaultdict(list)
+    queue = []
+    for row in rows:
+        if row.base_hash in stored_depths:
+            children[row.base_hash].append(row.hash)
+        else:
+            queue.append((row.hash, row.chain_depth))
+    
+    moved = []
+    keyframes = []
+    while queue:
+        blob_hash, depth = queue.pop()
+        for child in children[blob_hash]:
+            child_depth = depth + 1
+            if child_depth >= keyframe_interval:
+                keyframes.append({'blob_hash': child, 'stored': load_blob_text(connection, child)})
+                child_depth = 0
+            elif child_depth != stored_depths[child]:
+                moved.append({'blob_hash': child, 'depth': child_depth})
+            queue.append((child, child_depth))
+    
+    if moved:
+        connection.execute(
+            table.update().where(table.c.hash == bindparam('blob_hash')).values(chain_depth=bindparam('depth')),
+            moved
+        )
+    if keyframes:
+        connection.execute(
+            table.update().where(table.c.hash == bindparam('blob_hash'))
+            .values(content=bindparam('stored'), base_hash=None, chain_depth=0),
+            keyframes
+        )
+    return len(keyframes)
+
+def plan_blob_release(connection, released, keyframe_interval):
+    """What dropping the references in released ({hash: count}) would do:
+    (dead hashes, rebased blob rows, stored bytes freed)
+    
+    A blob dies when nothing refers to it any more. Blobs encoded against a
+    dead one are re-encoded against its nearest surviving base, so the
+    freed bytes are net of what they grow by.
+    """
+    table = ContentBlob.__table__
+    rows = connection.execute(
+        select(table.c.hash, table.c.base_hash, table.c.ref_count, stored_bytes(connection, table).label('size'))
+        .where(table.c.hash.in_(list(released)))
+    ).all()
+    dead = {row.hash: row for row in rows if row.ref_count - released.get(row.hash, 0) <= 0}
+    if not dead:
+        return [], [], 0
+    
+    freed = sum(row.size for row in dead.values())
+    children = connection.execute(
+        select(table.c.hash, table.c.base_hash, stored_bytes(connection, table).label('size'))
+        .where(table.c.base_hash.in_(list(dead)), table.c.hash.notin_(list(dead)))
+    ).all()
+    depths = {}
+    texts = {}
+    
+    def text_of(blob_hash):
+        if blob_hash not in texts:
+            texts[blob_hash] = load_blob_text(connection, blob_hash)
+        return texts[blob_hash]
+    
+    rebased = []
+    for child in children:
+        base = child.base_hash
+        while base in dead:
+            base = dead[base].base_hash
+        if base is not None and base not in depths:
+            depths[base] = connection.execute(select(table.c.chain_depth).where(table.c.hash == base)).scalar()
+        stored, uses_base, depth = encode_version(
+            text_of(base) if base is not None else None, text_of(child.hash), depths.get(base, 0), keyframe_interval
+        )
+        rebased.append({
+            'blob_hash': child.hash,
+            'stored': stored,
+            'new_base': base if uses_base else None,
+            'depth': depth
+        })
+        freed -= len(stored.encode('utf-8')) - child.size
+    return list(dead), rebased, freed
+
+def release_blobs(connection, released, keyframe_interval):
+    """Drop references ({hash: count}) and delete blobs nothing refers to any more
+    
+    Returns the stored bytes freed.
+    """
+    table = ContentBlob.__table__
+    adjust_refs(connection, {blob_hash: -count for blob_hash, count in released.items()})
+    dead, rebased, freed = plan_blob_release(connection, dict.fromkeys(released, 0), keyframe_interval)
+    if rebased:
+        connection.execute(
+            table.update().where(table.c.hash == bindparam('blob_hash')).values(
+                content=bindparam('stored'),
+                base_hash=bindparam('new_base'),
+                chain_depth=bindparam('depth')
+            ),
+            rebased
+        )
+    if dead:
+        # Rechecked in case another transaction took a reference meanwhile;
+        # its dependents were already moved off it either way
+        connection.execute(table.delete().where(table.c.hash.in_(dead), table.c.ref_count <= 0))
+    if rebased:
+        # Blobs further down moved up or down the chain with their base
+        refresh_chain_depths(connection, [row['blob_hash'] for row in rebased], keyframe_interval)
+    return freed
+
+def _committed_hash(session, version):
+    """content_hash as stored before this flush"""
+    history = db.inspect(version).attrs.content_hash.history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    table = DraftVersion.__table__
+    return session.execute(select(table.c.content_hash).where(table.c.id == version.id)).scalar()
+
+def _previous_hash(session, version, deleted_ids):
+    """Blob of the version before this one in its draft, to encode against"""
+    if version.blog_draft_id is None:
+        return None
+    table = DraftVersion.__table__
+    query = select(table.c.content_hash).where(table.c.blog_draft_id == version.blog_draft_id)
+    if version.id is not None:
+        query = query.where(table.c.id < version.id)
+    if deleted_ids:
+        query = query.where(table.c.id.notin_(deleted_ids))
+    return session.execute(query.order_by(table.c.id.desc()).limit(1)).scalar()
+
+@event.listens_for(db.session, 'before_flush')
+def store_version_content(session, flush_context, instances):
+    """Write blobs for new content and take the references versions will hold"""
+    deleted = [obj for obj in session.deleted if isinstance(obj, DraftVersion) and obj.id is not None]
+    new = [obj for obj in session.new if isinstance(obj, DraftVersion)]
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, DraftVersion) and db.inspect(obj).attrs.content_hash.history.has_changes()
+    ]
+    session.info['released_blobs'] = Counter()
+    if not deleted and not new and not changed:
+        return
+    
+    for version in new:
+        if version.content_hash is None:
+            version.content = ''
+    
+    deleted_ids = {version.id for version in deleted}
+    pending = [version for version in new + changed if getattr(version, '_content_pending', False)]
+    if pending:
+        connection = session.connection()
+        entries = [(version.content, _previous_hash(session, version, deleted_ids)) for version in pending]
+        store_blobs(connection, entries, current_app.config.get('VERSION_KEYFRAME_INTERVAL', 16))
+        for version in pending:
+            version._content_pending = False
+    
+    taken = Counter(version.content_hash for version in new)
+    released = session.info['released_blobs']
+    for version in changed:
+        taken[version.content_hash] += 1
+        released[_committed_hash(session, version)] += 1
+    for version in deleted:
+        released[_committed_hash(session, version)] += 1
+    released.pop(None, None)
+    adjust_refs(session.connection(), taken)
+
+@event.listens_for(db.session, 'after_flush')
+def release_version_content(session, flush_context):
+    """Drop references held by deleted or rewritten versions and clean up their blobs"""
+    released = session.info.pop('released_blobs', None)
+    if released:
+        freed = release_blobs(
+            session.connection(), released, current_app.config.get('VERSION_KEYFRAME_INTERVAL', 16)
+        )
+        session.info['freed_blob_bytes'] = session.info.get('freed_blob_bytes', 0) + freed
+
+def iter_version_texts(connection, draft_id, batch_size=200):
+    """Yield (version_id, stored_size, text) for every version of a draft in id order
+    
+    stored_size is that of the version's blob. Blobs are mostly deltas
+    against the blob of the version before, so each text is usually
+    rebuilt from one just decoded; the last RECENT_TEXTS are kept for that
+    and anything else is read from the database. Rows are streamed.
+    """
+    versions = DraftVersion.__table__
+    blobs = ContentBlob.__table__
+    rows = connection.execute(
+        select(versions.c.id, blobs.c.hash, blobs.c.content, blobs.c.base_hash)
+        .join_from(versions, blobs, versions.c.content_hash == blobs.c.hash)
+        .where(versions.c.blog_draft_id == draft_id)
+        .order_by(versions.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    
+    recent = OrderedDict()
+    for row in rows:
+        text = recent.get(row.hash)
+        if text is None:
+            if row.base_hash is None:
+                text = row.content
+            else:
+                base_text = recent.get(row.base_hash)
+                if base_text is None:
+                    base_text = load_blob_text(connection, row.base_hash)
+                text = apply_delta(base_text, row.content)
+        recent[row.hash] = text
+        recent.move_to_end(row.hash)
+        if len(recent) > RECENT_TEXTS:
+            recent.popitem(last=False)
+        yield row.id, len(row.content), text
+
+def compact_draft_versions(draft_id):
+    """Re-encode the blobs of a draft's versions as keyframes plus deltas
+    
+    Each blob is encoded against the one before it in the draft, the first
+    time it is met; blobs of other drafts built on them stay valid because
+    the texts are unchanged, and their depths are recomputed. Returns
+    stored sizes before and after.
+    """
+    interval = current_app.config.get('VERSION_KEYFRAME_INTERVAL', 16)
+    blobs = ContentBlob.__table__
+    
+    stored_before = 0
+    stored_after = 0
+    depths = {}
+    previous = None
+    for version_id, stored_size, text in list(iter_version_texts(db.session, draft_id)):
+        blob_hash = hash_text(text)
+        if blob_hash not in depths:
+            if previous is None:
+                stored, uses_base, depth = text, False, 0
+            else:
+                stored, uses_base, depth = encode_version(previous[1], text, previous[2], interval)
+            db.session.execute(
+                blobs.update().where(blobs.c.hash == blob_hash).values(
+                    content=stored,
+                    base_hash=previous[0] if uses_base else None,
+                    chain_depth=depth
+                )
+            )
+            depths[blob_hash] = depth
+            stored_before += stored_size
+            stored_after += len(stored)
+        previous = (blob_hash, text, depths[blob_hash])
+    if depths:
+        refresh_chain_depths(db.session, depths, interval)
+    return stored_before, stored_after
+
+@event.listens_for(DraftVersion, 'expire')
+def clear_materialized_content(target, attrs):
+    """Drop the rebuilt text when content_hash is expired"""
+    if target is None:
+        # Instance was already garbage collected
+        return
+    if attrs is None or 'content_hash' in attrs:
+        target._materialized_content = None
+
+@event.listens_for(DraftVersion, 'refresh')
+def clear_refreshed_content(target, context, attrs):
+    """Drop the rebuilt text when content_hash is reloaded"""
+    clear_materialized_content(target, attrs)
+
+@event.listens_for(User, 'expire')
+def clear_draft_totals(target, attrs):
+    """Recount drafts and versions after the user is expired"""
+    if target is not None:
+        target._draft_totals = None
+
 # Database event listeners
+def refresh_draft_aggregates(connection, draft_id, touch=False):
+    """Recompute the version aggregates stored on a draft
+
+    Returns the values written to blog_drafts.
+    """
+    return _refresh_draft(connection, draft_id, touch)[0]
+
+def _refresh_draft(connection, draft_id, touch):
+    """refresh_draft_aggregates, also returning the summary row it was
+    computed from, with the draft's owner, its current version before the
+    refresh and the content_hash of both current versions"""
+    versions = DraftVersion.__table__
+    drafts = BlogDraft.__table__
+    current_id = (
+        select(versions.c.id)
+        .where(versions.c.blog_draft_id == draft_id)
+        .order_by(versions.c.is_current.desc(), versions.c.created_at.desc(), versions.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    current_row = versions.alias('current_row')
+    summary = connection.execute(
+        select(
+            func.count(versions.c.id).label('version_count'),
+            func.max(case((versions.c.tag == 'final', 1), else_=0)).label('has_final'),
+            func.max(versions.c.updated_at).label('last_edited_at'),
+            current_id.label('current_version_id'),
+            select(current_row.c.word_count).where(current_row.c.id == current_id)
+                .scalar_subquery().label('current_word_count'),
+            select(current_row.c.character_count).where(current_row.c.id == current_id)
+                .scalar_subquery().label('current_char_count'),
+            select(current_row.c.content_hash).where(current_row.c.id == current_id)
+                .scalar_subquery().label('current_content_hash'),
+            select(drafts.c.current_version_id).where(drafts.c.id == draft_id)
+                .scalar_subquery().label('previous_version_id'),
+            select(current_row.c.content_hash)
+                .where(current_row.c.id == select(drafts.c.current_version_id).where(drafts.c.id == draft_id)
+                       .scalar_subquery())
+                .scalar_subquery().label('previous_content_hash'),
+            select(drafts.c.user_id).where(drafts.c.id == draft_id).scalar_subquery().label('user_id')
+        ).where(versions.c.blog_draft_id == draft_id)
+    ).one()
+    
+    values = {
+        'version_count': summary.version_count,
+        'has_final': bool(summary.has_final),
+        'last_edited_at': summary.last_edited_at,
+        'current_version_id': summary.current_version_id,
+        'current_word_count': summary.current_word_count or 0,
+        'current_char_count': summary.current_char_count or 0
+    }
+    if touch:
+        values['updated_at'] = datetime.utcnow()
+    
+    statement = drafts.update().where(drafts.c.id == draft_id).values(**values)
+    if not touch:
+        # Keep the column's onupdate default from bumping the timestamp
+        statement = statement.values(updated_at=drafts.c.updated_at)
+    connection.execute(statement)
+    return values, summary
+
+def _sync_draft_aggregates(connection, target, touch=False):
+    """Refresh the parent draft of target and mirror the values onto it in the session"""
+    session = object_session(target)
+    draft = session.identity_map.get(identity_key(BlogDraft, target.blog_draft_id)) if session else None
+    if draft is not None and draft in session.deleted:
+        # The whole draft is going away; nothing left to maintain
+        return
+    
+    values, summary = _refresh_draft(connection, target.blog_draft_id, touch)
+    if draft is not None:
+        for key, value in values.items():
+            set_committed_value(draft, key, value)
+    _index_current_content(connection, session or db.session, target, summary)
+
 @event.listens_for(DraftVersion, 'after_insert')
 def set_first_version_as_current(mapper, connection, target):
     """Automatically set the first version as current"""
     if not target.is_current:
         # Check if this is the first version for this draft
+        table = DraftVersion.__table__
         version_count = connection.execute(
-            db.text("SELECT COUNT(*) FROM draft_versions WHERE blog_draft_id = :draft_id"),
-            {"draft_id": target.blog_draft_id}
+            select(func.count()).select_from(table).where(table.c.blog_draft_id == target.blog_draft_id)
         ).scalar()
         
         if version_count == 1:
+            # Core statements bind booleans the way each database expects
             connection.execute(
-                db.text("UPDATE draft_versions SET is_current = 1 WHERE id = :version_id"),
-                {"version_id": target.id}
+                table.update().where(table.c.id == target.id).values(
+                    is_current=True,
+                    updated_at=table.c.updated_at
+                )
             )
+            set_committed_value(target, 'is_current', True)
+    
+    _sync_draft_aggregates(connection, target)
 
 @event.listens_for(DraftVersion, 'after_update')
 def update_draft_timestamp(mapper, connection, target):
-    """Update parent draft's updated_at when version changes"""
-    connection.execute(
-        db.text("UPDATE blog_drafts SET updated_at = :now WHERE id = :draft_id"),
-        {"now": datetime.utcnow(), "draft_id": target.blog_draft_id}
-    )
\ No newline at end of file
+    """Update parent draft's updated_at and aggregates when version changes"""
+    _sync_draft_aggregates(connection, target, touch=True)
+
+@event.listens_for(DraftVersion, 'after_delete')
+def update_draft_after_delete(mapper, connection, target):
+    """Keep parent draft's aggregates in step when a version is removed"""
+    _sync_draft_aggregates(connection, target)
+
+# Search index maintenance
+#
+# Index rows are written on the flushing connection so they commit or roll
+# back together with the change they describe. The index table itself is
+# made by the migrations, or here alongside the model tables by
+# db.create_all(); writes don't check for it.
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    search_index.create_schema(connection)
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    search_index.drop_schema(connection)
+
+def _draft_owner(connection, session, draft_id):
+    """user_id of a draft, from the session when it is already loaded"""
+    draft = session.identity_map.get(identity_key(BlogDraft, draft_id)) if session else None
+    if draft is not None and draft.user_id is not None:
+        return draft.user_id
+    drafts = BlogDraft.__table__
+    return connection.execute(select(drafts.c.user_id).where(drafts.c.id == draft_id)).scalar()
+
+@event.listens_for(BlogDraft, 'after_insert')
+@event.listens_for(BlogDraft, 'after_update')
+def index_draft_text(mapper, connection, target):
+    """Index a draft's title and description when they change"""
+    state = db.inspect(target)
+    if not state.was_deleted and (
+        state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes()
+    ):
+        search_index.index_draft(
+            object_session(target), connection, target.id, target.user_id, target.title, target.description
+        )
+
+@event.listens_for(BlogDraft, 'after_delete')
+def unindex_draft(mapper, connection, target):
+    """Drop a deleted draft from the search index"""
+    search_index.remove_draft(object_session(target), connection, target.id)
+
+def _index_current_content(connection, session, target, summary):
+    """Reindex a draft's content after target was written, if that changed
+    the text of its current version
+
+    Only the current version of each draft is searchable; older versions
+    and autosaved revisions are not indexed. A new current version with
+    the same content_hash as the last one, like a duplicate, keeps the
+    indexed row and its text is never rebuilt.
+    """
+    current_id = summary.current_version_id
+    rewritten = (
+        target.id in (current_id, summary.previous_version_id)
+        and db.inspect(target).attrs.content_hash.history.has_changes()
+    )
+    if not rewritten and (
+        current_id == summary.previous_version_id
+        or summary.current_content_hash == summary.previous_content_hash
+    ):
+        return
+    if current_id is None:
+        search_index.remove_content(session, connection, target.blog_draft_id)
+        return
+    content = target.content if target.id == current_id else load_version_text(session, current_id)
+    search_index.index_content(
+        session, connection, target.blog_draft_id, summary.user_id, summary.current_content_hash, content
+    )
+
+# Shared page cache
+#
+# Cached /share pages show a version, its draft's title and the author's
+# name; writing any of them drops the pages built from them in this
+# process once the write commits, so a concurrent request can't cache the
+# old rows again in between.
+
+@event.listens_for(DraftVersion, 'after_update')
+@event.listens_for(DraftVersion, 'after_delete')
+def drop_shared_pages_of_version(mapper, connection, target):
+    """Forget cached share pages of the version's draft when it changes"""
+    share_cache.mark_draft_changed(object_session(target), target.blog_draft_id)
+
+@event.listens_for(BlogDraft, 'after_update')
+@event.listens_for(BlogDraft, 'after_delete')
+def drop_shared_pages_of_draft(mapper, connection, target):
+    """Forget cached share pages of a renamed or deleted draft"""
+    share_cache.mark_draft_changed(object_session(target), target.id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def drop_shared_pages_of_user(mapper, connection, target):
+    """Forget cached share pages showing the user's name"""
+    share_cache.mark_user_changed(object_session(target), target.id)
+
+# Cached user summaries
+#
+# A summary counts the user's drafts, versions and current words; any
+# write that can change those drops it once the flush commits.
+
+@event.listens_for(BlogDraft, 'after_insert')
+@event.listens_for(BlogDraft, 'after_update')
+@event.listens_for(BlogDraft, 'after_delete')
+def drop_summary_of_draft_owner(mapper, connection, target):
+    """Forget the owner's summary when one of their drafts is written"""
+    user_summary_cache.mark_changed(object_session(target), target.user_id)
+
+@event.listens_for(DraftVersion, 'after_insert')
+@event.listens_for(DraftVersion, 'after_delete')
+def drop_summary_of_version_owner(mapper, connection, target):
+    """Forget the owner's summary when a version is added or removed"""
+    session = object_session(target)
+    user_summary_cache.mark_changed(session, _draft_owner(connection, session, target.blog_draft_id))
+
+@event.listens_for(DraftVersion, 'after_update')
+def drop_summary_of_recounted_version(mapper, connection, target):
+    """Forget the owner's summary when a version's word count or current flag changes"""
+    state = db.inspect(target)
+    if state.attrs.word_count.history.has_changes() or state.attrs.is_current.history.has_changes():
+        drop_summary_of_version_owner(mapper, connection, target)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def drop_summary_of_user(mapper, connection, target):
+    """Forget a user's summary when the profile changes"""
+    user_summary_cache.mark_changed(object_session(target), target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def apply_committed_changes(session):
+    """Hand buffered index changes to backends that live outside the database
+    and drop the cached pages and summaries the commit made stale"""
+    search_index.apply_committed(session)
+    share_cache.apply_committed(session)
+    user_summary_cache.apply_committed(session)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_pending_changes(session):
+    search_index.discard_pending(session)
+    share_cache.discard_pending(session)
+    user_summary_cache.discard_pending(session)
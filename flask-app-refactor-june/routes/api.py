@@ -1,6 +1,15 @@
-from flask import Blueprint, jsonify
-from models import User, BlogDraft, DraftVersion
+from flask import Blueprint, Response, jsonify, request, current_app, abort, stream_with_context
+from models import db, User, BlogDraft, DraftVersion
 from utils.decorators import login_required, get_current_user
+from utils.diff import diff_texts
+from utils.export import FORMATS, export_archive
+from utils.importer import import_drafts, read_records
+from utils.listing import conditional_json, keyset_page, parse_fields, parse_limit
+from utils.save_buffer import save_buffer
+from utils.search import search_index
+from utils.user_cache import user_summary
+from sqlalchemy.orm import joinedload, load_only
+from datetime import datetime, timedelta
 
 api_bp = Blueprint('api', __name__)
 
@@ -11,27 +20,22 @@ def get_draft_stats(draft_id):
     user = get_current_user()
     draft = BlogDraft.query.filter_by(id=draft_id, user_id=user.id).first_or_404()
     
-    versions = DraftVersion.query.filter_by(blog_draft_id=draft.id).all()
-    
-    total_words = 0
-    total_chars = 0
-    
-    for version in versions:
-        total_words += version.word_count
-        total_chars += version.character_count
-    
-    current_version = draft.current_version
-    current_words = current_version.word_count if current_version else 0
-    current_chars = current_version.character_count if current_version else 0
+    # Sum the stored counts in SQL instead of loading every version body
+    totals = db.session.query(
+        db.func.count(DraftVersion.id),
+        db.func.coalesce(db.func.sum(DraftVersion.word_count), 0),
+        db.func.coalesce(db.func.sum(DraftVersion.character_count), 0)
+    ).filter(DraftVersion.blog_draft_id == draft.id).one()
+    version_count, total_words, total_chars = totals
     
     stats = {
         'draft_id': draft.id,
         'title': draft.title,
-        'total_versions': len(versions),
+        'total_versions': version_count,
         'total_words_all_versions': total_words,
         'total_chars_all_versions': total_chars,
-        'current_version_words': current_words,
-        'current_version_chars': current_chars,
+        'current_version_words': draft.current_word_count,
+        'current_version_chars': draft.current_char_count,
         'created_at': draft.created_at.isoformat(),
         'updated_at': draft.updated_at.isoformat(),
         'has_final_version': draft.has_final_version
@@ -42,86 +46,372 @@ def get_draft_stats(draft_id):
 @api_bp.route('/user/stats')
 @login_required
 def get_user_stats():
-    """Get statistics for the current user"""
-    user = get_current_user()
+    """Get statistics for the current user
+    
+    Every figure comes from an aggregate query; no draft or version rows
+    are loaded. Query parameter days (default 30, at most 365) sets the
+    window of the daily activity series.
+    """
+    user_id = get_current_user().id
+    summary = user_summary(user_id)
+    
+    try:
+        days = min(max(int(request.args.get('days', 30)), 1), 365)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid days'}), 400
+    
+    # Version counts and words per tag; untagged versions count as drafts
+    tag = db.func.coalesce(DraftVersion.tag, 'draft')
+    tag_rows = db.session.query(
+        tag,
+        db.func.count(DraftVersion.id),
+        db.func.coalesce(db.func.sum(DraftVersion.word_count), 0)
+    ).join(BlogDraft).filter(BlogDraft.user_id == user_id).group_by(tag).all()
+    
+    # Versions created per day over the window, oldest first, including idle days
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    day = db.func.date(DraftVersion.created_at)
+    rows = (
+        db.session.query(day, db.func.count(DraftVersion.id))
+        .join(BlogDraft)
+        .filter(BlogDraft.user_id == user_id, DraftVersion.created_at >= datetime.combine(start, datetime.min.time()))
+        .group_by(day)
+        .all()
+    )
+    # SQLite returns dates as text, other databases as date objects
+    created = {str(date): count for date, count in rows}
+    activity = []
+    for offset in range(days):
+        date = (start + timedelta(days=offset)).isoformat()
+        activity.append({'date': date, 'versions_created': created.get(date, 0)})
     
     stats = {
-        'user_id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'total_drafts': user.total_drafts,
-        'total_versions': user.total_versions,
-        'member_since': user.created_at.isoformat(),
-        'last_updated': user.updated_at.isoformat()
+        'user_id': summary['id'],
+        'name': summary['name'],
+        'email': summary['email'],
+        'total_drafts': summary['total_drafts'],
+        'total_versions': summary['total_versions'],
+        'total_words_current_versions': summary['current_words'],
+        'total_words_all_versions': sum(words for _, _, words in tag_rows),
+        'versions_by_tag': {name: count for name, count, _ in tag_rows},
+        'activity': activity,
+        'member_since': summary['created_at'].isoformat(),
+        'last_updated': summary['updated_at'].isoformat()
     }
     
     return jsonify(stats)
 
+# Columns each listed field reads, so unrequested fields are never loaded
+DRAFT_FIELD_COLUMNS = {
+    'id': (),
+    'title': (BlogDraft.title,),
+    'description': (BlogDraft.description,),
+    'status': (BlogDraft.version_count, BlogDraft.has_final),
+    'version_count': (BlogDraft.version_count,),
+    'created_at': (BlogDraft.created_at,),
+    'updated_at': (),
+    'has_final_version': (BlogDraft.has_final,),
+    'current_version': (BlogDraft.current_version_id, BlogDraft.current_word_count, BlogDraft.current_char_count)
+}
+
+VERSION_FIELD_COLUMNS = {
+    'id': (),
+    'name': (DraftVersion.version_name,),
+    'tag': (DraftVersion.tag,),
+    'word_count': (DraftVersion.word_count,),
+    'character_count': (DraftVersion.character_count,),
+    'is_current': (DraftVersion.is_current,),
+    'is_final': (DraftVersion.tag,),
+    'has_share_token': (DraftVersion.share_token,),
+    'created_at': (),
+    'updated_at': (DraftVersion.updated_at,),
+    'content': (DraftVersion.content_hash,)
+}
+
+def field_columns(field_columns, fields):
+    """Columns to load for the requested fields"""
+    columns = []
+    for field in fields:
+        for column in field_columns[field]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
 @api_bp.route('/drafts')
 @login_required
 def list_drafts():
-    """Get list of all drafts for the current user"""
+    """Get a page of the current user's drafts, most recently updated first
+    
+    Query parameters: cursor (the next_cursor of the previous page), limit
+    (default 50, at most 100) and fields, a comma separated subset of
+    DRAFT_FIELD_COLUMNS. Responses carry an ETag for If-None-Match.
+    """
     user = get_current_user()
-    drafts = BlogDraft.query.filter_by(user_id=user.id).order_by(BlogDraft.updated_at.desc()).all()
+    
+    try:
+        fields = parse_fields(request.args.get('fields'), DRAFT_FIELD_COLUMNS)
+        limit = parse_limit(request.args.get('limit'))
+        
+        query = db.select(BlogDraft).filter_by(user_id=user.id).options(
+            load_only(BlogDraft.updated_at, *field_columns(DRAFT_FIELD_COLUMNS, fields))
+        )
+        if 'current_version' in fields:
+            # The current version's name and timestamp come from the same query
+            query = query.options(
+                joinedload(BlogDraft.current_version).load_only(
+                    DraftVersion.id,
+                    DraftVersion.version_name,
+                    DraftVersion.updated_at
+                )
+            )
+        drafts, next_cursor = keyset_page(
+            db.session, query, BlogDraft.updated_at, BlogDraft.id,
+            request.args.get('cursor'), limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    total_count = db.session.scalar(
+        db.select(db.func.count(BlogDraft.id)).filter_by(user_id=user.id)
+    )
     
     draft_list = []
     for draft in drafts:
-        draft_data = {
-            'id': draft.id,
-            'title': draft.title,
-            'description': draft.description,
-            'status': draft.status,
-            'version_count': len(draft.versions),
-            'created_at': draft.created_at.isoformat(),
-            'updated_at': draft.updated_at.isoformat(),
-            'has_final_version': draft.has_final_version
-        }
+        draft_data = {'id': draft.id}
+        if 'title' in fields:
+            draft_data['title'] = draft.title
+        if 'description' in fields:
+            draft_data['description'] = draft.description
+        if 'status' in fields:
+            draft_data['status'] = draft.status
+        if 'version_count' in fields:
+            draft_data['version_count'] = draft.version_count
+        if 'created_at' in fields:
+            draft_data['created_at'] = draft.created_at.isoformat()
+        if 'updated_at' in fields:
+            draft_data['updated_at'] = draft.updated_at.isoformat()
+        if 'has_final_version' in fields:
+            draft_data['has_final_version'] = draft.has_final_version
         
-        if draft.current_version:
+        current_version = draft.current_version if 'current_version' in fields else None
+        if current_version:
             draft_data['current_version'] = {
-                'id': draft.current_version.id,
-                'name': draft.current_version.version_name,
-                'word_count': draft.current_version.word_count,
-                'character_count': draft.current_version.character_count,
-                'updated_at': draft.current_version.updated_at.isoformat()
+                'id': current_version.id,
+                'name': current_version.version_name,
+                'word_count': draft.current_word_count,
+                'character_count': draft.current_char_count,
+                'updated_at': current_version.updated_at.isoformat()
             }
         
         draft_list.append(draft_data)
     
-    return jsonify({
+    return conditional_json({
         'drafts': draft_list,
-        'total_count': len(draft_list)
+        'total_count': total_count,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
     })
 
 @api_bp.route('/drafts/<int:draft_id>/versions')
 @login_required
 def list_versions(draft_id):
-    """Get list of all versions for a specific draft"""
+    """Get a page of versions for a specific draft, newest first
+    
+    Query parameters: cursor, limit (default 50, at most 100) and fields,
+    a comma separated subset of VERSION_FIELD_COLUMNS. Content is left out
+    unless asked for, either in fields or with content=1.
+    """
     user = get_current_user()
     draft = BlogDraft.query.filter_by(id=draft_id, user_id=user.id).first_or_404()
     
-    versions = DraftVersion.query.filter_by(
-        blog_draft_id=draft.id
-    ).order_by(DraftVersion.created_at.desc()).all()
+    try:
+        default_fields = [field for field in VERSION_FIELD_COLUMNS if field != 'content']
+        fields = parse_fields(request.args.get('fields'), VERSION_FIELD_COLUMNS, default_fields)
+        if request.args.get('content', '').lower() in ('1', 'true', 'yes'):
+            fields.add('content')
+        limit = parse_limit(request.args.get('limit'))
+        
+        query = db.select(DraftVersion).filter_by(blog_draft_id=draft.id).options(
+            load_only(DraftVersion.created_at, *field_columns(VERSION_FIELD_COLUMNS, fields))
+        )
+        versions, next_cursor = keyset_page(
+            db.session, query, DraftVersion.created_at, DraftVersion.id,
+            request.args.get('cursor'), limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     version_list = []
     for version in versions:
-        version_data = {
-            'id': version.id,
-            'name': version.version_name,
-            'word_count': version.word_count,
-            'character_count': version.character_count,
-            'is_current': version.is_current,
-            'is_final': version.is_final,
-            'has_share_token': bool(version.share_token),
-            'created_at': version.created_at.isoformat(),
-            'updated_at': version.updated_at.isoformat()
-        }
+        version_data = {'id': version.id}
+        if 'name' in fields:
+            version_data['name'] = version.version_name
+        if 'tag' in fields:
+            version_data['tag'] = version.tag
+        if 'word_count' in fields:
+            version_data['word_count'] = version.word_count
+        if 'character_count' in fields:
+            version_data['character_count'] = version.character_count
+        if 'is_current' in fields:
+            version_data['is_current'] = version.is_current
+        if 'is_final' in fields:
+            version_data['is_final'] = version.is_final
+        if 'has_share_token' in fields:
+            version_data['has_share_token'] = bool(version.share_token)
+        if 'created_at' in fields:
+            version_data['created_at'] = version.created_at.isoformat()
+        if 'updated_at' in fields:
+            version_data['updated_at'] = version.updated_at.isoformat()
+        if 'content' in fields:
+            version_data['content'] = version.content
         version_list.append(version_data)
     
-    return jsonify({
+    return conditional_json({
         'draft_id': draft.id,
         'draft_title': draft.title,
         'versions': version_list,
-        'total_count': len(version_list)
-    })
\ No newline at end of file
+        'total_count': draft.version_count,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
+    })
+
+@api_bp.route('/search')
+@login_required
+def search_drafts():
+    """Full-text search over the user's drafts and versions
+    
+    Query parameters: q and limit (default 20, at most 50). Quoted text is
+    matched as a phrase and the last word as a prefix. Each draft appears
+    once, with a highlighted snippet of its best matching version, or of its
+    title and description.
+    """
+    user = get_current_user()
+    query = request.args.get('q', '').strip()
+    
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=50)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    matches = search_index.search(db.session, user.id, query, limit) if query else []
+    
+    draft_ids = [draft_id for draft_id, _, _, _ in matches]
+    version_ids = [version_id for _, version_id, _, _ in matches if version_id is not None]
+    titles = dict(db.session.query(BlogDraft.id, BlogDraft.title).filter(BlogDraft.id.in_(draft_ids)).all())
+    version_names = dict(
+        db.session.query(DraftVersion.id, DraftVersion.version_name).filter(DraftVersion.id.in_(version_ids)).all()
+    )
+    
+    results = []
+    for draft_id, version_id, score, snippet in matches:
+        if draft_id not in titles:
+            # Removed since the index was last updated
+            continue
+        results.append({
+            'draft_id': draft_id,
+            'title': titles[draft_id],
+            'version_id': version_id,
+            'version_name': version_names.get(version_id),
+            'snippet': snippet,
+            'score': round(score, 4)
+        })
+    
+    return jsonify({'query': query, 'results': results})
+
+@api_bp.route('/compare/<int:version1_id>/<int:version2_id>')
+@login_required
+def compare_versions(version1_id, version2_id):
+    """Get a line/word diff from one version to another as hunks"""
+    user = get_current_user()
+    
+    context = request.args.get('context', '3')
+    if context == 'all':
+        context = None
+    else:
+        try:
+            context = min(max(int(context), 0), 100)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid context'}), 400
+    
+    # Only metadata is needed to validate access and build the cache key
+    rows = db.session.query(
+        DraftVersion.id, DraftVersion.blog_draft_id, DraftVersion.updated_at
+    ).join(BlogDraft).filter(
+        DraftVersion.id.in_([version1_id, version2_id]),
+        BlogDraft.user_id == user.id
+    ).all()
+    meta = {row.id: row for row in rows}
+    if version1_id not in meta or version2_id not in meta:
+        abort(404)
+    
+    if meta[version1_id].blog_draft_id != meta[version2_id].blog_draft_id:
+        return jsonify({'success': False, 'error': 'Cannot compare versions from different drafts'}), 400
+    
+    # Autosaves still buffered are compared instead of the stored text
+    pending1 = save_buffer.pending(version1_id)
+    pending2 = save_buffer.pending(version2_id)
+    cache = current_app.extensions['diff_cache']
+    cache_key = (
+        version1_id, version2_id,
+        meta[version1_id].updated_at, meta[version2_id].updated_at,
+        pending1 and pending1[1], pending2 and pending2[1],
+        context
+    )
+    result = cache.get(cache_key)
+    if result is None:
+        text1 = pending1[0] if pending1 else DraftVersion.query.get(version1_id).content
+        text2 = pending2[0] if pending2 else DraftVersion.query.get(version2_id).content
+        result = diff_texts(text1, text2, context=context)
+        result.update({'version1_id': version1_id, 'version2_id': version2_id})
+        cache.set(cache_key, result)
+    
+    return jsonify(result)
+
+@api_bp.route('/export')
+@login_required
+def export_drafts():
+    """Download every draft and version as markdown files plus a manifest
+    
+    Query parameter format is zip (default) or tar (gzipped). The archive
+    is streamed as it is built.
+    """
+    user = get_current_user()
+    archive_format = request.args.get('format', 'zip')
+    if archive_format not in FORMATS:
+        return jsonify({'success': False, 'error': 'Invalid format'}), 400
+    
+    mimetype, extension = FORMATS[archive_format]
+    filename = f"draft-mode-export-{datetime.utcnow():%Y%m%d}.{extension}"
+    return Response(
+        stream_with_context(export_archive(db.session, user, archive_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@api_bp.route('/import', methods=['POST'])
+@login_required
+def import_drafts_route():
+    """Bulk-create drafts and versions from JSONL or an export archive
+    
+    The input is an uploaded file field named file or the raw request
+    body. Query parameter start skips that many records, to resume after a
+    failed import; every response reports next, the record to resume from,
+    along with rows written per second.
+    """
+    user = get_current_user()
+    try:
+        start = max(int(request.args.get('start', 0)), 0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid start'}), 400
+    
+    upload = request.files.get('file')
+    try:
+        records = read_records(upload.stream if upload else request.stream, start)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'next': start}), 400
+    
+    report = import_drafts(db.session, user.id, records, start)
+    if report.error is not None:
+        return jsonify(dict(report.to_dict(), success=False, error=report.error)), 400
+    return jsonify(dict(report.to_dict(), success=True))
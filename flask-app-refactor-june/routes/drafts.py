@@ -1,11 +1,25 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash
-from models import db, User, BlogDraft, DraftVersion
+from models import db, User, BlogDraft, DraftVersion, text_stats
 from utils.decorators import login_required, get_current_user
-import markdown
+from utils.delta import apply_operations
+from utils.rendering import render, render_blocks
+from utils.save_buffer import save_buffer
 import secrets
 
 drafts_bp = Blueprint('drafts', __name__)
 
+def preview_response(content):
+    """Render a preview, block by block when the editor asks for it"""
+    payload = request.get_json(silent=True) or {}
+    if payload.get('mode') == 'blocks':
+        known = payload.get('known')
+        if not isinstance(known, list):
+            known = []
+        known = [digest for digest in known if isinstance(digest, str)]
+        return jsonify(render_blocks(content, known))
+    
+    return jsonify({'html': render(content)})
+
 @drafts_bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create_draft():
@@ -65,9 +79,8 @@ def edit_draft(draft_id):
             id=version_id, 
             blog_draft_id=draft.id
         ).first()
-        if current_version:
-            # Update current version flag
-            current_version.set_as_current()
+        # Viewing a version doesn't change state; the editor marks it
+        # current with a POST once it has loaded
     else:
         current_version = draft.current_version
     
@@ -79,10 +92,19 @@ def edit_draft(draft_id):
         blog_draft_id=draft.id
     ).order_by(DraftVersion.created_at.desc()).all()
     
+    # Start the editor from any autosave still buffered, without writing it
+    pending = save_buffer.pending(current_version.id)
+    content, revision = pending if pending else (current_version.content, current_version.saved_revision)
+    word_count, character_count = text_stats(content)
+    
     return render_template('edit_draft.html', 
                          draft=draft, 
                          current_version=current_version, 
-                         versions=versions)
+                         versions=versions,
+                         content=content,
+                         revision=revision,
+                         word_count=word_count,
+                         character_count=character_count)
 
 @drafts_bp.route('/<int:draft_id>/versions', methods=['POST'])
 @login_required
@@ -132,11 +154,59 @@ def save_version(version_id):
     ).first_or_404()
     
     content = request.json.get('content', '') if request.is_json else request.form.get('content', '')
+    # Autosaves are buffered and coalesced; explicit saves are written now
+    autosave = request.is_json and bool(request.json.get('autosave'))
     
     try:
-        version.content = content
-        db.session.commit()
-        return jsonify({'success': True})
+        revision = save_buffer.put(version, content, flush=not autosave)
+        if revision is None:
+            return jsonify({'success': False, 'error': 'Failed to save content'})
+        return jsonify({'success': True, 'revision': revision})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to save content'})
+
+@drafts_bp.route('/versions/<int:version_id>/patch', methods=['POST'])
+@login_required
+def patch_version(version_id):
+    """Apply text operations to the saved content of a version"""
+    user = get_current_user()
+    version = DraftVersion.query.join(BlogDraft).filter(
+        DraftVersion.id == version_id,
+        BlogDraft.user_id == user.id
+    ).first_or_404()
+    
+    payload = request.get_json(silent=True) or {}
+    base_revision = payload.get('base_revision')
+    operations = payload.get('operations')
+    if not isinstance(base_revision, int) or not isinstance(operations, list):
+        return jsonify({'success': False, 'error': 'Invalid patch'})
+    
+    # Patches apply on top of any save still waiting in the buffer. Without
+    # one here, they apply to the stored content; if another process still
+    # buffers a save of the version, its flush later moves the stored
+    # revision past both and the editors resync
+    pending = save_buffer.pending(version.id)
+    current_content, current_revision = pending if pending else (version.content, version.saved_revision)
+    if base_revision != current_revision:
+        return jsonify({'success': False, 'error': 'Version has changed', 'revision': current_revision}), 409
+    
+    try:
+        content = apply_operations(current_content, operations)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid patch'})
+    
+    # Optional UTF-16 length of the editor's text, to catch drift early
+    expected_length = payload.get('length')
+    if expected_length is not None and expected_length != len(content.encode('utf-16-le')) // 2:
+        return jsonify({'success': False, 'error': 'Patch does not match saved content'}), 409
+    
+    try:
+        revision = save_buffer.put(version, content, base_revision=base_revision, flush=not payload.get('autosave'))
+        if revision is None:
+            return jsonify({'success': False, 'error': 'Version has changed'}), 409
+        return jsonify({'success': True, 'revision': revision})
         
     except Exception as e:
         db.session.rollback()
@@ -153,18 +223,11 @@ def preview_version(version_id):
     ).first_or_404()
     
     # Get content from request if provided, otherwise use saved content
-    content = request.json.get('content', version.content) if request.is_json else version.content
+    pending = save_buffer.pending(version.id)
+    saved_content = pending[0] if pending else version.content
+    content = request.json.get('content', saved_content) if request.is_json else saved_content
     
-    try:
-        html_content = markdown.markdown(
-            content, 
-            extensions=['extra', 'codehilite', 'fenced_code']
-        )
-    except Exception:
-        # Fallback to basic markdown if extensions fail
-        html_content = markdown.markdown(content)
-    
-    return jsonify({'html': html_content})
+    return preview_response(content)
 
 @drafts_bp.route('/preview', methods=['POST'])
 @login_required
@@ -172,16 +235,7 @@ def preview_content():
     """Preview content without needing a specific version ID"""
     content = request.json.get('content', '') if request.is_json else ''
     
-    try:
-        html_content = markdown.markdown(
-            content, 
-            extensions=['extra', 'codehilite', 'fenced_code']
-        )
-    except Exception:
-        # Fallback to basic markdown if extensions fail
-        html_content = markdown.markdown(content)
-    
-    return jsonify({'html': html_content})
+    return preview_response(content)
 
 @drafts_bp.route('/compare/<int:version1_id>/<int:version2_id>')
 @login_required
@@ -267,13 +321,33 @@ def set_version_tag(version_id):
         return jsonify({'success': False, 'error': 'Invalid tag'})
     
     try:
-        version.set_tag(new_tag)
+        if version.set_tag(new_tag):
+            db.session.commit()
         return jsonify({'success': True})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Failed to set tag'})
 
+@drafts_bp.route('/versions/<int:version_id>/set_current', methods=['POST'])
+@login_required
+def set_current_version(version_id):
+    """Make a version the one its draft opens to"""
+    user = get_current_user()
+    version = DraftVersion.query.join(BlogDraft).filter(
+        DraftVersion.id == version_id,
+        BlogDraft.user_id == user.id
+    ).first_or_404()
+    
+    try:
+        if version.set_as_current():
+            db.session.commit()
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to set current version'})
+
 @drafts_bp.route('/versions/<int:version_id>/mark_final', methods=['POST'])
 @login_required
 def mark_final(version_id):
@@ -289,7 +363,7 @@ def mark_final(version_id):
         return jsonify({'success': False, 'error': 'Final name cannot be empty'})
     
     try:
-        # Update version name and set as final
+        # Rename, tag and share in one transaction
         version.version_name = final_name
         version.set_tag('final')
         
@@ -369,22 +443,20 @@ def duplicate_version(version_id):
     new_name = request.json.get('name', f"{original_version.version_name} (Copy)")
     
     try:
-        # Unset current version flag from other versions
-        DraftVersion.query.filter_by(
-            blog_draft_id=original_version.blog_draft_id, 
-            is_current=True
-        ).update({'is_current': False})
+        save_buffer.flush([original_version.id])
         
-        # Create duplicate version
+        # Create duplicate version; it shares the original's content blob,
+        # so only metadata is written however long the text is
         duplicate = DraftVersion(
             version_name=new_name,
-            content=original_version.content,
             blog_draft_id=original_version.blog_draft_id,
-            is_current=True,
             tag='draft'  # Reset to draft for duplicates
         )
+        duplicate.copy_content_from(original_version)
         
         db.session.add(duplicate)
+        db.session.flush()
+        duplicate.set_as_current()
         db.session.commit()
         
         return jsonify({'success': True, 'version_id': duplicate.id})
@@ -413,4 +485,25 @@ def generate_share_link(version_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': 'Failed to generate share link'})
\ No newline at end of file
+        return jsonify({'success': False, 'error': 'Failed to generate share link'})
+
+@drafts_bp.route('/versions/<int:version_id>/unshare', methods=['POST'])
+@login_required
+def revoke_share_link(version_id):
+    """Revoke a version's public share link"""
+    user = get_current_user()
+    version = DraftVersion.query.join(BlogDraft).filter(
+        DraftVersion.id == version_id,
+        BlogDraft.user_id == user.id
+    ).first_or_404()
+    
+    try:
+        if version.share_token:
+            # Cached copies of the page are dropped by the model listeners
+            version.share_token = None
+            db.session.commit()
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to revoke share link'})
\ No newline at end of file
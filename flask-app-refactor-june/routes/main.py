@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, redirect, url_for, request
-from models import User, BlogDraft, DraftVersion
+from flask import Blueprint, render_template, redirect, url_for, request, abort
+from sqlalchemy.orm import selectinload
+from models import db, User, BlogDraft, DraftVersion
 from utils.decorators import login_required, get_current_user
-import markdown
+from utils.rendering import render
+from utils.share_cache import share_cache, SharedPage
 from markupsafe import Markup
 
 main_bp = Blueprint('main', __name__)
@@ -19,25 +21,52 @@ def index():
 def dashboard():
     """User dashboard showing all drafts"""
     user = get_current_user()
-    drafts = BlogDraft.query.filter_by(user_id=user.id).order_by(BlogDraft.updated_at.desc()).all()
+    # Counts and status come from the draft row; versions are loaded for all
+    # drafts in one extra query, without their content, for the selectors
+    drafts = BlogDraft.query.filter_by(user_id=user.id).options(
+        selectinload(BlogDraft.versions).load_only(
+            DraftVersion.id,
+            DraftVersion.version_name,
+            DraftVersion.tag,
+            DraftVersion.is_current,
+            DraftVersion.created_at
+        )
+    ).order_by(BlogDraft.updated_at.desc()).all()
     return render_template('dashboard.html', user=user, drafts=drafts)
 
 @main_bp.route('/share/<share_token>')
 def public_view(share_token):
     """View a publicly shared version without authentication"""
-    version = DraftVersion.query.filter_by(share_token=share_token).first_or_404()
+    page = share_cache.fresh(share_token)
+    if page is not None:
+        return share_cache.response(page)
     
-    try:
-        html_content = markdown.markdown(
-            version.content, 
-            extensions=['extra', 'codehilite', 'fenced_code']
-        )
-    except Exception:
-        # Fallback to basic markdown if extensions fail
-        html_content = markdown.markdown(version.content)
+    # Only the timestamps the page depends on, to see whether a cached copy still holds
+    stamp = db.session.execute(
+        db.select(DraftVersion.id, DraftVersion.updated_at, BlogDraft.updated_at, User.updated_at)
+        .join(BlogDraft, DraftVersion.blog_draft_id == BlogDraft.id)
+        .join(User, BlogDraft.user_id == User.id)
+        .where(DraftVersion.share_token == share_token)
+    ).one_or_none()
+    if stamp is None:
+        share_cache.invalidate(share_token)
+        abort(404)
+    stamp = tuple(stamp)
     
-    return render_template('public_view.html', 
-                         version=version, 
-                         draft=version.blog_draft,
-                         author=version.blog_draft.author,
-                         html_content=Markup(html_content))
\ No newline at end of file
+    page = share_cache.current(share_token, stamp)
+    if page is None:
+        version = db.session.get(DraftVersion, stamp[0])
+        html_content = render(version.content)
+        body = render_template('public_view.html', 
+                               version=version, 
+                               draft=version.blog_draft,
+                               author=version.blog_draft.author,
+                               html_content=Markup(html_content))
+        page = share_cache.store(share_token, SharedPage(
+            body.encode('utf-8'),
+            stamp,
+            version.blog_draft_id,
+            version.blog_draft.user_id,
+            max((value for value in stamp[1:] if value is not None), default=None)
+        ))
+    return share_cache.response(page)
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from models import db, User
-from utils.decorators import login_required, get_current_user
+from utils.decorators import login_required, get_current_user, forget_current_user
+from utils.user_cache import user_summary
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -9,6 +10,7 @@ settings_bp = Blueprint('settings', __name__)
 def profile():
     """User profile and settings page"""
     user = get_current_user()
+    summary = user_summary(user.id)
     
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -20,31 +22,31 @@ def profile():
         # Validation
         if not all([name, email]):
             flash('Name and email are required')
-            return render_template('settings/profile.html', user=user)
+            return render_template('settings/profile.html', user=user, summary=summary)
         
         # Check if email is already taken by another user
         existing_user = User.query.filter(User.email == email, User.id != user.id).first()
         if existing_user:
             flash('Email already registered to another account')
-            return render_template('settings/profile.html', user=user)
+            return render_template('settings/profile.html', user=user, summary=summary)
         
         # Password change validation
         if new_password:
             if not current_password:
                 flash('Current password is required to change password')
-                return render_template('settings/profile.html', user=user)
+                return render_template('settings/profile.html', user=user, summary=summary)
             
             if not user.check_password(current_password):
                 flash('Current password is incorrect')
-                return render_template('settings/profile.html', user=user)
+                return render_template('settings/profile.html', user=user, summary=summary)
             
             if len(new_password) < 6:
                 flash('New password must be at least 6 characters long')
-                return render_template('settings/profile.html', user=user)
+                return render_template('settings/profile.html', user=user, summary=summary)
             
             if new_password != confirm_password:
                 flash('New passwords do not match')
-                return render_template('settings/profile.html', user=user)
+                return render_template('settings/profile.html', user=user, summary=summary)
         
         try:
             # Update user information
@@ -62,9 +64,9 @@ def profile():
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while updating your profile')
-            return render_template('settings/profile.html', user=user)
+            return render_template('settings/profile.html', user=user, summary=summary)
     
-    return render_template('settings/profile.html', user=user)
+    return render_template('settings/profile.html', user=user, summary=summary)
 
 @settings_bp.route('/theme', methods=['POST'])
 @login_required
@@ -100,6 +102,7 @@ def delete_account():
         # This will cascade delete all drafts and versions due to the relationship setup
         db.session.delete(user)
         db.session.commit()
+        forget_current_user()
         session.clear()
         flash('Your account has been deleted', 'success')
         return redirect(url_for('main.index'))
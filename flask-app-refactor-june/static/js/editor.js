@@ -5,6 +5,7 @@ class DraftEditor {
         this.autoSaveTimeout = null;
         this.lastSavedContent = '';
         this.pendingTag = null;
+        this.previewBlocks = new Map();
         
         this.init();
     }
@@ -26,12 +27,26 @@ class DraftEditor {
         
         // Auto-resize textarea
         this.initAutoResize();
+        
+        // Opening an older version makes it the one the draft opens to
+        if (this.data && !this.data.currentVersion.is_current) {
+            this.markCurrentVersion();
+        }
+    }
+    
+    async markCurrentVersion() {
+        try {
+            await fetch(`/drafts/versions/${this.data.currentVersionId}/set_current`, { method: 'POST' });
+        } catch (error) {
+            // Not worth interrupting the editor over; the draft keeps its previous current version
+        }
     }
     
     loadEditorData() {
         const dataElement = document.getElementById('editorData');
         if (dataElement) {
             this.data = JSON.parse(dataElement.textContent);
+            this.revision = this.data.currentVersion.revision;
         }
     }
     
@@ -166,6 +181,10 @@ class DraftEditor {
             this.copyShareLink();
         });
         
+        document.getElementById('revokeShareLink').addEventListener('click', () => {
+            this.revokeShareLink();
+        });
+        
         // Preview Modal
         document.getElementById('closePreviewModal').addEventListener('click', () => {
             this.hideModal('previewModal');
@@ -311,6 +330,10 @@ class DraftEditor {
         }, 2000);
         
         this.updateWordCount();
+        
+        if (this.isPreviewOpen()) {
+            this.schedulePreviewRefresh();
+        }
     }
     
     updateWordCount() {
@@ -330,21 +353,20 @@ class DraftEditor {
         statusText.textContent = status;
     }
     
-    async saveContent() {
+    async saveContent(autosave = false) {
         const content = this.elements.contentEditor.value;
         this.updateSaveStatus('Saving...', 'saving');
         
         try {
-            const response = await fetch(`/drafts/versions/${this.data.currentVersionId}/save`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ content: content })
-            });
-            
-            const data = await response.json();
+            // Send only the edited range when possible, the full body otherwise
+            let data = await this.savePatch(content, autosave);
+            if (!data || !data.success) {
+                data = await this.saveFull(content, autosave);
+            }
             
             if (data.success) {
                 this.lastSavedContent = content;
+                this.revision = data.revision;
                 this.updateSaveStatus('Saved', 'ready');
                 return true;
             } else {
@@ -357,10 +379,79 @@ class DraftEditor {
         }
     }
     
+    async saveFull(content, autosave) {
+        const response = await fetch(`/drafts/versions/${this.data.currentVersionId}/save`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ content: content, autosave: autosave })
+        });
+        
+        return await response.json();
+    }
+    
+    async savePatch(content, autosave) {
+        if (this.revision === undefined || this.revision === null) {
+            return null;
+        }
+        
+        const body = JSON.stringify({
+            base_revision: this.revision,
+            operations: this.textOperations(this.lastSavedContent, content),
+            length: content.length,
+            autosave: autosave
+        });
+        if (body.length >= content.length) {
+            return null;
+        }
+        
+        const response = await fetch(`/drafts/versions/${this.data.currentVersionId}/patch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        });
+        
+        // A conflict (409) also carries a JSON body; the caller falls back
+        return await response.json();
+    }
+    
+    textOperations(base, content) {
+        // Replace the range between the common prefix and common suffix
+        const limit = Math.min(base.length, content.length);
+        let start = 0;
+        while (start < limit && base.charCodeAt(start) === content.charCodeAt(start)) {
+            start++;
+        }
+        let suffix = 0;
+        while (suffix < limit - start &&
+               base.charCodeAt(base.length - 1 - suffix) === content.charCodeAt(content.length - 1 - suffix)) {
+            suffix++;
+        }
+        
+        // Never split a surrogate pair
+        const isLowSurrogate = code => code >= 0xDC00 && code <= 0xDFFF;
+        if (start > 0 && (isLowSurrogate(base.charCodeAt(start)) || isLowSurrogate(content.charCodeAt(start)))) {
+            start--;
+        }
+        if (suffix > 0 && (isLowSurrogate(base.charCodeAt(base.length - suffix)) ||
+                           isLowSurrogate(content.charCodeAt(content.length - suffix)))) {
+            suffix--;
+        }
+        
+        const operations = [];
+        if (base.length - suffix > start) {
+            operations.push({ type: 'delete', start: start, end: base.length - suffix });
+        }
+        const inserted = content.slice(start, content.length - suffix);
+        if (inserted) {
+            operations.push({ type: 'insert', start: start, text: inserted });
+        }
+        return operations;
+    }
+    
     async autoSave() {
         const content = this.elements.contentEditor.value;
         if (content !== this.lastSavedContent) {
-            await this.saveContent();
+            await this.saveContent(true);
         }
     }
     
@@ -384,20 +475,33 @@ class DraftEditor {
         }
     }
     
-    async loadDraftsList() {
+    async loadDraftsList(cursor = null) {
+        // The sidebar only needs ids and titles; further pages load on demand
+        const params = new URLSearchParams({ fields: 'id,title', limit: '50' });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
         try {
-            const response = await fetch('/api/drafts');
+            const response = await fetch(`/api/drafts?${params}`);
             const data = await response.json();
             
-            this.renderDraftsList(data.drafts);
+            this.renderDraftsList(data.drafts, Boolean(cursor), data.next_cursor);
         } catch (error) {
             console.error('Failed to load drafts list:', error);
         }
     }
     
-    renderDraftsList(drafts) {
+    renderDraftsList(drafts, append = false, nextCursor = null) {
         const container = this.elements.draftsList;
-        container.innerHTML = '';
+        if (append) {
+            const moreButton = container.querySelector('.drafts-more');
+            if (moreButton) {
+                moreButton.remove();
+            }
+        } else {
+            container.innerHTML = '';
+        }
         
         drafts.forEach(draft => {
             const draftItem = document.createElement('div');
@@ -458,6 +562,17 @@ class DraftEditor {
             
             container.appendChild(draftItem);
         });
+        
+        if (nextCursor) {
+            const moreButton = document.createElement('button');
+            moreButton.className = 'drafts-more';
+            moreButton.textContent = 'More drafts';
+            moreButton.addEventListener('click', () => {
+                moreButton.disabled = true;
+                this.loadDraftsList(nextCursor);
+            });
+            container.appendChild(moreButton);
+        }
     }
     
     async createNewVersion() {
@@ -513,6 +628,7 @@ class DraftEditor {
                 this.elements.shareLink.textContent = data.share_url;
                 this.elements.shareLinkContainer.style.display = 'block';
                 document.getElementById('copyShareLink').style.display = 'inline-block';
+                document.getElementById('revokeShareLink').style.display = 'inline-block';
             } else {
                 alert('Failed to generate share link');
             }
@@ -521,6 +637,31 @@ class DraftEditor {
         }
     }
     
+    async revokeShareLink() {
+        if (!confirm('Revoke this link? Anyone who has it will no longer be able to view this version.')) {
+            return;
+        }
+        
+        try {
+            const response = await fetch(`/drafts/versions/${this.data.currentVersionId}/unshare`, {
+                method: 'POST'
+            });
+            
+            const data = await response.json();
+            
+            if (data.success) {
+                this.elements.shareLink.textContent = '';
+                this.elements.shareLinkContainer.style.display = 'none';
+                document.getElementById('copyShareLink').style.display = 'none';
+                document.getElementById('revokeShareLink').style.display = 'none';
+            } else {
+                alert('Failed to revoke share link');
+            }
+        } catch (error) {
+            alert('Failed to revoke share link');
+        }
+    }
+    
     async copyShareLink() {
         const shareLink = this.elements.shareLink.textContent;
         try {
@@ -537,25 +678,92 @@ class DraftEditor {
     }
     
     async showPreview() {
+        // Start from an empty preview; later refreshes only patch changed blocks
+        this.previewBlocks = new Map();
+        this.elements.previewContent.innerHTML = '';
+        this.showModal('previewModal');
+        await this.refreshPreview();
+    }
+    
+    isPreviewOpen() {
+        return this.elements.previewModal.style.display === 'block';
+    }
+    
+    schedulePreviewRefresh() {
+        clearTimeout(this.previewTimeout);
+        this.previewTimeout = setTimeout(() => {
+            this.refreshPreview();
+        }, 300);
+    }
+    
+    async refreshPreview() {
         const content = this.elements.contentEditor.value;
+        const sequence = (this.previewSequence || 0) + 1;
+        this.previewSequence = sequence;
         
         try {
             const response = await fetch(`/drafts/versions/${this.data.currentVersionId}/preview`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ content: content })
+                body: JSON.stringify({
+                    content: content,
+                    mode: 'blocks',
+                    known: Array.from(this.previewBlocks.keys())
+                })
             });
             
             const data = await response.json();
             
-            this.elements.previewContent.innerHTML = data.html;
-            this.showModal('previewModal');
+            // Ignore responses overtaken by a newer request
+            if (sequence === this.previewSequence) {
+                this.patchPreview(data);
+            }
         } catch (error) {
+            this.previewBlocks = new Map();
             this.elements.previewContent.innerHTML = '<p style="color: var(--accent-red);">Preview unavailable</p>';
-            this.showModal('previewModal');
         }
     }
     
+    patchPreview(data) {
+        const container = this.elements.previewContent;
+        const rendered = new Map(this.previewBlocks);
+        data.blocks.forEach(block => {
+            const node = document.createElement('div');
+            node.className = 'preview-block';
+            node.innerHTML = block.html;
+            rendered.set(block.hash, node);
+        });
+        
+        if (data.hashes.some(hash => !rendered.has(hash))) {
+            // Out of sync with the server; render everything again
+            this.showPreview();
+            return;
+        }
+        
+        // Reuse unchanged block nodes and move them into document order
+        const placed = new Set();
+        const blocks = new Map();
+        data.hashes.forEach((hash, index) => {
+            let node = rendered.get(hash);
+            if (placed.has(hash)) {
+                node = node.cloneNode(true);
+            }
+            placed.add(hash);
+            blocks.set(hash, blocks.get(hash) || node);
+            
+            const existing = container.children[index];
+            if (existing !== node) {
+                container.insertBefore(node, existing || null);
+            }
+        });
+        
+        while (container.children.length > data.hashes.length) {
+            container.lastElementChild.remove();
+        }
+        
+        this.previewBlocks = blocks;
+    }
+    
     exportMarkdown() {
         const content = this.elements.contentEditor.value;
         const blob = new Blob([content], { type: 'text/markdown' });
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import event, select
+
+from app import create_app
+from models import db, BlogDraft, DraftVersion, User, load_version_text
+from utils.importer import import_drafts
+
+def make_records(drafts, versions):
+    return [
+        (number, {
+            'title': f'Draft {number}',
+            'versions': [{'name': f'v{index}', 'content': f'draft {number} version {index} ' * 20}
+                         for index in range(versions)]
+        })
+        for number in range(drafts)
+    ]
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name='importer', email='importer@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+def import_chunk(statements, drafts, versions):
+    user_id = db.session.scalar(select(User.id))
+    db.session.commit()
+    statements.clear()
+    report = import_drafts(db.session, user_id, make_records(drafts, versions), batch_size=drafts * versions)
+    assert report.error is None
+    assert report.drafts == drafts and report.versions == drafts * versions
+    return len(statements)
+
+def test_chunk_statement_count_does_not_grow_with_rows(app, statements):
+    small = import_chunk(statements, 2, 2)
+    large = import_chunk(statements, 20, 200)
+    if db.engine.dialect.name == 'sqlite':
+        assert large == small
+    else:
+        # insertmanyvalues sends one statement per page of rows
+        assert large <= small + 4 * (20 * 200 // db.engine.dialect.insertmanyvalues_page_size + 1)
+    assert large < 30
+
+def test_chunk_ids_match_their_rows(app, statements):
+    import_chunk(statements, 3, 4)
+    drafts = db.session.scalars(select(BlogDraft).order_by(BlogDraft.id)).all()
+    assert [draft.title for draft in drafts] == ['Draft 0', 'Draft 1', 'Draft 2']
+    for number, draft in enumerate(drafts):
+        versions = db.session.scalars(
+            select(DraftVersion).where(DraftVersion.blog_draft_id == draft.id).order_by(DraftVersion.id)
+        ).all()
+        assert [version.version_name for version in versions] == ['v0', 'v1', 'v2', 'v3']
+        assert draft.current_version_id == versions[-1].id
+        for index, version in enumerate(versions):
+            assert load_version_text(db.session, version.id) == f'draft {number} version {index} ' * 20
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache
+
+    Entries are evicted once there are more than max_entries of them (if
+    set) or, when max_bytes is set, once their combined sizeof() exceeds it.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never worth evicting everything else for one oversized entry
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def discard(self, key):
+        """Drop key if it is cached"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches predicate"""
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
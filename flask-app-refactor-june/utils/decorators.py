@@ -1,12 +1,14 @@
 from functools import wraps
-from flask import session, redirect, url_for, request, flash
-from models import User
+from flask import session, redirect, url_for, request, flash, g
+from models import db, User
 
 def login_required(f):
     """Decorator to require user authentication"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if get_current_user() is None:
+            # Drop a session whose account no longer exists
+            session.pop('user_id', None)
             # Store the intended destination
             if request.endpoint != 'auth.login':
                 session['next'] = request.url
@@ -25,7 +27,16 @@ def redirect_if_authenticated(f):
     return decorated_function
 
 def get_current_user():
-    """Get the current authenticated user"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
\ No newline at end of file
+    """Get the current authenticated user, loaded at most once per request"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    if g.get('_current_user_id') != user_id:
+        g._current_user = db.session.get(User, user_id)
+        g._current_user_id = user_id
+    return g._current_user
+
+def forget_current_user():
+    """Drop the request's cached user, e.g. after the account is deleted"""
+    g.pop('_current_user', None)
+    g.pop('_current_user_id', None)
\ No newline at end of file
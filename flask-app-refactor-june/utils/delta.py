@@ -0,0 +1,79 @@
+import difflib
+import json
+
+def make_delta(source, target):
+    """Encode target as a line-based delta against source.
+
+    The delta is a compact JSON list of operations applied in order while
+    walking the source lines:
+      * positive int n  -> copy the next n lines from source
+      * negative int -n -> skip the next n lines of source
+      * string s        -> insert s verbatim
+    """
+    source_lines = source.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, source_lines, target_lines)
+
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+        else:
+            if i2 > i1:
+                ops.append(i1 - i2)
+            if j2 > j1:
+                ops.append(''.join(target_lines[j1:j2]))
+
+    return json.dumps(ops, separators=(',', ':'), ensure_ascii=False)
+
+def apply_delta(source, delta):
+    """Rebuild the target text from source and a delta made by make_delta"""
+    source_lines = source.splitlines(keepends=True)
+    position = 0
+    parts = []
+
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.extend(source_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+
+    return ''.join(parts)
+
+def apply_operations(text, operations):
+    """Apply editor text operations to text
+
+    Operations run in order, each against the result of the previous one:
+      * {"type": "delete", "start": s, "end": e} -> remove [s, e)
+      * {"type": "insert", "start": s, "text": t} -> insert t at s
+    Offsets count UTF-16 code units, the way JavaScript strings do. Raises
+    ValueError for malformed operations or out of range offsets.
+    """
+    units = text.encode('utf-16-le')
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError('operation must be an object')
+        length = len(units) // 2
+        start = operation.get('start')
+        if not isinstance(start, int) or not 0 <= start <= length:
+            raise ValueError('start out of range')
+
+        kind = operation.get('type')
+        if kind == 'delete':
+            end = operation.get('end')
+            if not isinstance(end, int) or not start <= end <= length:
+                raise ValueError('end out of range')
+            units = units[:2 * start] + units[2 * end:]
+        elif kind == 'insert':
+            inserted = operation.get('text')
+            if not isinstance(inserted, str):
+                raise ValueError('insert needs text')
+            units = units[:2 * start] + inserted.encode('utf-16-le') + units[2 * start:]
+        else:
+            raise ValueError(f'unknown operation {kind!r}')
+
+    # Fails if an offset split a surrogate pair
+    return units.decode('utf-16-le')
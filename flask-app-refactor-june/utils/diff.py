@@ -0,0 +1,261 @@
+import re
+
+# Linear-space Myers diff. Sequences are compared element by element, so
+# callers pass lists of lines or word tokens. Ranges are split at the middle
+# snake and processed from an explicit stack, which keeps memory at O(N + M)
+# and avoids deep recursion on long documents.
+
+WORD_PATTERN = re.compile(r'\s+|\w+|[^\w\s]')
+
+def _bisect(a, a_lo, a_hi, b, b_lo, b_hi):
+    """Find the split point (x, y) of the middle snake, or None if nothing matches"""
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    max_d = (n + m + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d
+    v1 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2 = list(v1)
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        # Walk the forward path one step
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+
+        # Walk the reverse path one step
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - 1 - x2] == b[b_hi - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = v_offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+
+    return None
+
+def diff_opcodes(a, b):
+    """Return difflib-style opcodes (tag, i1, i2, j1, j2) turning a into b"""
+    ops = []
+
+    def emit(tag, i1, i2, j1, j2):
+        if i1 == i2 and j1 == j2:
+            return
+        if ops and ops[-1][0] == tag:
+            ops[-1] = (tag, ops[-1][1], i2, ops[-1][3], j2)
+        else:
+            ops.append((tag, i1, i2, j1, j2))
+
+    stack = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        kind, a_lo, a_hi, b_lo, b_hi = stack.pop()
+        if kind == 'equal':
+            emit('equal', a_lo, a_hi, b_lo, b_hi)
+            continue
+
+        # Trim the common prefix and suffix
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            emit('equal', a_lo, a_lo + 1, b_lo, b_lo + 1)
+            a_lo += 1
+            b_lo += 1
+        suffix = 0
+        while a_lo < a_hi - suffix and b_lo < b_hi - suffix and a[a_hi - 1 - suffix] == b[b_hi - 1 - suffix]:
+            suffix += 1
+        if suffix:
+            stack.append(('equal', a_hi - suffix, a_hi, b_hi - suffix, b_hi))
+            a_hi -= suffix
+            b_hi -= suffix
+
+        if a_lo == a_hi or b_lo == b_hi:
+            emit('delete', a_lo, a_hi, b_lo, b_lo)
+            emit('insert', a_hi, a_hi, b_lo, b_hi)
+            continue
+
+        split = _bisect(a, a_lo, a_hi, b, b_lo, b_hi) if (a_hi - a_lo) + (b_hi - b_lo) > 2 else None
+        if split is None:
+            emit('delete', a_lo, a_hi, b_lo, b_lo)
+            emit('insert', a_hi, a_hi, b_lo, b_hi)
+            continue
+
+        x, y = split
+        stack.append(('range', a_lo + x, a_hi, b_lo + y, b_hi))
+        stack.append(('range', a_lo, a_lo + x, b_lo, b_lo + y))
+
+    # Fold adjacent delete/insert pairs into replacements
+    opcodes = []
+    for op in ops:
+        if opcodes and {opcodes[-1][0], op[0]} == {'delete', 'insert'}:
+            prev = opcodes[-1]
+            opcodes[-1] = ('replace', prev[1], op[2], prev[3], op[4])
+        elif opcodes and opcodes[-1][0] == 'replace' and op[0] in ('delete', 'insert'):
+            prev = opcodes[-1]
+            opcodes[-1] = ('replace', prev[1], op[2], prev[3], op[4])
+        else:
+            opcodes.append(op)
+    return opcodes
+
+def word_diff(old_line, new_line):
+    """Diff two lines word by word
+
+    Returns (old_segments, new_segments, similarity) where each segment is a
+    [kind, text] pair and kind is 'equal', 'removed' or 'added'.
+    """
+    old_words = WORD_PATTERN.findall(old_line)
+    new_words = WORD_PATTERN.findall(new_line)
+    old_segments = []
+    new_segments = []
+    matched = 0
+
+    for tag, i1, i2, j1, j2 in diff_opcodes(old_words, new_words):
+        if tag == 'equal':
+            text = ''.join(old_words[i1:i2])
+            old_segments.append(['equal', text])
+            new_segments.append(['equal', text])
+            matched += len(text)
+            continue
+        if i2 > i1:
+            old_segments.append(['removed', ''.join(old_words[i1:i2])])
+        if j2 > j1:
+            new_segments.append(['added', ''.join(new_words[j1:j2])])
+
+    longest = max(len(old_line), len(new_line))
+    similarity = matched / longest if longest else 1.0
+    return old_segments, new_segments, similarity
+
+def _expand_opcode(old_lines, new_lines, tag, i1, i2, j1, j2, min_similarity):
+    """Turn one opcode into per-line diff entries"""
+    entries = []
+    if tag == 'equal':
+        for offset in range(i2 - i1):
+            entries.append({
+                'type': 'unchanged',
+                'old_no': i1 + offset + 1,
+                'new_no': j1 + offset + 1,
+                'text': old_lines[i1 + offset]
+            })
+        return entries
+
+    paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+    for offset in range(paired):
+        old_line = old_lines[i1 + offset]
+        new_line = new_lines[j1 + offset]
+        old_segments, new_segments, similarity = word_diff(old_line, new_line)
+        if similarity >= min_similarity:
+            entries.append({
+                'type': 'modified',
+                'old_no': i1 + offset + 1,
+                'new_no': j1 + offset + 1,
+                'old': old_line,
+                'new': new_line,
+                'old_segments': old_segments,
+                'new_segments': new_segments
+            })
+        else:
+            entries.append({'type': 'removed', 'old_no': i1 + offset + 1, 'text': old_line})
+            entries.append({'type': 'added', 'new_no': j1 + offset + 1, 'text': new_line})
+
+    for index in range(i1 + paired, i2):
+        entries.append({'type': 'removed', 'old_no': index + 1, 'text': old_lines[index]})
+    for index in range(j1 + paired, j2):
+        entries.append({'type': 'added', 'new_no': index + 1, 'text': new_lines[index]})
+    return entries
+
+def _group_opcodes(opcodes, context):
+    """Split opcodes into hunks with `context` unchanged lines around each change"""
+    if not any(op[0] != 'equal' for op in opcodes):
+        return []
+    if context is None:
+        return [opcodes]
+
+    codes = list(opcodes)
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # Start a new hunk whenever a long unchanged run separates changes
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return [[op for op in g if op[1] != op[2] or op[3] != op[4]] for g in groups]
+
+def diff_texts(old_text, new_text, context=3, min_similarity=0.3):
+    """Line diff of two texts grouped into hunks
+
+    Changed line pairs that are similar enough are reported as 'modified'
+    with word-level segments. Pass context=None for a single hunk covering
+    both texts in full.
+    """
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    opcodes = diff_opcodes(old_lines, new_lines)
+
+    stats = {'added': 0, 'removed': 0, 'modified': 0}
+    hunks = []
+    for group in _group_opcodes(opcodes, context):
+        lines = []
+        for opcode in group:
+            lines.extend(_expand_opcode(old_lines, new_lines, *opcode, min_similarity))
+        for line in lines:
+            if line['type'] != 'unchanged':
+                stats[line['type']] += 1
+        hunks.append({
+            'old_start': group[0][1] + 1,
+            'old_lines': group[-1][2] - group[0][1],
+            'new_start': group[0][3] + 1,
+            'new_lines': group[-1][4] - group[0][3],
+            'lines': lines
+        })
+
+    return {
+        'old_line_count': len(old_lines),
+        'new_line_count': len(new_lines),
+        'stats': stats,
+        'hunks': hunks
+    }
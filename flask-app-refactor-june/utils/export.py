@@ -0,0 +1,189 @@
+import calendar
+import io
+import json
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+from sqlalchemy import select
+
+# Account export
+#
+# A user's drafts and every version are written as markdown files into a
+# zip or gzipped tar that is produced while it is sent: drafts and version
+# rows are read through streaming cursors (yield_per), each file is handed
+# to the client as soon as it is compressed, and the manifest is spooled to
+# a temporary file and appended last. For tar, memory stays flat however
+# many versions the account has; zip has to keep a directory record of
+# about 0.5 KB per file for its trailer. Autosaves still sitting in the save buffer, at most
+# SAVE_BUFFER_INTERVAL old, are not included.
+
+FORMATS = {
+    'zip': ('application/zip', 'zip'),
+    'tar': ('application/gzip', 'tar.gz')
+}
+
+ROOT = 'draft-mode-export'
+
+def slugify(value, fallback):
+    slug = re.sub(r'[^a-z0-9]+', '-', (value or '').lower()).strip('-')[:60]
+    return slug or fallback
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+class _Sink:
+    """Write-only file object whose contents are collected and drained by the generator"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+class _ZipWriter:
+    def __init__(self, sink):
+        self._zip = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, name, data, modified):
+        info = zipfile.ZipInfo(name, date_time=(modified.timetuple() if modified else time.gmtime())[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self._zip.writestr(info, data)
+
+    def add_file(self, name, handle, size):
+        info = zipfile.ZipInfo(name, date_time=time.gmtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self._zip.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as entry:
+            shutil.copyfileobj(handle, entry)
+
+    def close(self):
+        self._zip.close()
+
+class _TarWriter:
+    def __init__(self, sink):
+        self._tar = tarfile.open(fileobj=sink, mode='w|gz')
+
+    def add(self, name, data, modified):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        # Stored timestamps are naive UTC
+        info.mtime = calendar.timegm(modified.timetuple()) if modified else time.time()
+        self._add(info, io.BytesIO(data))
+
+    def add_file(self, name, handle, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = time.time()
+        self._add(info, handle)
+
+    def _add(self, info, handle):
+        self._tar.addfile(info, handle)
+        # TarFile remembers every member for reading back; a stream never does
+        self._tar.members.clear()
+
+    def close(self):
+        self._tar.close()
+
+def _join_by_id(rows, texts):
+    """Pair version rows with (version_id, stored_size, text), both in id
+    order, skipping versions added or removed between the two queries"""
+    texts = iter(texts)
+    current = next(texts, None)
+    for row in rows:
+        while current is not None and current[0] < row.id:
+            current = next(texts, None)
+        if current is None:
+            return
+        if current[0] == row.id:
+            yield row, current[2]
+
+def export_archive(session, user, archive_format='zip', batch_size=100):
+    """Yield the bytes of an archive of every draft and version owned by user"""
+    from models import BlogDraft, DraftVersion, iter_version_texts
+
+    sink = _Sink()
+    writer = (_ZipWriter if archive_format == 'zip' else _TarWriter)(sink)
+    manifest = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+b')
+
+    def note(text):
+        manifest.write(text.encode('utf-8'))
+
+    # The manifest is written piece by piece as drafts and versions go by,
+    # so it never has to be held in memory
+    note(json.dumps({
+        'exported_at': _timestamp(datetime.utcnow()),
+        'user': {'id': user.id, 'name': user.name, 'email': user.email}
+    })[:-1] + ', "drafts": [')
+
+    drafts = session.execute(
+        select(BlogDraft.id, BlogDraft.title, BlogDraft.description, BlogDraft.created_at, BlogDraft.updated_at)
+        .where(BlogDraft.user_id == user.id)
+        .order_by(BlogDraft.id)
+        .execution_options(yield_per=batch_size)
+    )
+    versions = DraftVersion.__table__
+    for draft_index, draft in enumerate(drafts):
+        folder = f'{ROOT}/{draft.id}-{slugify(draft.title, "draft")}'
+        entry = {
+            'id': draft.id,
+            'title': draft.title,
+            'description': draft.description,
+            'created_at': _timestamp(draft.created_at),
+            'updated_at': _timestamp(draft.updated_at),
+            'folder': folder
+        }
+        note((', ' if draft_index else '') + json.dumps(entry)[:-1] + ', "versions": [')
+
+        # Metadata and texts both come in id order; walk them side by side
+        metadata = session.execute(
+            select(
+                versions.c.id, versions.c.version_name, versions.c.tag, versions.c.is_current,
+                versions.c.share_token, versions.c.created_at, versions.c.updated_at,
+                versions.c.word_count, versions.c.character_count
+            )
+            .where(versions.c.blog_draft_id == draft.id)
+            .order_by(versions.c.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for version_index, (version, text) in enumerate(
+            _join_by_id(metadata, iter_version_texts(session, draft.id, batch_size))
+        ):
+            path = f'{folder}/{version.id}-{slugify(version.version_name, "version")}.md'
+            writer.add(path, text.encode('utf-8'), version.updated_at)
+            note((', ' if version_index else '') + json.dumps({
+                'id': version.id,
+                'name': version.version_name,
+                'tag': version.tag,
+                'is_current': bool(version.is_current),
+                'share_token': version.share_token,
+                'created_at': _timestamp(version.created_at),
+                'updated_at': _timestamp(version.updated_at),
+                'word_count': version.word_count,
+                'character_count': version.character_count,
+                'file': path
+            }))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        note(']}')
+
+    note(']}\n')
+    size = manifest.tell()
+    manifest.seek(0)
+    writer.add_file(f'{ROOT}/manifest.json', manifest, size)
+    manifest.close()
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,401 @@
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam, func, insert, select
+
+# Bulk import
+#
+# Drafts come from a JSONL stream (one draft per line) or from an archive
+# made by the account export, and are written in chunks of about
+# IMPORT_BATCH_SIZE versions: each chunk is one transaction of a few
+# executemany statements (content blobs, drafts, versions, blob references,
+# current version, search index), with the draft aggregates, current flags,
+# unique tags and blob encodings worked out in Python. The ORM listeners that maintain those
+# per row are not involved.
+#
+# Records are numbered from 0 in input order and a draft is never split
+# across chunks, so after a failure every record before report.next is
+# committed and none from it on is; importing the same input again with
+# start=report.next picks up where the failed run stopped.
+#
+# JSONL lines have the shape of the export manifest's draft entries, with
+# each version's text inline:
+#
+#   {"title": "...", "description": "...", "created_at": "...",
+#    "versions": [{"name": "...", "content": "...", "tag": "final",
+#                  "is_current": true, "created_at": "...", "updated_at": "..."}]}
+#
+# Only title and each version's content are required. When no version is
+# flagged current the last one is, as if it had been saved last through
+# the editor. Share tokens are never imported.
+
+ZIP_MAGIC = (b'PK\x03\x04', b'PK\x05\x06')
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Archives arriving on a stream are spooled to disk past this size
+SPOOL_BYTES = 16 * 1024 * 1024
+
+TAGS = ('draft', 'final', 'ready_for_review', 'working')
+
+class ImportReport:
+    """Progress of an import: what was committed and how fast"""
+
+    def __init__(self, start=0):
+        self.start = start
+        self.next = start
+        self.drafts = 0
+        self.versions = 0
+        self.error = None
+        self._started = time.perf_counter()
+        self._finished = None
+
+    @property
+    def seconds(self):
+        return (self._finished or time.perf_counter()) - self._started
+
+    @property
+    def rows_per_second(self):
+        seconds = self.seconds
+        return (self.drafts + self.versions) / seconds if seconds > 0 else 0.0
+
+    def finish(self):
+        self._finished = time.perf_counter()
+        return self
+
+    def to_dict(self):
+        return {
+            'drafts': self.drafts,
+            'versions': self.versions,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'next': self.next
+        }
+
+def _peek(handle, size):
+    """(handle, first bytes) without consuming them; non-seekable streams
+    come back wrapped in a buffered reader"""
+    if handle.seekable():
+        position = handle.tell()
+        head = handle.read(size)
+        handle.seek(position)
+        return handle, head
+    if not hasattr(handle, 'peek'):
+        handle = io.BufferedReader(handle)
+    return handle, handle.peek(size)[:size]
+
+def _seekable(handle):
+    if handle.seekable():
+        return handle
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode='w+b')
+    shutil.copyfileobj(handle, spooled)
+    spooled.seek(0)
+    return spooled
+
+def read_records(handle, start=0):
+    """Yield (number, record) for every draft record from start on
+
+    handle is a binary file or stream holding JSONL or an export archive
+    (zip or gzipped tar), told apart by their first bytes.
+    """
+    handle, head = _peek(handle, 4)
+    try:
+        if head.startswith(ZIP_MAGIC):
+            return _zip_records(zipfile.ZipFile(_seekable(handle)), start)
+        if head.startswith(GZIP_MAGIC):
+            return _tar_records(tarfile.open(fileobj=_seekable(handle), mode='r:gz'), start)
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise ValueError(f'Unreadable archive ({e})')
+    return _jsonl_records(handle, start)
+
+def _jsonl_records(handle, start):
+    number = 0
+    for line_number, line in enumerate(handle, 1):
+        if not line.strip():
+            continue
+        if number >= start:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'Line {line_number}: invalid JSON ({e})')
+            yield number, record
+        number += 1
+
+def _manifest_name(names):
+    candidates = [name for name in names if name.rsplit('/', 1)[-1] == 'manifest.json']
+    if not candidates:
+        raise ValueError('Archive has no manifest.json')
+    return min(candidates, key=len)
+
+def _manifest_records(manifest, read, start):
+    drafts = manifest.get('drafts') if isinstance(manifest, dict) else None
+    if not isinstance(drafts, list):
+        raise ValueError('manifest.json has no drafts list')
+    for number, draft in enumerate(drafts):
+        if number < start:
+            continue
+        if isinstance(draft, dict) and isinstance(draft.get('versions'), list):
+            draft = dict(draft, versions=[
+                dict(version, content=read(version['file'])) if isinstance(version, dict) and 'file' in version
+                else version
+                for version in draft['versions']
+            ])
+        yield number, draft
+
+def _zip_records(archive, start):
+    with archive:
+        manifest = json.loads(archive.read(_manifest_name(archive.namelist())))
+
+        def read(name):
+            try:
+                return archive.read(name).decode('utf-8')
+            except KeyError:
+                raise ValueError(f'Archive has no file {name}')
+
+        yield from _manifest_records(manifest, read, start)
+
+def _tar_records(archive, start):
+    with archive:
+        manifest = json.load(archive.extractfile(_manifest_name(archive.getnames())))
+
+        def read(name):
+            try:
+                return archive.extractfile(name).read().decode('utf-8')
+            except (KeyError, AttributeError):
+                raise ValueError(f'Archive has no file {name}')
+
+        yield from _manifest_records(manifest, read, start)
+
+def _timestamp(value, number, default):
+    if value is None:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Record {number}: invalid timestamp {value!r}')
+    if parsed.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _text(record, key, number, limit=None, required=False):
+    value = record.get(key)
+    if value is None or (required and not str(value).strip()):
+        if required:
+            raise ValueError(f'Record {number}: {key} is required')
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Record {number}: {key} must be a string')
+    if limit is not None and len(value) > limit:
+        raise ValueError(f'Record {number}: {key} is longer than {limit} characters')
+    return value
+
+def prepare_draft(record, number, now):
+    """Validate one record and work out what the ORM listeners would store
+
+    Returns (draft values, [version values]) ready for insertion, each
+    version carrying its full text under 'text'.
+    """
+    from models import UNIQUE_TAGS, text_stats
+
+    if not isinstance(record, dict):
+        raise ValueError(f'Record {number}: expected an object')
+    versions = record.get('versions') or []
+    if not isinstance(versions, list):
+        raise ValueError(f'Record {number}: versions must be a list')
+
+    rows = []
+    holders = {}
+    current = None
+    for index, version in enumerate(versions):
+        if not isinstance(version, dict):
+            raise ValueError(f'Record {number}: version {index} must be an object')
+        text = version.get('content')
+        if not isinstance(text, str):
+            raise ValueError(f'Record {number}: version {index} needs content')
+        tag = version.get('tag') or 'draft'
+        if tag not in TAGS:
+            raise ValueError(f'Record {number}: invalid tag {tag!r}')
+        if tag in UNIQUE_TAGS:
+            # As with set_tag, the latest holder of a unique tag keeps it
+            if tag in holders:
+                rows[holders[tag]]['tag'] = 'draft'
+            holders[tag] = index
+        if version.get('is_current'):
+            current = index
+        created_at = _timestamp(version.get('created_at'), number, now)
+        word_count, character_count = text_stats(text)
+        rows.append({
+            'version_name': _text(version, 'name', number, 100) or f'Version {index + 1}',
+            'text': text,
+            'created_at': created_at,
+            'updated_at': _timestamp(version.get('updated_at'), number, created_at),
+            'is_current': False,
+            'share_token': None,
+            'tag': tag,
+            'word_count': word_count,
+            'character_count': character_count,
+            'revision': 0
+        })
+
+    if rows:
+        rows[len(rows) - 1 if current is None else current]['is_current'] = True
+    current_row = next((row for row in rows if row['is_current']), None)
+
+    created_at = _timestamp(record.get('created_at'), number, now)
+    last_edited_at = max((row['updated_at'] for row in rows), default=None)
+    draft = {
+        'title': _text(record, 'title', number, 200, required=True),
+        'description': _text(record, 'description', number),
+        'created_at': created_at,
+        'updated_at': _timestamp(record.get('updated_at'), number, max(created_at, last_edited_at or created_at)),
+        'version_count': len(rows),
+        'has_final': any(row['tag'] == 'final' for row in rows),
+        'current_word_count': current_row['word_count'] if current_row else 0,
+        'current_char_count': current_row['character_count'] if current_row else 0,
+        'last_edited_at': last_edited_at
+    }
+    return draft, rows
+
+def _insert_rows(session, table, rows):
+    """Insert rows in one executemany and return their ids in input order"""
+    if session.connection().dialect.name != 'sqlite':
+        # Batched INSERT ... RETURNING that keeps the input order
+        return session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    # SQLite would run one INSERT per row for ordered RETURNING. Each row
+    # takes max(id) + 1 instead: the first one takes the write lock, so
+    # the ids are the len(rows) after the old maximum
+    next_id = select(func.coalesce(func.max(table.c.id), 0) + 1).scalar_subquery()
+    session.execute(insert(table).values(id=next_id), rows)
+    last_id = session.scalar(select(func.max(table.c.id)))
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+def _write_chunk(session, user_id, chunk, interval):
+    """Insert a chunk of prepared drafts; returns the number of versions"""
+    from models import BlogDraft, DraftVersion, adjust_refs, hash_text, store_blobs
+    from utils.search import search_index
+
+    drafts = BlogDraft.__table__
+    versions = DraftVersion.__table__
+    connection = session.connection()
+
+    draft_ids = _insert_rows(session, drafts, [dict(draft, user_id=user_id) for draft, _ in chunk])
+
+    # Each version's blob is encoded against the one before it in its draft,
+    # as a save would; texts already stored are reused
+    entries = []
+    for _, rows in chunk:
+        previous = None
+        for row in rows:
+            entries.append((row['text'], previous))
+            previous = hash_text(row['text'])
+    hashes = store_blobs(connection, entries, interval) if entries else []
+
+    version_rows = []
+    position = 0
+    for draft_id, (_, rows) in zip(draft_ids, chunk):
+        for row in rows:
+            version_rows.append(dict(
+                {key: value for key, value in row.items() if key != 'text'},
+                blog_draft_id=draft_id, content_hash=hashes[position]
+            ))
+            position += 1
+    version_ids = _insert_rows(session, versions, version_rows) if version_rows else []
+    adjust_refs(connection, Counter(hashes))
+
+    currents = []
+    documents = []
+    position = 0
+    for draft_id, (draft, rows) in zip(draft_ids, chunk):
+        for row in rows:
+            version_id = version_ids[position]
+            position += 1
+            if row['is_current']:
+                currents.append({'draft_id': draft_id, 'current_id': version_id})
+                documents.append((draft_id, user_id, hashes[position - 1], row['text']))
+
+    if currents:
+        session.execute(
+            drafts.update().where(drafts.c.id == bindparam('draft_id')).values(
+                current_version_id=bindparam('current_id'),
+                updated_at=drafts.c.updated_at
+            ),
+            currents
+        )
+    search_index.index_many(
+        session, connection,
+        [(draft_id, user_id, draft['title'], draft['description']) for draft_id, (draft, _) in zip(draft_ids, chunk)],
+        documents
+    )
+    return len(version_rows)
+
+def import_drafts(session, user_id, records, start=0, batch_size=None, progress=None):
+    """Import (number, record) pairs for a user, committing chunk by chunk
+
+    Stops at the first invalid record, after committing the ones before
+    it, or at the first failed write, after rolling back its chunk;
+    report.error says why and report.next is where to resume.
+    progress(report) is called after every commit.
+    """
+    from utils.user_cache import user_summary_cache
+
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 500)
+    interval = current_app.config.get('VERSION_KEYFRAME_INTERVAL', 16)
+    report = ImportReport(start)
+    chunk = []
+    chunk_versions = 0
+    end = start
+
+    def commit():
+        nonlocal chunk, chunk_versions
+        report.versions += _write_chunk(session, user_id, chunk, interval)
+        session.commit()
+        report.drafts += len(chunk)
+        report.next = end
+        chunk = []
+        chunk_versions = 0
+        if progress is not None:
+            progress(report)
+
+    try:
+        now = datetime.utcnow()
+        invalid = None
+        records = iter(records)
+        while True:
+            try:
+                number, record = next(records, (None, None))
+                if number is None:
+                    break
+                draft, rows = prepare_draft(record, number, now)
+            except ValueError as e:
+                # Bad input: still keep the valid records read before it
+                invalid = e
+                break
+            if chunk and chunk_versions + len(rows) > batch_size:
+                commit()
+            chunk.append((draft, rows))
+            chunk_versions += len(rows)
+            end = number + 1
+        if chunk:
+            commit()
+        if invalid is not None:
+            raise invalid
+    except Exception as e:
+        session.rollback()
+        if not isinstance(e, ValueError):
+            current_app.logger.exception('Import failed at record %s', report.next)
+        report.error = str(e)
+    finally:
+        if report.drafts:
+            user_summary_cache.invalidate(user_id)
+
+    return report.finish()
@@ -0,0 +1,74 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import jsonify, request
+from sqlalchemy import tuple_
+
+# Helpers shared by the JSON list endpoints: keyset pagination with opaque
+# cursors, ?fields= projections and conditional (ETag) responses.
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor for the row identified by (timestamp, row_id)"""
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(timestamp, row_id) from encode_cursor, ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Invalid cursor')
+
+def parse_limit(value, default=50, maximum=100):
+    """Page size from a ?limit= value, clamped to 1..maximum"""
+    if value is None:
+        return default
+    try:
+        return min(max(int(value), 1), maximum)
+    except ValueError:
+        raise ValueError('Invalid limit')
+
+def parse_fields(value, available, default=None):
+    """Fields requested by a comma separated ?fields= value
+
+    Falls back to default (or every available field) when the parameter is
+    missing. 'id' is always included. Raises ValueError for unknown fields.
+    """
+    if not value:
+        return set(default if default is not None else available) | {'id'}
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(available)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields | {'id'}
+
+def keyset_page(session, query, timestamp_column, id_column, cursor, limit):
+    """Fetch a newest-first page of query after cursor
+
+    Rows are ordered by (timestamp_column, id_column) descending, so the
+    page is found with an index range scan however deep it is. Returns
+    (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    query = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+    rows = session.execute(query).unique().scalars().all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+
+def conditional_json(payload):
+    """JSON response with an ETag; answers a matching If-None-Match with 304"""
+    response = jsonify(payload)
+    response.add_etag()
+    # Let browsers keep the body but revalidate it every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
@@ -0,0 +1,71 @@
+"""Throwaway PostgreSQL server for trying the app, smoke checks and benchmarks
+
+Run a command against a fresh server from the app directory:
+
+    python -m utils.local_postgres -- python -m benchmarks.bench_user_stats
+
+The server is built from the PostgreSQL binaries on PATH (initdb, pg_ctl)
+in a temporary directory, its URL is exported to the command as
+TEST_DATABASE_URL and DATABASE_URL, and everything is removed afterwards.
+Without the binaries the command runs unchanged against SQLite. initdb
+refuses to run as root.
+"""
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@contextlib.contextmanager
+def local_postgres():
+    """Yield the URL of a temporary PostgreSQL server, or None if PostgreSQL isn't installed"""
+    initdb = shutil.which('initdb')
+    pg_ctl = shutil.which('pg_ctl')
+    if initdb is None or pg_ctl is None:
+        yield None
+        return
+
+    directory = tempfile.mkdtemp(prefix='draft-mode-pg-')
+    data = os.path.join(directory, 'data')
+    port = free_port()
+    try:
+        subprocess.run(
+            [initdb, '-D', data, '-U', 'postgres', '-A', 'trust', '--no-sync'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        # fsync off: the data is thrown away, so trade durability for speed
+        subprocess.run(
+            [pg_ctl, '-D', data, '-l', os.path.join(directory, 'server.log'), '-w',
+             '-o', f'-p {port} -k {directory} -c listen_addresses=127.0.0.1 -F', 'start'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        try:
+            yield f'postgresql://postgres@127.0.0.1:{port}/postgres'
+        finally:
+            subprocess.run([pg_ctl, '-D', data, '-m', 'immediate', 'stop'], stdout=subprocess.DEVNULL)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main(argv):
+    command = argv[1:] if argv[:1] == ['--'] else argv
+    if not command:
+        print(__doc__, file=sys.stderr)
+        return 2
+
+    with local_postgres() as url:
+        env = dict(os.environ)
+        if url is None:
+            print('PostgreSQL binaries not found on PATH; running against SQLite', file=sys.stderr)
+        else:
+            env['TEST_DATABASE_URL'] = env['DATABASE_URL'] = url
+        return subprocess.call(command, env=env)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,220 @@
+import bisect
+import logging
+import time
+from threading import Lock
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Request instrumentation
+#
+# Every request records its wall time, the number and total time of the SQL
+# statements it ran, and the time spent rendering markdown. Totals are kept
+# as histograms per endpoint and served in the Prometheus text format at
+# METRICS_PATH. Figures are per process; scrape each worker, or put them
+# behind a multiprocess-aware collector.
+
+PREFIX = 'draft_mode'
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative histogram per label set, in the Prometheus sense"""
+
+    def __init__(self, name, help, buckets, label_names):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.label_names = label_names
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + [float('inf')], counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(pairs + [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{_format_labels(pairs)}}} {_format_value(total)}')
+            lines.append(f'{self.name}_count{{{_format_labels(pairs)}}} {count}')
+        return lines
+
+class Counter:
+    """Monotonic count per label set"""
+
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{{_format_labels(zip(self.label_names, labels))}}} {value}')
+        return lines
+
+def _gauge(name, help, value, kind='gauge'):
+    return [f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {_format_value(value)}']
+
+class RequestMetrics:
+    """Per-endpoint latency, query and render histograms with a /metrics view"""
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._reset([0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10])
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self, buckets):
+        labels = ('endpoint', 'method')
+        self.requests = Counter(f'{PREFIX}_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+        self.duration = Histogram(
+            f'{PREFIX}_request_duration_seconds', 'Time to build the response.', buckets, labels
+        )
+        self.queries = Histogram(
+            f'{PREFIX}_request_queries', 'SQL statements run per request.',
+            [0, 1, 2, 5, 10, 20, 50, 100, 200], labels
+        )
+        self.sql_time = Histogram(
+            f'{PREFIX}_request_sql_seconds', 'Time spent in SQL statements per request.', buckets, labels
+        )
+        self.render_time = Histogram(
+            f'{PREFIX}_request_render_seconds', 'Time spent rendering markdown per request.', buckets, labels
+        )
+        self.slow_requests = Counter(
+            f'{PREFIX}_slow_requests_total', 'Requests slower than SLOW_REQUEST_THRESHOLD.', labels
+        )
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', False):
+            return
+        self._reset(app.config.get('METRICS_BUCKETS') or self.duration.buckets)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        self.slow_threshold = app.config.get('SLOW_REQUEST_THRESHOLD', 0)
+
+        from models import db
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        if app.config.get('METRICS_PATH'):
+            app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.view)
+        app.extensions['metrics'] = self
+
+    def _start_request(self):
+        g._request_stats = {'start': time.perf_counter(), 'queries': 0, 'sql': 0.0, 'render': 0.0}
+
+    def _finish_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['start']
+        labels = (request.endpoint or 'unmatched', request.method)
+
+        with self._lock:
+            self.requests.inc(labels + (str(response.status_code),))
+            self.duration.observe(labels, elapsed)
+            self.queries.observe(labels, stats['queries'])
+            self.sql_time.observe(labels, stats['sql'])
+            self.render_time.observe(labels, stats['render'])
+            slow = self.slow_threshold and elapsed >= self.slow_threshold
+            if slow:
+                self.slow_requests.inc(labels)
+
+        if slow:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, %.0f ms rendering',
+                request.method, request.full_path.rstrip('?'), labels[0],
+                elapsed * 1000, stats['queries'], stats['sql'] * 1000, stats['render'] * 1000
+            )
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={stats["sql"] * 1000:.1f};desc="{stats["queries"]} queries", '
+                f'render;dur={stats["render"] * 1000:.1f}'
+            )
+        return response
+
+    def expose(self):
+        """All metrics in the Prometheus text format"""
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.queries, self.sql_time,
+                           self.render_time, self.slow_requests):
+                lines.extend(metric.expose())
+
+        from utils.rendering import render_cache, render_pool
+        lines += _gauge(f'{PREFIX}_render_cache_hits_total', 'Render cache hits.', render_cache.hits, 'counter')
+        lines += _gauge(f'{PREFIX}_render_cache_misses_total', 'Render cache misses.', render_cache.misses, 'counter')
+
+        if render_pool.enabled:
+            pool = render_pool.stats()
+            lines += _gauge(
+                f'{PREFIX}_render_pool_pending', 'Renders queued or running in worker processes.', pool['pending']
+            )
+            for key in ('renders', 'timeouts', 'saturated'):
+                lines += _gauge(f'{PREFIX}_render_pool_{key}_total', f'Render pool {key}.', pool[key], 'counter')
+
+        from utils.save_buffer import save_buffer
+        buffer = save_buffer.stats()
+        lines += _gauge(f'{PREFIX}_save_buffer_pending', 'Saves waiting to be written.', buffer['pending'])
+        for key in ('saves', 'writes', 'flushes', 'conflicts'):
+            lines += _gauge(f'{PREFIX}_save_buffer_{key}_total', f'Save buffer {key}.', buffer[key], 'counter')
+        lines += _gauge(
+            f'{PREFIX}_save_buffer_coalescing_ratio', 'Saves received per version write.', buffer['coalescing_ratio']
+        )
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return Response(self.expose(), mimetype='text/plain; version=0.0.4')
+
+request_metrics = RequestMetrics()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context so a failed statement leaves nothing behind
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_start', None)
+    if started is not None and has_request_context():
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats['queries'] += 1
+            stats['sql'] += time.perf_counter() - started
+
+def record_render(seconds):
+    """Add markdown rendering time to the current request's figures"""
+    if has_request_context():
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats['render'] += seconds
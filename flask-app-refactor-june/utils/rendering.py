@@ -0,0 +1,438 @@
+import atexit
+import hashlib
+import multiprocessing
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+import markdown
+from flask import g, has_request_context
+from pygments.formatters import HtmlFormatter
+
+from utils.cache import LRUCache
+from utils.metrics import record_render
+
+MARKDOWN_EXTENSIONS = ('extra', 'codehilite', 'fenced_code')
+
+# Renderer pool
+#
+# Building a markdown.Markdown instance loads and wires up every extension,
+# and codehilite builds a fresh Pygments formatter for each code block. Each
+# thread keeps one configured instance, reset between documents, and all of
+# them share formatters for a given set of options.
+
+_formatters = {}
+_formatters_lock = Lock()
+_local = threading.local()
+
+def shared_formatter(lang_str=None, **options):
+    """Pygments formatter factory for codehilite that reuses instances"""
+    key = tuple(sorted((name, repr(value)) for name, value in options.items()))
+    formatter = _formatters.get(key)
+    if formatter is None:
+        with _formatters_lock:
+            formatter = _formatters.setdefault(key, HtmlFormatter(**options))
+    return formatter
+
+def _markdown_instance():
+    """The calling thread's configured Markdown instance"""
+    md = getattr(_local, 'markdown', None)
+    if md is None:
+        md = markdown.Markdown(
+            extensions=list(MARKDOWN_EXTENSIONS),
+            extension_configs={'codehilite': {'pygments_formatter': shared_formatter}}
+        )
+        _local.markdown = md
+    return md
+
+def convert(content):
+    """Render markdown with the pooled instance, bypassing the cache"""
+    md = _markdown_instance()
+    try:
+        return md.reset().convert(content)
+    except Exception:
+        # Don't reuse an instance left in an unknown state
+        _local.markdown = None
+        raise
+
+def convert_plain(content):
+    """Render markdown without syntax highlighting, for when highlighting
+    would take too long"""
+    return markdown.markdown(content, extensions=['extra', 'fenced_code'])
+
+def _html_size(html):
+    return len(html.encode('utf-8'))
+
+class MemoryRenderStore:
+    """In-process render tier with size-based LRU eviction"""
+
+    def __init__(self, max_bytes):
+        self._cache = LRUCache(max_entries=None, max_bytes=max_bytes, sizeof=_html_size)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, html):
+        self._cache.set(key, html)
+
+    def discard(self, key):
+        self._cache.discard(key)
+
+    def clear(self):
+        self._cache.clear()
+
+class SQLiteRenderStore:
+    """On-disk render tier that survives restarts and is shared by worker processes"""
+
+    def __init__(self, path, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS rendered_markdown ('
+            'key TEXT PRIMARY KEY, html TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS ix_rendered_markdown_accessed_at ON rendered_markdown (accessed_at)'
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT html FROM rendered_markdown WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE rendered_markdown SET accessed_at = ? WHERE key = ?', (time.time(), key)
+            )
+            return row[0]
+
+    def set(self, key, html):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO rendered_markdown (key, html, size, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, html, _html_size(html), time.time())
+            )
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently read entries until the store fits in max_bytes"""
+        total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM rendered_markdown').fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._connection.execute(
+                'SELECT key, size FROM rendered_markdown ORDER BY accessed_at LIMIT 64'
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._connection.execute('DELETE FROM rendered_markdown WHERE key = ?', (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def discard(self, key):
+        with self._lock:
+            self._connection.execute('DELETE FROM rendered_markdown WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM rendered_markdown')
+
+class RenderCache:
+    """Tiered cache of rendered markdown keyed by content hash and extension set
+
+    Lookups walk the tiers in order and copy hits into the faster tiers in
+    front of them. Any object with get/set/discard/clear can be a tier.
+    """
+
+    def __init__(self, app=None):
+        self.tiers = []
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tiers = []
+        if app.config.get('RENDER_CACHE_MAX_BYTES'):
+            tiers.append(MemoryRenderStore(app.config['RENDER_CACHE_MAX_BYTES']))
+        if app.config.get('RENDER_CACHE_PATH'):
+            tiers.append(SQLiteRenderStore(
+                app.config['RENDER_CACHE_PATH'],
+                max_bytes=app.config.get('RENDER_CACHE_DISK_MAX_BYTES')
+            ))
+        self.tiers = tiers
+        app.extensions['render_cache'] = self
+
+    @staticmethod
+    def key_for(content, extensions):
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return f"{digest}:{','.join(sorted(extensions))}"
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            html = tier.get(key)
+            if html is not None:
+                for faster in self.tiers[:index]:
+                    faster.set(key, html)
+                self.hits += 1
+                return html
+        self.misses += 1
+        return None
+
+    def set(self, key, html):
+        for tier in self.tiers:
+            tier.set(key, html)
+
+    def discard(self, key):
+        for tier in self.tiers:
+            tier.discard(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+render_cache = RenderCache()
+
+# Render worker processes
+#
+# Highlighting code blocks with Pygments is CPU-bound and holds the GIL, so
+# one long post full of code stalls every other request in the process.
+# With RENDER_POOL_WORKERS set, conversions run in separate processes and
+# the request thread only waits, for at most RENDER_TIMEOUT seconds per
+# request. A render that times out, or finds the pool saturated, is served
+# without highlighting; a late result still lands in the render cache, so
+# the next view is highlighted.
+
+class RenderPool:
+    """Optional process pool for markdown conversion with per-request timeouts"""
+
+    def __init__(self, app=None):
+        self.workers = 0
+        self.timeout = None
+        self.max_pending = 0
+        self.pending = 0
+        self.renders = 0
+        self.timeouts = 0
+        self.saturated = 0
+        self._executor = None
+        self._lock = Lock()
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.workers = app.config.get('RENDER_POOL_WORKERS', 0)
+        self.timeout = app.config.get('RENDER_TIMEOUT')
+        self.max_pending = app.config.get('RENDER_POOL_MAX_PENDING') or self.workers * 2
+        if self.workers and not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+        app.extensions['render_pool'] = self
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _time_left(self):
+        """Seconds this render may wait, from the request's render budget"""
+        if self.timeout is None:
+            return None
+        if not has_request_context():
+            return self.timeout
+        deadline = g.get('_render_deadline')
+        if deadline is None:
+            deadline = g._render_deadline = time.monotonic() + self.timeout
+        return max(deadline - time.monotonic(), 0)
+
+    def convert(self, content, key):
+        """HTML from a worker process, or None if it didn't arrive in time"""
+        timeout = self._time_left()
+        with self._lock:
+            if timeout == 0:
+                # This request has used up its render budget
+                self.timeouts += 1
+                return None
+            if self.pending >= self.max_pending:
+                self.saturated += 1
+                return None
+            if self._executor is None:
+                # Started on first use, so server workers forked after
+                # create_app each get their own pool
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            executor = self._executor
+            self.pending += 1
+            self.renders += 1
+
+        try:
+            future = executor.submit(convert, content)
+        except (BrokenProcessPool, RuntimeError):
+            self._discard_executor(executor)
+            with self._lock:
+                self.pending -= 1
+            return None
+        future.add_done_callback(lambda done: self._finished(done, key))
+
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            return None
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            return None
+
+    def _finished(self, future, key):
+        with self._lock:
+            self.pending -= 1
+        if not future.cancelled() and future.exception() is None:
+            render_cache.set(key, future.result())
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'renders': self.renders,
+                'timeouts': self.timeouts,
+                'saturated': self.saturated
+            }
+
+render_pool = RenderPool()
+
+def render(content):
+    """Render markdown to HTML, served from the render cache when possible"""
+    start = time.perf_counter()
+    try:
+        return _render(content)
+    finally:
+        record_render(time.perf_counter() - start)
+
+def _render(content):
+    key = RenderCache.key_for(content, MARKDOWN_EXTENSIONS)
+    html = render_cache.get(key)
+    if html is not None:
+        return html
+
+    try:
+        if render_pool.enabled:
+            html = render_pool.convert(content, key)
+            if html is None:
+                # Too slow or too busy: plain for now, not cached
+                return convert_plain(content)
+            return html
+        html = convert(content)
+    except Exception:
+        # Fallback to basic markdown if extensions fail; not cached so the
+        # full rendering is retried next time
+        return markdown.markdown(content)
+
+    render_cache.set(key, html)
+    return html
+
+def invalidate(content):
+    """Forget the rendering of content, e.g. after a version is overwritten"""
+    render_cache.discard(RenderCache.key_for(content, MARKDOWN_EXTENSIONS))
+
+# Block-level rendering
+#
+# Previews of long drafts are rendered one top-level block at a time so an
+# edit only re-renders the blocks it touched. Blank lines separate blocks,
+# except inside fenced code and where the next chunk continues the previous
+# block (indented lines, further list items, quotes). Documents using
+# reference links, footnotes, abbreviations, definition lists or raw HTML
+# blocks depend on state shared across blocks and are rendered as one block.
+
+_FENCE_PATTERN = re.compile(r'^(`{3,}|~{3,})')
+_LIST_ITEM_PATTERN = re.compile(r'^(?:[*+-]|\d+\.)[ \t]')
+_DOCUMENT_STATE_PATTERN = re.compile(r'^(?: {0,3}(?:\*?\[[^\]]+\]:|<)|:[ \t])|\[\^', re.MULTILINE)
+
+def _continues(block, line):
+    """Whether a chunk starting with line belongs to the preceding block"""
+    if line[:1] in (' ', '\t'):
+        return True
+    if _LIST_ITEM_PATTERN.match(line):
+        return bool(_LIST_ITEM_PATTERN.match(block[0]))
+    if line.startswith('>'):
+        return block[0].startswith('>')
+    return False
+
+def split_blocks(content):
+    """Split markdown into top-level blocks that render independently"""
+    if _DOCUMENT_STATE_PATTERN.search(content):
+        return [content]
+
+    blocks = []
+    current = None
+    fence = None
+    blank_run = 0
+    for line in content.splitlines():
+        if fence is not None:
+            current.append(line)
+            if line.startswith(fence) and not line.strip(fence[0]).strip():
+                fence = None
+            continue
+
+        if not line.strip():
+            if current is not None:
+                blank_run += 1
+            continue
+
+        if current is None or (blank_run and not _continues(current, line)):
+            current = []
+            blocks.append(current)
+        else:
+            current.extend([''] * blank_run)
+        blank_run = 0
+        current.append(line)
+
+        match = _FENCE_PATTERN.match(line)
+        if match:
+            fence = match.group(1)
+
+    return ['\n'.join(block) for block in blocks]
+
+def block_hash(block):
+    return hashlib.sha256(block.encode('utf-8')).hexdigest()[:16]
+
+def render_blocks(content, known=()):
+    """Render content block by block for an incremental preview
+
+    Returns the hash of every block in document order, plus the HTML of each
+    block whose hash is not in known together with its position. Repeated
+    blocks are sent once.
+    """
+    known = set(known)
+    hashes = []
+    changed = []
+    for index, block in enumerate(split_blocks(content)):
+        digest = block_hash(block)
+        hashes.append(digest)
+        if digest not in known:
+            changed.append({'index': index, 'hash': digest, 'html': render(block)})
+            known.add(digest)
+
+    return {'hashes': hashes, 'blocks': changed}
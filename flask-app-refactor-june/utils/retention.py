@@ -0,0 +1,308 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, or_, select
+
+from utils.save_buffer import save_buffer
+from utils.sqlite import file_database_path
+
+logger = logging.getLogger(__name__)
+
+# Version retention
+#
+# Autosaves and duplicates leave a trail of untagged versions. Versions that
+# are tagged, current or shared are always kept, and so is the newest
+# version of every draft. Other versions last edited within
+# VERSION_RETENTION_DAYS are kept as well; older ones are thinned to the
+# last one edited in each hour, and past VERSION_RETENTION_HOURLY_DAYS to
+# the last one of each day. An hour or day that already has a kept version
+# loses all of its untagged ones.
+#
+# Deletes go through the session, so blob references are dropped and the
+# aggregate, search and share-cache listeners run as for any other delete.
+# Space comes back when a blob loses its last reference, so a removed
+# version whose text another version still uses frees nothing.
+# They are committed VERSION_RETENTION_BATCH_SIZE versions at a time so
+# saves are never held up for long. On SQLite files using incremental
+# auto-vacuum the freed pages are handed back to the filesystem afterwards,
+# again in bounded steps.
+
+# Pages released per incremental_vacuum step
+VACUUM_STEP_PAGES = 1000
+
+class RetentionPolicy:
+    """Which untagged versions of a draft to thin out"""
+
+    def __init__(self, keep_days=14, hourly_days=90):
+        self.keep_days = keep_days
+        self.hourly_days = max(hourly_days, keep_days)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('VERSION_RETENTION_DAYS', 14), config.get('VERSION_RETENTION_HOURLY_DAYS', 90))
+
+    def cutoff(self, now):
+        """Versions last edited after this are never thinned"""
+        return now - timedelta(days=self.keep_days)
+
+    def bucket(self, edited_at, now):
+        """The hour or day edited_at is thinned to, or None while it is kept in full"""
+        age = now - edited_at
+        if age < timedelta(days=self.keep_days):
+            return None
+        if age < timedelta(days=self.hourly_days):
+            return edited_at.replace(minute=0, second=0, microsecond=0)
+        return edited_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def expired(self, rows, now):
+        """Rows (id, created_at, updated_at, tag, is_current, share_token)
+        of one draft that the policy removes"""
+        if not rows:
+            return []
+        newest = max(rows, key=lambda row: (row.created_at or datetime.min, row.id))
+        kept_buckets = set()
+        buckets = {}
+        for row in rows:
+            edited_at = row.updated_at or row.created_at
+            bucket = self.bucket(edited_at, now) if edited_at else None
+            if bucket is None:
+                continue
+            if row is newest or row.is_current or row.share_token or (row.tag or 'draft') != 'draft':
+                kept_buckets.add(bucket)
+            else:
+                buckets.setdefault(bucket, []).append(row)
+
+        expired = []
+        for bucket, members in buckets.items():
+            if bucket in kept_buckets:
+                expired.extend(members)
+            else:
+                # The bucket's last edit stands for it
+                members.sort(key=lambda row: (row.updated_at or row.created_at, row.id))
+                expired.extend(members[:-1])
+        return expired
+
+class RetentionReport:
+    """Outcome of one retention run"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.drafts = 0
+        self.versions = 0
+        self.deleted = 0
+        self.reclaimed_bytes = 0
+        self.batches = 0
+        self.vacuumed_pages = 0
+        self.free_pages = 0
+        self.page_size = 0
+
+    def to_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'drafts': self.drafts,
+            'versions': self.versions,
+            'deleted': self.deleted,
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'batches': self.batches,
+            'vacuumed_bytes': self.vacuumed_pages * self.page_size,
+            'free_bytes': self.free_pages * self.page_size
+        }
+
+def _removable(table, cutoff):
+    """Rows the policy may ever remove, rechecked when deleting"""
+    return (
+        or_(table.c.tag == 'draft', table.c.tag.is_(None)),
+        table.c.is_current.is_not(True),
+        table.c.share_token.is_(None),
+        func.coalesce(table.c.updated_at, table.c.created_at) < cutoff
+    )
+
+def apply_retention(session, policy, dry_run=False, batch_size=500, draft_id=None, now=None, progress=None):
+    """Thin out old untagged versions as policy says, committing in batches
+
+    With dry_run nothing is written and the report gives what would be
+    removed, counting the bytes blobs built on a removed one gain when they
+    are re-encoded, as releasing it does.
+    progress(report) is called after every batch.
+    """
+    from models import DraftVersion, plan_blob_release
+
+    table = DraftVersion.__table__
+    now = now or datetime.utcnow()
+    cutoff = policy.cutoff(now)
+    report = RetentionReport(dry_run)
+
+    # Only drafts with something the policy could remove are looked at
+    query = select(table.c.blog_draft_id).where(*_removable(table, cutoff)).distinct().order_by(table.c.blog_draft_id)
+    if draft_id is not None:
+        query = query.where(table.c.blog_draft_id == draft_id)
+    draft_ids = session.execute(query).scalars().all()
+
+    batch = []
+    released = Counter()
+
+    def delete_batch():
+        report.batches += 1
+        if dry_run:
+            report.deleted += len(batch)
+        else:
+            freed_before = session.info.get('freed_blob_bytes', 0)
+            # Recheck in case a version was tagged, shared or edited since it was read
+            victims = session.execute(
+                select(DraftVersion).where(DraftVersion.id.in_([row.id for row in batch]), *_removable(table, cutoff))
+            ).scalars().all()
+            for version in victims:
+                session.delete(version)
+            session.flush()
+            report.deleted += len(victims)
+            report.reclaimed_bytes += session.info.get('freed_blob_bytes', 0) - freed_before
+            session.commit()
+        batch.clear()
+        if progress is not None:
+            progress(report)
+
+    for current_id in draft_ids:
+        rows = session.execute(
+            select(
+                table.c.id, table.c.created_at, table.c.updated_at, table.c.tag,
+                table.c.is_current, table.c.share_token, table.c.content_hash
+            ).where(table.c.blog_draft_id == current_id)
+        ).all()
+        report.drafts += 1
+        report.versions += len(rows)
+        # Versions an autosave is about to land on are left alone
+        expired = [row for row in policy.expired(rows, now) if save_buffer.pending(row.id) is None]
+        for row in expired:
+            if dry_run:
+                released[row.content_hash] += 1
+            batch.append(row)
+            if len(batch) >= batch_size:
+                delete_batch()
+    if batch:
+        delete_batch()
+    if dry_run and released:
+        report.reclaimed_bytes = plan_blob_release(
+            session, released, current_app.config.get('VERSION_KEYFRAME_INTERVAL', 16)
+        )[2]
+    # End the read transaction; a dry run has nothing to keep
+    if dry_run:
+        session.rollback()
+    else:
+        session.commit()
+
+    return report
+
+def incremental_vacuum(engine, report=None, step_pages=VACUUM_STEP_PAGES):
+    """Return free pages of an SQLite file to the filesystem
+
+    Only does anything when the file uses auto_vacuum = INCREMENTAL; each
+    step is its own short transaction. Returns the pages released.
+    """
+    if file_database_path(engine) is None:
+        return 0
+    released = 0
+    with engine.connect() as connection:
+        # The pysqlite cursor stops after the first page of a pragma that
+        # frees several; executescript runs it to completion
+        raw = connection.connection.driver_connection
+        mode = raw.execute('PRAGMA auto_vacuum').fetchone()[0]
+        free = raw.execute('PRAGMA freelist_count').fetchone()[0]
+        while mode == 2 and free:
+            raw.executescript(f'PRAGMA incremental_vacuum({step_pages})')
+            remaining = raw.execute('PRAGMA freelist_count').fetchone()[0]
+            if remaining >= free:
+                break
+            released += free - remaining
+            free = remaining
+        if report is not None:
+            report.vacuumed_pages += released
+            report.free_pages = free
+            report.page_size = raw.execute('PRAGMA page_size').fetchone()[0]
+    return released
+
+def enable_incremental_vacuum(engine):
+    """Switch an SQLite file to incremental auto-vacuum by rebuilding it with VACUUM
+
+    VACUUM rewrites the whole file and blocks writers while it runs.
+    """
+    if file_database_path(engine) is None:
+        return False
+    with engine.connect() as connection:
+        raw = connection.connection.driver_connection
+        raw.executescript('PRAGMA auto_vacuum = INCREMENTAL; VACUUM;')
+    return True
+
+class VersionRetention:
+    """Runs apply_retention every VERSION_RETENTION_INTERVAL seconds in a background thread
+
+    The thread starts with the first request, so CLI commands never start
+    it. Each worker process runs its own, which is harmless but wasteful;
+    with several workers prefer one scheduled `flask prune-versions`.
+    """
+
+    def __init__(self, app=None):
+        self.interval = 0
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._atexit_registered = False
+        self.last_report = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = app.config.get('VERSION_RETENTION_INTERVAL', 0)
+        self._app = app
+        if self.interval > 0:
+            app.before_request(self._ensure_thread)
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+        app.extensions['version_retention'] = self
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='version-retention', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        from models import db
+
+        with self._app.app_context():
+            try:
+                report = apply_retention(
+                    db.session,
+                    RetentionPolicy.from_config(self._app.config),
+                    batch_size=self._app.config.get('VERSION_RETENTION_BATCH_SIZE', 500)
+                )
+                if report.deleted:
+                    incremental_vacuum(db.engine, report)
+                self.last_report = report
+                logger.info('Version retention removed %d of %d versions (%d bytes)',
+                            report.deleted, report.versions, report.reclaimed_bytes)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Version retention failed; retrying on the next interval')
+            finally:
+                db.session.remove()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+version_retention = VersionRetention()
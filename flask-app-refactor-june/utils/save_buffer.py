@@ -0,0 +1,215 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class PendingSave:
+    """Latest buffered content of one version"""
+
+    def __init__(self, version_id, base_revision):
+        self.version_id = version_id
+        # Stored revision the buffered saves count on from
+        self.base_revision = base_revision
+        self.revision = base_revision
+        self.content = None
+        self.saves = 0
+
+class SaveBuffer:
+    """Write-behind buffer that coalesces autosaves
+    
+    Saves for the same version replace each other in memory (latest content
+    wins), and a background thread writes whatever is pending every
+    SAVE_BUFFER_INTERVAL seconds in a single transaction. Explicit saves
+    flush their version straight away, and pending saves are flushed when
+    the process exits normally, so at most one interval of autosaves is at
+    risk if the process is killed outright.
+    
+    Revisions are handed out in memory, counting on from the version's
+    stored revision, so buffering a save touches no database row. A flush
+    writes each version's latest content and revision together. If another
+    process stored the version since its buffered saves started, the
+    content is still written (the last flush wins, as with any two full
+    saves), but under a revision past both, so the editors holding either
+    one get a conflict and resync (counted as conflicts).
+    """
+
+    def __init__(self, app=None):
+        self.interval = 0
+        self._app = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._atexit_registered = False
+        self.saves = 0
+        self.writes = 0
+        self.flushes = 0
+        self.conflicts = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = app.config.get('SAVE_BUFFER_INTERVAL', 0)
+        self._app = app
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+        app.extensions['save_buffer'] = self
+
+    def put(self, version, content, base_revision=None, flush=False):
+        """Buffer new content for a version and return its new revision
+        
+        With base_revision the save only applies on top of that revision.
+        Nothing is written to the database unless flush is set or buffering
+        is disabled, in which case the version is written before returning.
+        None is returned if the save was stale.
+        """
+        version_id = version.id
+        with self._lock:
+            entry = self._entries.get(version_id)
+            if entry is None:
+                entry = PendingSave(version_id, version.saved_revision)
+            if base_revision is not None and base_revision != entry.revision:
+                return None
+            entry.content = content
+            entry.revision += 1
+            entry.saves += 1
+            self._entries[version_id] = entry
+            self.saves += 1
+            revision = entry.revision
+
+        if flush or not self.interval:
+            # Another thread's flush may have written it already
+            return self.flush([version_id]).get(version_id, revision)
+        self._ensure_thread()
+        return revision
+    
+    def pending(self, version_id):
+        """(content, revision) buffered for a version, or None"""
+        with self._lock:
+            entry = self._entries.get(version_id)
+            if entry is None:
+                return None
+            return entry.content, entry.revision
+
+    def flush(self, version_ids=None):
+        """Write pending saves, all of them or only those of version_ids
+        
+        Returns {version_id: stored revision} for the versions written. If
+        the write fails the saves stay buffered for the next flush and the
+        error propagates.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ids = list(self._entries) if version_ids is None else [
+                    version_id for version_id in version_ids if version_id in self._entries
+                ]
+                snapshot = [
+                    (self._entries[version_id], self._entries[version_id].content, self._entries[version_id].revision)
+                    for version_id in ids
+                ]
+            if not snapshot:
+                return {}
+
+            written = self._write(snapshot)
+
+            with self._lock:
+                for entry, content, revision in snapshot:
+                    if entry.revision == revision:
+                        # Nothing new arrived while writing
+                        del self._entries[entry.version_id]
+                    elif entry.version_id in written:
+                        # Later saves now count on from what was stored
+                        entry.base_revision = written[entry.version_id]
+                self.writes += len(written)
+                self.flushes += 1
+
+            logger.debug('Flushed %d buffered saves (%d written, coalescing ratio %.2f)',
+                         len(snapshot), len(written), self.coalescing_ratio)
+            return written
+    
+    def _write(self, snapshot):
+        """Write a snapshot of pending saves in one transaction"""
+        from models import db, DraftVersion
+        from utils.rendering import invalidate
+
+        stale = []
+        written = {}
+        try:
+            versions = {
+                version.id: version for version in DraftVersion.query.filter(
+                    DraftVersion.id.in_([entry.version_id for entry, _, _ in snapshot])
+                )
+            }
+            for entry, content, revision in snapshot:
+                version = versions.get(entry.version_id)
+                if version is None:
+                    # Deleted while the save was buffered
+                    continue
+                previous_content = version.content
+                stored_revision = version.store_revision(entry.base_revision, revision)
+                if stored_revision != revision:
+                    logger.info('Buffered save of version %s conflicted with another process; stored as revision %s',
+                                entry.version_id, stored_revision)
+                    self.conflicts += 1
+                version.content = content
+                if content != previous_content:
+                    stale.append(previous_content)
+                written[version.id] = stored_revision
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for content in stale:
+            invalidate(content)
+        return written
+
+    @property
+    def coalescing_ratio(self):
+        """Saves received per row written"""
+        return self.saves / self.writes if self.writes else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._entries),
+                'saves': self.saves,
+                'writes': self.writes,
+                'flushes': self.flushes,
+                'conflicts': self.conflicts,
+                'coalescing_ratio': self.coalescing_ratio
+            }
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._wake.clear()
+                self._thread = threading.Thread(target=self._run, name='save-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._wake.wait(self.interval):
+            self._flush_all()
+
+    def _flush_all(self):
+        with self._app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered saves; retrying on the next interval')
+
+    def shutdown(self):
+        """Stop the flush thread and write everything still pending"""
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._entries and self._app is not None:
+            self._flush_all()
+
+save_buffer = SaveBuffer()
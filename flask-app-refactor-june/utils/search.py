@@ -0,0 +1,647 @@
+import html
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import select, text
+
+# Full-text search over draft titles and descriptions and version content.
+#
+# SQLite builds with FTS5 keep the index in a virtual table in the main
+# database, and PostgreSQL in a table with a weighted tsvector column, both
+# written in the same transaction as the rows they describe. Other
+# databases fall back to an in-memory inverted index per process, built from
+# the database on first use and updated after each commit, which only suits
+# a single process.
+#
+# Every document belongs to one user. Draft documents (title, description)
+# use rowid -draft_id and content documents use rowid draft_id: the text
+# of the draft's current version, with that version's content_hash. Older
+# versions are not searchable, so the index holds one copy of each draft's
+# text rather than one per saved revision.
+
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_WORDS = 16
+
+# Relative weight of a match in each field when ranking
+FIELD_WEIGHTS = {'title': 10.0, 'description': 4.0, 'content': 1.0}
+
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\w+)')
+WORD_PATTERN = re.compile(r'\w+')
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter that leaves the FTS5 tables alone"""
+    return not (type_ == 'table' and name.startswith('search_index'))
+
+def parse_query(query):
+    """Split a user query into phrases (lists of words)
+    
+    Quoted text is kept as one phrase; every other word is its own phrase.
+    Returns (phrases, prefix) where prefix is true when the query ends in a
+    bare word, which is then matched as a prefix for search-as-you-type.
+    """
+    phrases = []
+    prefix = False
+    for match in QUERY_PATTERN.finditer(query):
+        quoted = match.group(1) is not None
+        words = WORD_PATTERN.findall(match.group(1)) if quoted else [match.group(2)]
+        if words:
+            phrases.append(words)
+            prefix = not quoted
+    return phrases, prefix
+
+def fold(word):
+    """Normalize a word the way the FTS5 unicode61 tokenizer does"""
+    decomposed = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def render_snippet(marked):
+    """Escape a snippet and turn highlight markers into <mark> tags"""
+    return html.escape(marked).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+def make_snippet(text, terms, prefix_term=None):
+    """Highlighted window of text around the first matching word"""
+    words = list(WORD_PATTERN.finditer(text))
+
+    def matches(word):
+        folded = fold(word)
+        return folded in terms or (prefix_term is not None and folded.startswith(prefix_term))
+
+    first = next((index for index, match in enumerate(words) if matches(match.group())), 0)
+    start = max(first - SNIPPET_WORDS // 4, 0)
+    window = words[start:start + SNIPPET_WORDS]
+    if not window:
+        return ''
+
+    parts = []
+    position = window[0].start()
+    for match in window:
+        parts.append(text[position:match.start()])
+        parts.append(HIGHLIGHT_START + match.group() + HIGHLIGHT_END if matches(match.group()) else match.group())
+        position = match.end()
+    snippet = ' '.join(''.join(parts).split())
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_WORDS < len(words):
+        snippet += '…'
+    return snippet
+
+def index_all(backend, connection):
+    """Index every draft and the text of its current version; returns the number of drafts"""
+    from models import BlogDraft, DraftVersion, load_blob_text
+    
+    drafts = BlogDraft.__table__
+    versions = DraftVersion.__table__
+    rows = connection.execute(
+        select(drafts.c.id, drafts.c.user_id, drafts.c.title, drafts.c.description, versions.c.content_hash)
+        .outerjoin(versions, versions.c.id == drafts.c.current_version_id)
+    ).all()
+    for row in rows:
+        backend.index_draft(connection, row.id, row.user_id, row.title, row.description)
+        if row.content_hash is not None:
+            backend.index_content(
+                connection, row.id, row.user_id, row.content_hash, load_blob_text(connection, row.content_hash)
+            )
+    return len(rows)
+
+class FTS5Backend:
+    """Search index kept in an SQLite FTS5 table next to the data"""
+
+    transactional = True
+    built = True
+
+    SCHEMA = (
+        'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+        'owner, title, description, content, draft_id UNINDEXED, content_hash UNINDEXED, '
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+    @staticmethod
+    def available():
+        try:
+            sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    # FTS5 resolves a rowid conflict by deleting the old row first
+    REPLACE = (
+        'INSERT OR REPLACE INTO search_index (rowid, owner, title, description, content, draft_id, content_hash) '
+        'VALUES (:rowid, :owner, :title, :description, :content, :draft_id, :content_hash)'
+    )
+
+    def create_schema(self, connection):
+        connection.execute(text(self.SCHEMA))
+
+    def drop_schema(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    @staticmethod
+    def _draft_row(draft_id, user_id, title, description):
+        return {
+            'rowid': -draft_id, 'owner': f'u{user_id}', 'title': title or '', 'description': description or '',
+            'content': '', 'draft_id': draft_id, 'content_hash': None
+        }
+
+    @staticmethod
+    def _content_row(draft_id, user_id, content_hash, content):
+        return {
+            'rowid': draft_id, 'owner': f'u{user_id}', 'title': '', 'description': '',
+            'content': content or '', 'draft_id': draft_id, 'content_hash': content_hash
+        }
+
+    def index_draft(self, connection, draft_id, user_id, title, description):
+        connection.execute(text(self.REPLACE), self._draft_row(draft_id, user_id, title, description))
+
+    def index_content(self, connection, draft_id, user_id, content_hash, content):
+        connection.execute(text(self.REPLACE), self._content_row(draft_id, user_id, content_hash, content))
+
+    def index_many(self, connection, drafts, contents):
+        """Index new drafts and their current text with one statement"""
+        rows = [self._draft_row(*draft) for draft in drafts] + [self._content_row(*content) for content in contents]
+        if rows:
+            connection.execute(text(self.REPLACE), rows)
+
+    def remove(self, connection, rowid):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': rowid})
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def optimize(self, connection):
+        """Merge the index into a single b-tree after bulk changes"""
+        connection.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+    @staticmethod
+    def match_expression(user_id, phrases, prefix):
+        terms = ['"' + ' '.join(words) + '"' for words in phrases]
+        if prefix:
+            terms[-1] += '*'
+        return f'owner : "u{user_id}" AND {{title description content}} : ({" ".join(terms)})'
+
+    def search(self, connection, user_id, phrases, prefix, limit):
+        """Best matching document per draft: [(draft_id, in_content, score, snippet)]"""
+        # Searching leaves the schema alone; until the table exists nothing matches
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+        ).scalar()
+        if not exists:
+            return []
+        match = self.match_expression(user_id, phrases, prefix)
+        weights = ', '.join(str(weight) for weight in (0.0, *FIELD_WEIGHTS.values()))
+        
+        # Rank every match, keep each draft's best document, and only build
+        # snippets for the rows that make the cut
+        rows = connection.execute(
+            text(
+                # Materialized so bm25() runs inside the MATCH query rather
+                # than being flattened into the grouping
+                'WITH ranked AS MATERIALIZED ('
+                f'  SELECT draft_id, rowid AS doc, bm25(search_index, {weights}) AS score'
+                '  FROM search_index WHERE search_index MATCH :match'
+                ') SELECT draft_id, doc, MIN(score) AS score FROM ranked'
+                ' GROUP BY draft_id ORDER BY score LIMIT :limit'
+            ),
+            {'match': match, 'limit': limit}
+        ).all()
+        if not rows:
+            return []
+        
+        # Snippet of the first field with a highlighted match; the owner
+        # column must never be the one shown
+        columns = ', '.join(
+            f"snippet(search_index, {column}, :start, :end, '…', {SNIPPET_WORDS})" for column in (3, 2, 1)
+        )
+        snippets = {}
+        for rowid, *fields in connection.execute(
+            text(
+                f'SELECT rowid, {columns} FROM search_index WHERE search_index MATCH :match AND rowid IN '
+                f"({', '.join(str(int(row.doc)) for row in rows)})"
+            ),
+            {'match': match, 'start': HIGHLIGHT_START, 'end': HIGHLIGHT_END}
+        ):
+            snippets[rowid] = next((field for field in fields if HIGHLIGHT_START in field), fields[-1])
+        
+        return [
+            (row.draft_id, row.doc > 0, -row.score, snippets.get(row.doc, ''))
+            for row in rows
+        ]
+
+class PostgresBackend:
+    """Search index kept in a PostgreSQL table with a GIN-indexed tsvector
+
+    Uses the 'simple' configuration, so like FTS5's unicode61 tokenizer
+    words are lowercased but not stemmed; unlike it, accents are kept.
+    """
+
+    transactional = True
+    built = True
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS search_index ('
+        ' rowid BIGINT PRIMARY KEY,'
+        ' owner INTEGER NOT NULL,'
+        ' draft_id INTEGER NOT NULL,'
+        ' content_hash VARCHAR(64),'
+        " title TEXT NOT NULL DEFAULT '',"
+        " description TEXT NOT NULL DEFAULT '',"
+        " content TEXT NOT NULL DEFAULT '',"
+        # The parser drops anything that looks like an XML tag or entity,
+        # which markdown text isn't, so <, > and & are blanked out first
+        ' document TSVECTOR GENERATED ALWAYS AS ('
+        "  setweight(to_tsvector('simple', translate(title, '<>&', '   ')), 'A') ||"
+        "  setweight(to_tsvector('simple', translate(description, '<>&', '   ')), 'B') ||"
+        "  setweight(to_tsvector('simple', translate(content, '<>&', '   ')), 'D')"
+        ' ) STORED)',
+        'CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)',
+        'CREATE INDEX IF NOT EXISTS ix_search_index_owner ON search_index (owner)'
+    )
+
+    UPSERT = (
+        'INSERT INTO search_index (rowid, owner, draft_id, content_hash, title, description, content) '
+        'VALUES (:rowid, :owner, :draft_id, :content_hash, :title, :description, :content) '
+        'ON CONFLICT (rowid) DO UPDATE SET owner = excluded.owner, draft_id = excluded.draft_id, '
+        'content_hash = excluded.content_hash, title = excluded.title, '
+        'description = excluded.description, content = excluded.content'
+    )
+
+    # ts_rank weights for D, C, B, A: content, unused, description, title
+    RANK_WEIGHTS = '{%s, 0, %s, 1}' % (
+        FIELD_WEIGHTS['content'] / FIELD_WEIGHTS['title'], FIELD_WEIGHTS['description'] / FIELD_WEIGHTS['title']
+    )
+
+    def create_schema(self, connection):
+        for statement in self.SCHEMA:
+            connection.execute(text(statement))
+
+    def drop_schema(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    @staticmethod
+    def _draft_row(draft_id, user_id, title, description):
+        return {
+            'rowid': -draft_id, 'owner': user_id, 'draft_id': draft_id, 'content_hash': None,
+            'title': title or '', 'description': description or '', 'content': ''
+        }
+
+    @staticmethod
+    def _content_row(draft_id, user_id, content_hash, content):
+        return {
+            'rowid': draft_id, 'owner': user_id, 'draft_id': draft_id, 'content_hash': content_hash,
+            'title': '', 'description': '', 'content': content or ''
+        }
+
+    def index_draft(self, connection, draft_id, user_id, title, description):
+        connection.execute(text(self.UPSERT), self._draft_row(draft_id, user_id, title, description))
+
+    def index_content(self, connection, draft_id, user_id, content_hash, content):
+        connection.execute(text(self.UPSERT), self._content_row(draft_id, user_id, content_hash, content))
+
+    def index_many(self, connection, drafts, contents):
+        """Index new drafts and their current text with one statement"""
+        rows = [self._draft_row(*draft) for draft in drafts] + [self._content_row(*content) for content in contents]
+        if rows:
+            connection.execute(text(self.UPSERT), rows)
+
+    def remove(self, connection, rowid):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': rowid})
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def optimize(self, connection):
+        """Refresh planner statistics after bulk changes"""
+        connection.execute(text('ANALYZE search_index'))
+
+    @staticmethod
+    def tsquery(phrases, prefix):
+        """to_tsquery text: words of a phrase adjacent, phrases all required"""
+        # Words are \w+ matches, so quoting them is enough to keep operators out
+        terms = [' <-> '.join(f"'{word}'" for word in words) for words in phrases]
+        if prefix:
+            terms[-1] += ':*'
+        return ' & '.join(f'({term})' for term in terms)
+
+    def search(self, connection, user_id, phrases, prefix, limit):
+        """Best matching document per draft: [(draft_id, in_content, score, snippet)]"""
+        if connection.execute(text("SELECT to_regclass('search_index')")).scalar() is None:
+            return []
+        # Rank every match, keep each draft's best document, and only read
+        # the text of the rows that make the cut
+        rows = connection.execute(
+            text(
+                'WITH best AS ('
+                '  SELECT DISTINCT ON (draft_id) draft_id, rowid,'
+                '   ts_rank(CAST(:weights AS float4[]), document, query) AS score'
+                "  FROM search_index, to_tsquery('simple', :query) AS query"
+                '  WHERE owner = :owner AND document @@ query'
+                '  ORDER BY draft_id, score DESC'
+                '), top AS (SELECT * FROM best ORDER BY score DESC LIMIT :limit)'
+                ' SELECT top.draft_id, top.rowid AS doc, top.score, s.title, s.description, s.content'
+                ' FROM top JOIN search_index s ON s.rowid = top.rowid ORDER BY top.score DESC'
+            ),
+            {'weights': self.RANK_WEIGHTS, 'query': self.tsquery(phrases, prefix), 'owner': user_id, 'limit': limit}
+        ).all()
+
+        words = [fold(word) for words in phrases for word in words]
+        exact = set(words[:-1] if prefix else words)
+        prefix_term = words[-1] if prefix else None
+        return [
+            (row.draft_id, row.doc > 0, row.score, make_snippet(
+                row.content if row.doc > 0 else f'{row.title}\n{row.description}', exact, prefix_term
+            ))
+            for row in rows
+        ]
+
+class MemoryBackend:
+    """Pure-Python inverted index used when neither FTS5 nor PostgreSQL is available
+
+    Only changes made through this process are seen after the initial
+    build, so other processes' edits show up after a restart or reindex;
+    run a single worker with it.
+    """
+
+    transactional = False
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # rowid -> (owner, draft_id, content_hash, {field: length}, words)
+            self.documents = {}
+            # word -> {rowid: {field: count}}
+            self.postings = defaultdict(dict)
+            self.field_totals = defaultdict(int)
+
+    def create_schema(self, connection):
+        pass
+
+    def drop_schema(self, connection):
+        self.reset()
+        self.built = False
+
+    def ensure_built(self, connection):
+        if self.built:
+            return
+        with self._lock:
+            if not self.built:
+                self.rebuild(connection)
+
+    def rebuild(self, connection):
+        with self._lock:
+            self.reset()
+            index_all(self, connection)
+            self.built = True
+
+    def _add(self, rowid, owner, draft_id, content_hash, fields):
+        with self._lock:
+            self._remove(rowid)
+            lengths = {}
+            vocabulary = set()
+            for field, value in fields.items():
+                words = [fold(word) for word in WORD_PATTERN.findall(value or '')]
+                lengths[field] = len(words)
+                self.field_totals[field] += len(words)
+                vocabulary.update(words)
+                for word in words:
+                    counts = self.postings[word].setdefault(rowid, {})
+                    counts[field] = counts.get(field, 0) + 1
+            self.documents[rowid] = (owner, draft_id, content_hash, lengths, frozenset(vocabulary))
+
+    def _remove(self, rowid):
+        document = self.documents.pop(rowid, None)
+        if document is None:
+            return
+        for field, length in document[3].items():
+            self.field_totals[field] -= length
+        # Only the document's own words, not the whole vocabulary
+        for word in document[4]:
+            entries = self.postings.get(word)
+            if entries is not None and entries.pop(rowid, None) is not None and not entries:
+                del self.postings[word]
+
+    def index_draft(self, connection, draft_id, user_id, title, description):
+        self._add(-draft_id, user_id, draft_id, None, {'title': title, 'description': description})
+
+    def index_content(self, connection, draft_id, user_id, content_hash, content):
+        self._add(draft_id, user_id, draft_id, content_hash, {'content': content})
+
+    def index_many(self, connection, drafts, contents):
+        with self._lock:
+            for draft in drafts:
+                self.index_draft(connection, *draft)
+            for content in contents:
+                self.index_content(connection, *content)
+
+    def remove(self, connection, rowid):
+        with self._lock:
+            self._remove(rowid)
+
+    def clear(self, connection):
+        self.reset()
+
+    def _term_scores(self, word, postings, owner):
+        """BM25 contribution of one word to each of the owner's documents"""
+        document_count = len(self.documents) or 1
+        idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        scores = {}
+        for rowid, counts in postings.items():
+            document = self.documents[rowid]
+            if document[0] != owner:
+                continue
+            score = 0.0
+            for field, count in counts.items():
+                average = self.field_totals[field] / document_count or 1
+                norm = 1 - self.B + self.B * document[3][field] / average
+                score += FIELD_WEIGHTS[field] * count * (self.K1 + 1) / (count + self.K1 * norm)
+            scores[rowid] = idf * score
+        return scores
+
+    def search(self, connection, user_id, phrases, prefix, limit):
+        self.ensure_built(connection)
+        words = [fold(word) for words in phrases for word in words]
+        if not words:
+            return []
+        
+        with self._lock:
+            totals = None
+            for index, word in enumerate(words):
+                if prefix and index == len(words) - 1:
+                    scores = defaultdict(float)
+                    for candidate in [key for key in self.postings if key.startswith(word)]:
+                        for rowid, score in self._term_scores(candidate, self.postings[candidate], user_id).items():
+                            scores[rowid] = max(scores[rowid], score)
+                else:
+                    scores = self._term_scores(word, self.postings.get(word, {}), user_id)
+                # Every word has to match somewhere in the document
+                totals = scores if totals is None else {
+                    rowid: totals[rowid] + score for rowid, score in scores.items() if rowid in totals
+                }
+        
+        # Postings have no positions, so phrases are checked against the text
+        multiword = [[fold(word) for word in words] for words in phrases if len(words) > 1]
+        if multiword:
+            totals = {
+                rowid: score for rowid, score in totals.items()
+                if self._contains_phrases(self._document_text(connection, rowid), multiword)
+            }
+        
+        best = {}
+        for rowid, score in totals.items():
+            document = self.documents.get(rowid)
+            if document is None:
+                # Removed while the lock was released
+                continue
+            draft_id = document[1]
+            if draft_id not in best or score > best[draft_id][1]:
+                best[draft_id] = (rowid, score)
+        
+        ranked = sorted(best.items(), key=lambda item: -item[1][1])[:limit]
+        exact = set(words[:-1] if prefix else words)
+        prefix_term = words[-1] if prefix else None
+        return [
+            (draft_id, rowid > 0, score, make_snippet(self._document_text(connection, rowid), exact, prefix_term))
+            for draft_id, (rowid, score) in ranked
+        ]
+
+    @staticmethod
+    def _contains_phrases(text, phrases):
+        words = [fold(word) for word in WORD_PATTERN.findall(text)]
+        return all(
+            any(words[start:start + len(phrase)] == phrase for start in range(len(words) - len(phrase) + 1))
+            for phrase in phrases
+        )
+
+    def _document_text(self, connection, rowid):
+        from models import BlogDraft, load_blob_text
+        
+        if rowid > 0:
+            document = self.documents.get(rowid)
+            return load_blob_text(connection, document[2]) if document is not None else ''
+        drafts = BlogDraft.__table__
+        row = connection.execute(
+            drafts.select().with_only_columns(drafts.c.title, drafts.c.description).where(drafts.c.id == -rowid)
+        ).one()
+        return f'{row.title}\n{row.description or ""}'
+
+class SearchIndex:
+    """Entry point used by the model listeners, the API and the CLI"""
+
+    def __init__(self, app=None):
+        self._backend = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['search_index'] = self
+
+    def backend(self, connection):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    # Sessions and connections both work here
+                    bind = connection.get_bind() if hasattr(connection, 'get_bind') else connection
+                    dialect = bind.dialect.name
+                    if dialect == 'postgresql':
+                        self._backend = PostgresBackend()
+                    elif dialect == 'sqlite' and FTS5Backend.available():
+                        self._backend = FTS5Backend()
+                    else:
+                        self._backend = MemoryBackend()
+        return self._backend
+
+    def create_schema(self, connection):
+        """Create the index table where the backend keeps one; index writes expect it"""
+        self.backend(connection).create_schema(connection)
+
+    def drop_schema(self, connection):
+        self.backend(connection).drop_schema(connection)
+
+    def _apply(self, session, connection, method, *args):
+        backend = self.backend(connection)
+        if backend.transactional or session is None:
+            getattr(backend, method)(connection, *args)
+        else:
+            # Applied once the transaction commits, dropped on rollback
+            session.info.setdefault('search_changes', []).append((method, args))
+
+    def index_draft(self, session, connection, draft_id, user_id, title, description):
+        self._apply(session, connection, 'index_draft', draft_id, user_id, title, description)
+
+    def index_content(self, session, connection, draft_id, user_id, content_hash, content):
+        """Index the text of a draft's current version, whose blob is content_hash"""
+        self._apply(session, connection, 'index_content', draft_id, user_id, content_hash, content)
+
+    def index_many(self, session, connection, drafts, contents):
+        """Index a batch of new documents
+        
+        drafts are (draft_id, user_id, title, description) and contents
+        (draft_id, user_id, content_hash, content) for current versions.
+        """
+        self._apply(session, connection, 'index_many', list(drafts), list(contents))
+
+    def remove_draft(self, session, connection, draft_id):
+        self._apply(session, connection, 'remove', -draft_id)
+        self._apply(session, connection, 'remove', draft_id)
+
+    def remove_content(self, session, connection, draft_id):
+        """Drop a draft's text once it has no versions left"""
+        self._apply(session, connection, 'remove', draft_id)
+
+    def apply_committed(self, session):
+        changes = session.info.pop('search_changes', None)
+        if changes and self._backend is not None and self._backend.built:
+            # An index that hasn't been built yet will read these from the database
+            for method, args in changes:
+                getattr(self._backend, method)(None, *args)
+
+    def discard_pending(self, session):
+        session.info.pop('search_changes', None)
+
+    def search(self, connection, user_id, query, limit=20):
+        """Ranked drafts matching query for one user
+        
+        Returns [(draft_id, version_id, score, snippet_html)]; version_id is
+        the draft's current version when its text was the best match, and
+        None when the draft's title or description was.
+        """
+        from models import BlogDraft
+        
+        phrases, prefix = parse_query(query)
+        if not phrases:
+            return []
+        results = self.backend(connection).search(connection, user_id, phrases, prefix, limit)
+        drafts = BlogDraft.__table__
+        content_drafts = [draft_id for draft_id, in_content, _, _ in results if in_content]
+        current = dict(connection.execute(
+            select(drafts.c.id, drafts.c.current_version_id).where(drafts.c.id.in_(content_drafts))
+        ).all()) if content_drafts else {}
+        return [
+            (draft_id, current.get(draft_id) if in_content else None, score, render_snippet(snippet))
+            for draft_id, in_content, score, snippet in results
+        ]
+
+    def rebuild(self, connection):
+        """Reindex every draft and its current version from the database"""
+        backend = self.backend(connection)
+        if isinstance(backend, MemoryBackend):
+            backend.rebuild(connection)
+            return len({document[1] for document in backend.documents.values()})
+        
+        backend.create_schema(connection)
+        backend.clear(connection)
+        total = index_all(backend, connection)
+        backend.optimize(connection)
+        return total
+
+search_index = SearchIndex()
@@ -0,0 +1,135 @@
+import hashlib
+import time
+
+from flask import g, make_response, request
+from flask.sessions import SecureCookieSessionInterface
+
+from utils.cache import LRUCache
+
+# Shared page cache
+#
+# /share/<token> pages are public and change rarely, so whole responses are
+# kept per token together with the stamp they were built from: the
+# updated_at of the version, its draft and the author, the three rows the
+# page shows. Within SHARE_CACHE_TTL seconds of building or checking an
+# entry a worker serves it, or answers If-None-Match / If-Modified-Since
+# with 304, without querying the database. After that one light query
+# re-reads the stamp and the page is only rebuilt if it moved.
+#
+# Commits made in this process drop the affected entries straight away
+# (see the listeners in models.py); changes made by other workers are
+# picked up once the TTL runs out.
+#
+# The same bytes go to every visitor and may sit in a shared cache, so
+# these responses never carry the session: no Set-Cookie refreshing a
+# signed-in visitor's cookie and no Vary: Cookie.
+
+class SharedPageSessionInterface(SecureCookieSessionInterface):
+    """Cookie sessions that are left unsaved on share page responses"""
+
+    def save_session(self, app, session, response):
+        if g.get('_shared_page_response'):
+            return
+        super().save_session(app, session, response)
+
+class SharedPage:
+    """Rendered share page with its validators"""
+
+    def __init__(self, body, stamp, draft_id, user_id, last_modified):
+        self.body = body
+        self.stamp = stamp
+        self.draft_id = draft_id
+        self.user_id = user_id
+        self.last_modified = last_modified
+        # Strong validator: the same ETag always means the same bytes
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.checked_at = time.monotonic()
+
+class ShareCache:
+    """Full-response cache for public share pages"""
+
+    def __init__(self, app=None):
+        self.ttl = 0
+        self.max_age = 0
+        self._pages = LRUCache(max_entries=512)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SHARE_CACHE_TTL', 0)
+        self.max_age = app.config.get('SHARE_PAGE_MAX_AGE', 0)
+        self._pages = LRUCache(
+            max_entries=app.config.get('SHARE_CACHE_ENTRIES', 512),
+            max_bytes=app.config.get('SHARE_CACHE_MAX_BYTES'),
+            sizeof=lambda page: len(page.body)
+        )
+        app.session_interface = SharedPageSessionInterface()
+        app.extensions['share_cache'] = self
+
+    def fresh(self, token):
+        """The cached page for token if it was checked within the TTL"""
+        page = self._pages.get(token)
+        if page is not None and time.monotonic() - page.checked_at < self.ttl:
+            return page
+        return None
+
+    def current(self, token, stamp):
+        """The cached page for token if it was built from stamp, marked as checked"""
+        page = self._pages.get(token)
+        if page is None or page.stamp != stamp:
+            return None
+        page.checked_at = time.monotonic()
+        return page
+
+    def store(self, token, page):
+        if self.ttl > 0:
+            self._pages.set(token, page)
+        return page
+
+    def invalidate(self, token):
+        self._pages.discard(token)
+
+    def invalidate_draft(self, draft_id):
+        self._pages.discard_where(lambda page: page.draft_id == draft_id)
+
+    def invalidate_user(self, user_id):
+        self._pages.discard_where(lambda page: page.user_id == user_id)
+
+    def clear(self):
+        self._pages.clear()
+
+    def mark_draft_changed(self, session, draft_id):
+        """Drop the draft's pages when session next commits"""
+        session.info.setdefault('share_changes', set()).add(('draft', draft_id))
+
+    def mark_user_changed(self, session, user_id):
+        """Drop the pages of the user's drafts when session next commits"""
+        session.info.setdefault('share_changes', set()).add(('user', user_id))
+
+    def apply_committed(self, session):
+        for kind, key in session.info.pop('share_changes', ()):
+            if kind == 'draft':
+                self.invalidate_draft(key)
+            else:
+                self.invalidate_user(key)
+
+    def discard_pending(self, session):
+        session.info.pop('share_changes', None)
+
+    def response(self, page):
+        """200 with the cached body, or 304 if the client's copy matches"""
+        response = make_response(page.body)
+        response.mimetype = 'text/html'
+        response.set_etag(page.etag)
+        response.last_modified = page.last_modified
+        # Browsers revalidate every time (cheap: a 304 from memory); shared
+        # caches such as a reverse proxy may reuse the page for
+        # SHARE_PAGE_MAX_AGE seconds, which is how long a revoked link can
+        # keep working there
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = self.max_age
+        g._shared_page_response = True
+        return response.make_conditional(request)
+
+share_cache = ShareCache()
@@ -0,0 +1,49 @@
+from sqlalchemy import event
+
+# SQLite tuning
+#
+# Pragmas from SQLITE_PRAGMAS are applied to every connection as it is
+# opened. With WAL journaling readers no longer wait for the writer, and
+# busy_timeout makes a second writer wait for the lock instead of failing.
+
+def file_database_path(engine):
+    """Path of an SQLite file database, or None for other databases"""
+    url = engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    if url.database.startswith('file:') or url.query.get('mode') == 'memory':
+        return None
+    return url.database
+
+def apply_pragmas(engine, pragmas):
+    """Run PRAGMA statements on each new connection of engine"""
+    statements = [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+class SQLiteTuning:
+    """Applies SQLITE_PRAGMAS to the connections of a file database"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from models import db
+
+        with app.app_context():
+            engine = db.engine
+        if file_database_path(engine) is None:
+            return
+
+        apply_pragmas(engine, app.config.get('SQLITE_PRAGMAS') or {})
+        app.extensions['sqlite_tuning'] = self
+
+sqlite_tuning = SQLiteTuning()
@@ -0,0 +1,96 @@
+import time
+
+from flask import g
+from sqlalchemy import func, select
+
+from utils.cache import LRUCache
+
+class UserSummaryCache:
+    """Short-lived cache of each user's summary row, shared across requests
+
+    Entries expire after USER_SUMMARY_TTL seconds (0 disables the cache)
+    and are dropped once a commit changes the user's profile, drafts or
+    versions. The cache is per process, so other workers may serve a
+    summary up to the TTL old.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 0
+        self._cache = LRUCache(max_entries=1024)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_SUMMARY_TTL', 0)
+        self._cache = LRUCache(max_entries=app.config.get('USER_SUMMARY_CACHE_ENTRIES', 1024))
+        app.extensions['user_summary_cache'] = self
+
+    def get(self, user_id):
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        expires_at, summary = entry
+        if expires_at < time.monotonic():
+            self._cache.discard(user_id)
+            return None
+        return summary
+
+    def set(self, user_id, summary):
+        if self.ttl > 0:
+            self._cache.set(user_id, (time.monotonic() + self.ttl, summary))
+
+    def invalidate(self, user_id):
+        self._cache.discard(user_id)
+        summaries = g.get('_user_summaries')
+        if summaries is not None:
+            summaries.pop(user_id, None)
+
+    def mark_changed(self, session, user_id):
+        """Drop user_id's summary when session next commits"""
+        if session is not None and user_id is not None:
+            session.info.setdefault('summary_changes', set()).add(user_id)
+
+    def apply_committed(self, session):
+        for user_id in session.info.pop('summary_changes', ()):
+            self.invalidate(user_id)
+
+    def discard_pending(self, session):
+        session.info.pop('summary_changes', None)
+
+user_summary_cache = UserSummaryCache()
+
+def load_user_summary(user_id):
+    """Profile fields plus draft, version and current word totals in one query, or None
+
+    current_words counts the current version of each draft only.
+    """
+    from models import db, User, BlogDraft
+
+    row = db.session.execute(
+        select(
+            User.id,
+            User.name,
+            User.email,
+            User.created_at,
+            User.updated_at,
+            func.count(BlogDraft.id).label('total_drafts'),
+            func.coalesce(func.sum(BlogDraft.version_count), 0).label('total_versions'),
+            func.coalesce(func.sum(BlogDraft.current_word_count), 0).label('current_words')
+        )
+        .outerjoin(BlogDraft, BlogDraft.user_id == User.id)
+        .where(User.id == user_id)
+        .group_by(User.id)
+    ).one_or_none()
+    return dict(row._mapping) if row is not None else None
+
+def user_summary(user_id):
+    """Summary row for a user, memoized for the request and cached for USER_SUMMARY_TTL"""
+    summaries = g.setdefault('_user_summaries', {})
+    if user_id not in summaries:
+        summary = user_summary_cache.get(user_id)
+        if summary is None:
+            summary = load_user_summary(user_id)
+            if summary is not None:
+                user_summary_cache.set(user_id, summary)
+        summaries[user_id] = summary
+    return summaries[user_id]